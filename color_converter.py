@@ -1,21 +1,12 @@
 """The module with a component for converting color text into colors."""
 
 import colorsys
+import re
 
 
 class ColorFormatConverter(object):
     """An interface for converting colors in a specific format to a canonical color representation."""
 
-    def to_color(self, match):
-        """
-        Convert a color match into a canonical color representation.
-
-        Arguments:
-        - match - a dict with matched color formats.
-        Returns a canonical color representation for the match.
-        """
-        raise NotImplementedError
-
     def from_color(self, color):
         """
         Convert a canonical color representation into a current color representation..
@@ -141,7 +132,7 @@ class _RgbaColorConverter(ColorFormatConverter):
         a = _parse_float_channel(match["rgba_A"])  # pylint: disable=invalid-name
         if r is None or g is None or b is None or a is None:
             return None
-        return "#%02X%02X%02X%02X" % (r, g, b, a)
+        return _color(r, g, b, a)
 
     def from_color(self, color):
         """
@@ -174,7 +165,7 @@ class _RgbColorConverter(ColorFormatConverter):
         b = _parse_decimal_or_percent_channel(match["rgb_B"])  # pylint: disable=invalid-name
         if r is None or g is None or b is None:
             return None
-        return "#%02X%02X%02Xff" % (r, g, b)
+        return _color(r, g, b, 255)
 
     def from_color(self, color):
         """
@@ -208,7 +199,7 @@ class _HsvaColorConverter(ColorFormatConverter):
         if h is None or s is None or v is None or a is None:
             return None
         r, g, b = _hsv_to_rgb(h, s, v)  # pylint: disable=invalid-name
-        return "#%02X%02X%02X%02X" % (r, g, b, a)
+        return _color(r, g, b, a)
 
     def from_color(self, color):
         """
@@ -243,7 +234,7 @@ class _HsvColorConverter(ColorFormatConverter):
         if h is None or s is None or v is None:
             return None
         r, g, b = _hsv_to_rgb(h, s, v)  # pylint: disable=invalid-name
-        return "#%02X%02X%02Xff" % (r, g, b)
+        return _color(r, g, b, 255)
 
     def from_color(self, color):
         """
@@ -278,7 +269,7 @@ class _HslaColorConverter(ColorFormatConverter):
         if h is None or s is None or l is None or a is None:
             return None
         r, g, b = _hsl_to_rgb(h, s, l)  # pylint: disable=invalid-name
-        return "#%02X%02X%02X%02X" % (r, g, b, a)
+        return _color(r, g, b, a)
 
     def from_color(self, color):
         """
@@ -313,7 +304,7 @@ class _HslColorConverter(ColorFormatConverter):
         if h is None or s is None or l is None:
             return None
         r, g, b = _hsl_to_rgb(h, s, l)  # pylint: disable=invalid-name
-        return "#%02X%02X%02Xff" % (r, g, b)
+        return _color(r, g, b, 255)
 
     def from_color(self, color):
         """
@@ -353,7 +344,27 @@ class ColorConverter(ColorFormatConverter):
         Arguments:
         - formats - color formats configuration.
         """
-        self._formats = formats
+        self._format_converters = {}
+        for name in formats:
+            self._format_converters[name] = ColorConverter._converters.get(name, None)
+
+    def match_to_color(self, match):
+        """
+        Convert a regex match into a canonical color representation.
+
+        The format is looked up by the name of the outermost matched group, which is the format name in regexes built
+        by compile_regex, so only groups of that format are read.
+        Arguments:
+        - match - a regex match for a color.
+        Returns a canonical color representation for the match.
+        """
+        converter = self._format_converters.get(match.lastgroup, None)
+        if converter is None:
+            raise Exception("Match %s could not be canonicalized." % match.group(0))
+        color = converter.to_color(_MatchGroups(match))
+        if color is None:
+            return None
+        return color.lower()
 
     def to_color(self, match):
         """
@@ -386,45 +397,86 @@ class ColorConverter(ColorFormatConverter):
         return converter.from_color(color)
 
 
+class _MatchGroups(object):  # pylint: disable=too-few-public-methods
+    """A view of a regex match as a dict from group names to matched texts."""
+
+    __slots__ = ["_match"]
+
+    def __init__(self, match):
+        self._match = match
+
+    def __getitem__(self, name):
+        return self._match.group(name)
+
+
 def _channel_to_decimal(channel):
-    return int(channel, 16)
+    return _HEX_TO_INT[channel]
 
 
 def _channel_to_float(channel):
-    value = str(int(channel, 16) / 255.0)
-    if value.find(".") == -1:
-        return value
-    while value[-1] == "0":
-        value = value[:-1]
-    if value.startswith("0."):
-        value = value[1:]
-    return value
+    return _INT_TO_FLOAT_TEXT[_HEX_TO_INT[channel]]
 
 
 def _channel_to_percent(channel):
-    return int(round((int(channel, 16) * 100) / 255.0))
+    return _INT_TO_PERCENT[_HEX_TO_INT[channel]]
 
 
 def _channel_to_hue(channel):
-    return int(round((int(channel, 16) * 360) / 255.0))
+    return _INT_TO_HUE[_HEX_TO_INT[channel]]
 
 
-def _parse_decimal_or_percent_channel(text):
-    try:
-        return _parse_decimal_channel(text)
-    except Exception:  # pylint: disable=broad-except
-        return int(round(_parse_percent_channel(text) * 255))
+def _color(r, g, b, a):  # pylint: disable=invalid-name
+    return "#" + _INT_TO_HEX[r] + _INT_TO_HEX[g] + _INT_TO_HEX[b] + _INT_TO_HEX[a]
 
 
-def _parse_decimal_channel(text):
-    value = int(text)
-    if value < 0 or value > 255:
-        return None
+def _parse_decimal_or_percent_channel(text):
+    value = _DECIMAL_OR_PERCENT_CHANNELS.get(text, _UNKNOWN)
+    if value is _UNKNOWN:
+        return _decimal_or_percent_value(text)
     return value
 
 
 def _parse_float_channel(text):
-    if text == ".":
+    value = _FLOAT_CHANNELS.get(text, _UNKNOWN)
+    if value is _UNKNOWN:
+        return _float_value(text)
+    return value
+
+
+def _parse_percent_channel(text):
+    value = _PERCENT_CHANNELS.get(text, _UNKNOWN)
+    if value is _UNKNOWN:
+        value = _percent_value(text)
+        if value is None:
+            return None
+        return value / 100.0
+    return value
+
+
+def _parse_hue_channel(text):
+    value = _HUE_CHANNELS.get(text, _UNKNOWN)
+    if value is _UNKNOWN:
+        return _hue_value(text)
+    return value
+
+
+# The functions below parse channels, that are not in lookup tables, and fill the tables.
+
+
+def _decimal_or_percent_value(text):
+    if text.isdigit():
+        value = int(text)
+        if value > 255:
+            return None
+        return value
+    value = _percent_value(text)
+    if value is None:
+        return None
+    return int(round(value / 100.0 * 255))
+
+
+def _float_value(text):
+    if _FLOAT_REGEX.match(text) is None:
         return None
     value = float(text)
     if value < 0 or value > 1:
@@ -432,20 +484,22 @@ def _parse_float_channel(text):
     return int(round(value * 255.0))
 
 
-def _parse_percent_channel(text):
+def _percent_value(text):
     if text == "0":
-        return 0.0
-    if text[-1] != "%":
+        return 0
+    if text[-1:] != "%" or not text[:-1].isdigit():
         return None
     value = int(text[:-1])
-    if value < 0 or value > 100:
+    if value > 100:
         return None
-    return value / 100.0
+    return value
 
 
-def _parse_hue_channel(text):
+def _hue_value(text):
+    if not text.isdigit():
+        return None
     value = int(text)
-    if value < 0 or value > 360:
+    if value > 360:
         return None
     if value == 360:
         return 0
@@ -458,7 +512,8 @@ def _hsv_to_rgb(h, s, v):  # pylint: disable=invalid-name
 
 
 def _rgb_to_hsv(r, g, b):  # pylint: disable=invalid-name
-    h, s, v = colorsys.rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0)  # pylint: disable=invalid-name
+    h, s, v = colorsys.rgb_to_hsv(  # pylint: disable=invalid-name
+        _INT_TO_FRACTION[r], _INT_TO_FRACTION[g], _INT_TO_FRACTION[b])
     return int(round(h * 360)), int(round(s * 100)), int(round(v * 100))
 
 
@@ -468,5 +523,75 @@ def _hsl_to_rgb(h, s, l):  # pylint: disable=invalid-name
 
 
 def _rgb_to_hsl(r, g, b):  # pylint: disable=invalid-name
-    h, l, s = colorsys.rgb_to_hls(r / 255.0, g / 255.0, b / 255.0)  # pylint: disable=invalid-name
+    h, l, s = colorsys.rgb_to_hls(  # pylint: disable=invalid-name
+        _INT_TO_FRACTION[r], _INT_TO_FRACTION[g], _INT_TO_FRACTION[b])
     return int(round(h * 360)), int(round(s * 100)), int(round(l * 100))
+
+
+def _float_text(value):
+    text = str(value / 255.0)
+    if text.find(".") == -1:
+        return text
+    while text[-1] == "0":
+        text = text[:-1]
+    if text.startswith("0."):
+        text = text[1:]
+    return text
+
+
+def _hex_to_int_table():
+    table = {}
+    digits = "0123456789abcdefABCDEF"
+    for high in digits:
+        for low in digits:
+            table[high + low] = int(high + low, 16)
+    return table
+
+
+def _decimal_texts():
+    # All texts of one to three digits, including ones with leading zeros, like "007".
+    texts = []
+    for value in range(1000):
+        for width in range(len(str(value)), 4):
+            texts.append("%0*d" % (width, value))
+    return texts
+
+
+def _float_texts():
+    texts = ["0", "1", "0.", "1.", ".0", "1.0", "1.00", "1.000"]
+    for value in range(1000):
+        for width in range(1, 4):
+            if value < 10 ** width:
+                fraction = "%0*d" % (width, value)
+                texts.append("." + fraction)
+                texts.append("0." + fraction)
+    return texts
+
+
+def _table(texts, parse):
+    table = {}
+    for text in texts:
+        table[text] = parse(text)
+    return table
+
+
+def _percent_fraction(text):
+    value = _percent_value(text)
+    if value is None:
+        return None
+    return value / 100.0
+
+
+_UNKNOWN = object()
+_FLOAT_REGEX = re.compile(r"(?:\d+\.?\d*|\.\d+)$")
+_HEX_TO_INT = _hex_to_int_table()
+_INT_TO_HEX = ["%02x" % value for value in range(256)]
+_INT_TO_FRACTION = [value / 255.0 for value in range(256)]
+_INT_TO_FLOAT_TEXT = [_float_text(value) for value in range(256)]
+_INT_TO_PERCENT = [int(round((value * 100) / 255.0)) for value in range(256)]
+_INT_TO_HUE = [int(round((value * 360) / 255.0)) for value in range(256)]
+_DECIMAL_OR_PERCENT_CHANNELS = _table(
+    _decimal_texts() + [text + "%" for text in _decimal_texts()], _decimal_or_percent_value)
+_FLOAT_CHANNELS = _table(_float_texts(), _float_value)
+_PERCENT_CHANNELS = _table(["0"] + [text + "%" for text in _decimal_texts()], _percent_fraction)
+_HUE_CHANNELS = _table(_decimal_texts(), _hue_value)
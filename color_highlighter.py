@@ -1,9 +1,11 @@
 """A base class for all color highlighters."""
 
 try:
-    from .regions import intersects_any
+    from .regions import RegionIndex, intersects
+    from .text_change import shift_region
 except ValueError:
-    from regions import intersects_any
+    from regions import RegionIndex, intersects
+    from text_change import shift_region
 
 
 class ColorHighlighter(object):
@@ -39,6 +41,16 @@ class ColorHighlighter(object):
         """
         pass
 
+    def shift_regions(self, changes):
+        """
+        Shift highlighted regions after the text in the view has changed.
+
+        Regions, which text was modified by the changes, are unhighlighted before this call.
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        pass
+
 
 class CombinedColorHighlighter(ColorHighlighter):
     """A color highlighter that forwards calls to a list of base color highlighters."""
@@ -85,6 +97,16 @@ class CombinedColorHighlighter(ColorHighlighter):
         for index, color_highlighter in enumerate(self._color_highlighters):
             color_highlighter.unhighlight_region(context[index], value)
 
+    def shift_regions(self, changes):
+        """
+        Shift highlighted regions after the text in the view has changed.
+
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        for color_highlighter in self._color_highlighters:
+            color_highlighter.shift_regions(changes)
+
     def make_context(self):
         """Get a list of contexts for a list of color highlighters in this combined color highlighter."""
         contexts = []
@@ -93,12 +115,77 @@ class CombinedColorHighlighter(ColorHighlighter):
         return contexts
 
 
+class QuantizingColorHighlighter(ColorHighlighter):
+    """
+    A color highlighter that snaps colors to a palette before forwarding calls to a base color highlighter.
+
+    Highlighters that create a color scheme scope or a gutter icon per color use it to bound the number of them.
+    """
+
+    def __init__(self, color_highlighter, palette):
+        """
+        Create a quantizing color highlighter.
+
+        Arguments:
+        - color_highlighter - the base color highlighter.
+        - palette - the palette to snap colors to.
+        """
+        self._color_highlighter = color_highlighter
+        self._palette = palette
+
+    def highlight_region(self, context, value):
+        """
+        Highlight a region.
+
+        Arguments:
+        - context - a dict with color highlighter run data.
+        - value - tuple (region to highlight, it's color).
+        Returns True, if highlighted, False otherwise.
+        """
+        return self._color_highlighter.highlight_region(context, self._quantize(value))
+
+    def unhighlight_region(self, context, value):
+        """
+        Unhighlight a region.
+
+        Arguments:
+        - context - a dict with color highlighter run data.
+        - value - tuple (region to unhighlight, it's color).
+        """
+        self._color_highlighter.unhighlight_region(context, self._quantize(value))
+
+    def highlight_regions_done(self, context):  # noqa: D401
+        """
+        Called after all calls to highlight_region and unhighlight_region from highlight_regions have been made.
+
+        Arguments:
+        - context - a dict with color highlighter run data.
+        """
+        self._color_highlighter.highlight_regions_done(context)
+
+    def shift_regions(self, changes):
+        """
+        Shift highlighted regions after the text in the view has changed.
+
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        self._color_highlighter.shift_regions(changes)
+
+    def _quantize(self, value):
+        color = value[1]
+        if color is None:
+            return value
+        return (value[0], self._palette.quantize(color))
+
+
 class CachingColorHighlighter(CombinedColorHighlighter):  # pylint: disable=abstract-method
     """
     A caching color highlighter.
 
     It remembers currently highlighted regions and only rerenders those that are new and deletes those that are not
-    highlighted any more.
+    highlighted any more. When a viewport is set, only regions within it are rendered, all other regions are only
+    remembered until the viewport moves to them.
     """
 
     def __init__(self, color_highlighters):
@@ -110,6 +197,9 @@ class CachingColorHighlighter(CombinedColorHighlighter):  # pylint: disable=abst
         """
         super(CachingColorHighlighter, self).__init__(color_highlighters)
         self._existing_regions = {}
+        self._regions_index = RegionIndex()
+        self._rendered_regions = {}
+        self._viewport = None
 
     def highlight_regions(self, regions):
         """
@@ -130,11 +220,60 @@ class CachingColorHighlighter(CombinedColorHighlighter):  # pylint: disable=abst
         - regions - an iterable of tuples (region to highlight, it's color).
         - regions_in - an iterable of regions wherr highlightings need to be updated.
         """
-        for region in self._existing_regions:
-            if intersects_any(region, regions_in):
+        for region_in in regions_in:
+            for region in self._regions_index.intersecting(region_in):
                 self._existing_regions[region].need_delete = True
         self._highlight_regions(regions)
 
+    def set_viewport(self, viewport):
+        """
+        Set the region to render highlightings in.
+
+        Highlightings that got into the viewport are rendered and those that left it are unrendered.
+        Arguments:
+        - viewport - the region to render highlightings in or None to render all highlightings.
+        """
+        self._viewport = viewport
+        context = self.make_context()
+        for region in list(self._rendered_regions.keys()):
+            if not self._in_viewport(region):
+                self.unhighlight_region(context, (region, self._existing_regions[region].color))
+                del self._rendered_regions[region]
+        regions = self._existing_regions.keys() if viewport is None else self._regions_index.intersecting(viewport)
+        for region in regions:
+            if region not in self._rendered_regions:
+                self.highlight_region(context, (region, self._existing_regions[region].color))
+                self._rendered_regions[region] = True
+        self.highlight_regions_done(context)
+
+    def shift_regions(self, changes):
+        """
+        Shift highlighted regions after the text in the view has changed.
+
+        Regions, which text was modified by the changes, are unhighlighted, all other regions keep their highlightings
+        and are only moved to their new positions.
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        context = self.make_context()
+        existing_regions = {}
+        rendered_regions = {}
+        for region in self._existing_regions:
+            region_data = self._existing_regions[region]
+            shifted_region = shift_region(region, changes)
+            if shifted_region is None:
+                if region in self._rendered_regions:
+                    self.unhighlight_region(context, (region, region_data.color))
+            else:
+                existing_regions[shifted_region] = region_data
+                if region in self._rendered_regions:
+                    rendered_regions[shifted_region] = True
+        self._existing_regions = existing_regions
+        self._rendered_regions = rendered_regions
+        self._regions_index = RegionIndex(existing_regions.keys())
+        super(CachingColorHighlighter, self).shift_regions(changes)
+        self.highlight_regions_done(context)
+
     def _highlight_regions(self, regions):
         regions_to_highlight = []
         changed_color = []
@@ -148,6 +287,8 @@ class CachingColorHighlighter(CombinedColorHighlighter):  # pylint: disable=abst
                     continue
                 else:
                     changed_color.append((region, region_data.color))
+            else:
+                self._regions_index.add(region)
 
             regions_to_highlight.append(value)
             self._existing_regions[region] = _RegionData(color)
@@ -158,22 +299,34 @@ class CachingColorHighlighter(CombinedColorHighlighter):  # pylint: disable=abst
         for region in self._existing_regions:
             region_data = self._existing_regions[region]
             if region_data.need_delete:
-                self.unhighlight_region(context, (region, region_data.color))
+                self._unrender_region(context, (region, region_data.color))
                 regions_to_delete.append(region)
         for value in changed_color:
-            self.unhighlight_region(context, value)
+            self._unrender_region(context, value)
         for region in regions_to_delete:
             del self._existing_regions[region]
+            self._regions_index.remove(region)
         for value in regions_to_highlight:
-            self.highlight_region(context, value)
+            if self._in_viewport(value[0]):
+                self.highlight_region(context, value)
+                self._rendered_regions[value[0]] = True
         self.highlight_regions_done(context)
 
+    def _unrender_region(self, context, value):
+        if self._rendered_regions.pop(value[0], None) is not None:
+            self.unhighlight_region(context, value)
+
+    def _in_viewport(self, region):
+        return self._viewport is None or intersects(region, self._viewport)
+
     def clear_all(self):
         """Unhighlight all regions."""
         context = self.make_context()
-        for region in self._existing_regions:
+        for region in self._rendered_regions:
             self.unhighlight_region(context, (region, self._existing_regions[region].color))
         self._existing_regions = {}
+        self._rendered_regions = {}
+        self._regions_index = RegionIndex()
         self.highlight_regions_done(context)
 
 
@@ -181,3 +334,159 @@ class _RegionData(object):  # pylint: disable=too-few-public-methods
     def __init__(self, color):
         self.color = color
         self.need_delete = False
+
+
+class RegionKeys(object):
+    """
+    Keys for regions, highlighted in a view.
+
+    The keys don't depend on regions positions, so a highlighting keeps it's key when it's region is shifted by text
+    changes.
+    """
+
+    def __init__(self, key_template, name):
+        """
+        Create region keys.
+
+        Arguments:
+        - key_template - a template for keys with placeholders for the name and the key index.
+        - name - the name of the color highlighter.
+        """
+        self._key_template = key_template
+        self._name = name
+        self._keys = {}
+        self._next_index = 0
+
+    def add(self, region):
+        """
+        Create a new key for a region.
+
+        Arguments:
+        - region - the region to create the key for.
+        Returns the key.
+        """
+        key = self._key_template % (self._name, self._next_index)
+        self._next_index += 1
+        self._keys[region] = key
+        return key
+
+    def get(self, region):
+        """
+        Get the key for a region.
+
+        Arguments:
+        - region - the region to get the key for.
+        Returns the key or None, if the region doesn't have a key.
+        """
+        return self._keys.get(region, None)
+
+    def pop(self, region):
+        """
+        Forget the key for a region.
+
+        Arguments:
+        - region - the region to forget the key for.
+        Returns the key or None, if the region doesn't have a key.
+        """
+        return self._keys.pop(region, None)
+
+    def shift(self, changes):
+        """
+        Shift regions after the text in the view has changed.
+
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        keys = {}
+        for region in self._keys:
+            shifted_region = shift_region(region, changes)
+            if shifted_region is not None:
+                keys[shifted_region] = self._keys[region]
+        self._keys = keys
+
+
+class RegionGroups(object):
+    """
+    Highlighted regions, grouped by a key, like a color.
+
+    Color highlighters use it to highlight all regions of a group with a single ST region key.
+    """
+
+    def __init__(self):
+        """Create region groups."""
+        self._groups = {}
+        self._changed_groups = {}
+
+    def add(self, group, region):
+        """
+        Add a region to a group.
+
+        Arguments:
+        - group - the group key.
+        - region - the region to add.
+        Returns True, if the region was not in the group before, False otherwise.
+        """
+        if group not in self._groups:
+            self._groups[group] = {}
+        regions = self._groups[group]
+        if region in regions:
+            return False
+        regions[region] = True
+        self._changed_groups[group] = True
+        return True
+
+    def remove(self, group, region):
+        """
+        Remove a region from a group.
+
+        Arguments:
+        - group - the group key.
+        - region - the region to remove.
+        Returns True, if the region was in the group, False otherwise.
+        """
+        regions = self._groups.get(group, None)
+        if regions is None or region not in regions:
+            return False
+        del regions[region]
+        if not regions:
+            del self._groups[group]
+        self._changed_groups[group] = True
+        return True
+
+    def regions(self, group):
+        """
+        Get regions of a group.
+
+        Arguments:
+        - group - the group key.
+        Returns a list of regions, sorted by their positions.
+        """
+        return sorted(self._groups.get(group, {}).keys(), key=lambda region: (region.a, region.b))
+
+    def shift(self, changes):
+        """
+        Shift regions after the text in the view has changed.
+
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        for group in self._groups:
+            regions = {}
+            for region in self._groups[group]:
+                shifted_region = shift_region(region, changes)
+                if shifted_region is not None:
+                    regions[shifted_region] = True
+            self._groups[group] = regions
+
+    def pop_changed(self):
+        """
+        Get groups that were changed since the last call.
+
+        Returns a list of tuples (group, list of regions, sorted by their positions). Groups without regions have
+        empty lists.
+        """
+        changed_groups = []
+        for group in self._changed_groups:
+            changed_groups.append((group, self.regions(group)))
+        self._changed_groups = {}
+        return changed_groups
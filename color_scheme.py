@@ -1,6 +1,9 @@
 """A color highlighter that uses color scheme scopes to highlight colors."""
 
+import codecs
+import json
 import os
+import threading
 from xml.etree import ElementTree
 
 try:
@@ -8,6 +11,11 @@ try:
 except ValueError:
     import st_helper
 
+if st_helper.running_in_st():
+    import sublime  # pylint: disable=import-error
+else:
+    from . import sublime
+
 try:
     from . import path
     from . import colors
@@ -34,9 +42,19 @@ def parse_color_scheme(color_scheme, debug):
     """
     fake_color_scheme = path.fake_color_scheme_path(color_scheme, path.ABSOLUTE)
     new_color_scheme = path.fake_color_scheme_path(color_scheme, path.RELATIVE)
+    cache_path = path.color_scheme_cache_path(color_scheme, path.ABSOLUTE)
     if color_scheme != new_color_scheme:
         if os.path.exists(fake_color_scheme):
             color_scheme = new_color_scheme
+    if color_scheme == new_color_scheme:
+        color_scheme_data = load_color_scheme_cache(cache_path, fake_color_scheme)
+        if color_scheme_data is not None:
+            if debug:
+                print("ColorHighlighter: action=load_cached_color_scheme scheme=%s" % color_scheme)
+            color_scheme_writer = ColorSchemeWriter(
+                fake_color_scheme, None, None, debug, ColorSchemeCache(cache_path, color_scheme_data))
+            return new_color_scheme, color_scheme_data, color_scheme_writer
+
     color_scheme_content = load_resource.load_resource(color_scheme)
     if not st_helper.is_st3():
         color_scheme_content = color_scheme_content.encode("utf-8")
@@ -56,11 +74,51 @@ def parse_color_scheme(color_scheme, debug):
     existing_colors = _load_colors(scopes_array_element)
     background_color = colors.normalize_hex_color(background_color.text)
     color_scheme_data = ColorSchemeData(background_color, existing_colors)
+    color_scheme_cache = ColorSchemeCache(cache_path, color_scheme_data)
+    if color_scheme == new_color_scheme:
+        color_scheme_cache.save(fake_color_scheme)
     color_scheme_writer = ColorSchemeWriter(
-        fake_color_scheme, ElementTree.ElementTree(color_scheme_xml), scopes_array_element, debug)
+        fake_color_scheme, ElementTree.ElementTree(color_scheme_xml), scopes_array_element, debug, color_scheme_cache)
     return new_color_scheme, color_scheme_data, color_scheme_writer
 
 
+def parse_color_scheme_override(color_scheme, debug):
+    """
+    Load the color scheme and the user's override for it and prepare an override for color highlighter rules.
+
+    Instead of a copy of the whole color scheme, color highlighter rules are written to a small .sublime-color-scheme
+    file in the color highlighter data directory, that ST merges into the color scheme. The user's override is only
+    read to get the background color.
+    Arguments:
+    - color_scheme - the color scheme name to process.
+    - debug - whether to enable debug mode.
+    Returns the color scheme to use and a ColorSchemeData and a ColorSchemeOverrideWriter for input color scheme or
+    None, if the color scheme or the user's override could not be parsed.
+    """
+    override_path = path.color_scheme_override_path(color_scheme, path.ABSOLUTE)
+    override = {}
+    if os.path.exists(override_path):
+        try:
+            with codecs.open(override_path, "r", "utf-8") as override_file:
+                override = _decode_json(override_file.read())
+        except (IOError, OSError, ValueError) as error:
+            print("ColorHighlighter: action=parse_color_scheme_override override=%s error=%s" % (override_path, error))
+            return None
+    if not isinstance(override, dict):
+        return None
+
+    background_color = _load_background_color(color_scheme, override)
+    if background_color is None:
+        return None
+
+    rules_path = path.color_scheme_rules_path(color_scheme, path.ABSOLUTE)
+    rules = _load_rules(rules_path)
+    existing_colors = _load_override_colors(rules)
+    color_scheme_data = ColorSchemeData(colors.normalize_hex_color(background_color), existing_colors)
+    color_scheme_writer = ColorSchemeOverrideWriter(rules_path, rules, debug)
+    return color_scheme, color_scheme_data, color_scheme_writer
+
+
 class ColorSchemeData(object):  # pylint: disable=too-few-public-methods
     """Data object with all the data loaded from a color scheme."""
 
@@ -76,23 +134,103 @@ class ColorSchemeData(object):  # pylint: disable=too-few-public-methods
         self.existing_colors = existing_colors
 
 
+class ColorSchemeCache(object):
+    """A cache of ColorSchemeData for a color scheme file, that is valid while the file is not changed."""
+
+    def __init__(self, cache_path, color_scheme_data):
+        """
+        Create a ColorSchemeCache.
+
+        Arguments:
+        - cache_path - an absolute path to the cache file.
+        - color_scheme_data - the ColorSchemeData to cache.
+        """
+        self._cache_path = cache_path
+        self._color_scheme_data = color_scheme_data
+
+    def save(self, color_scheme):
+        """
+        Save the color scheme data to the cache.
+
+        Arguments:
+        - color_scheme - an absolute path to the color scheme file the data was parsed from.
+        """
+        try:
+            (size, mtime) = _file_stat(color_scheme)
+            with codecs.open(self._cache_path, "w", "utf-8") as cache_file:
+                cache_file.write(json.dumps({
+                    "color_scheme": color_scheme,
+                    "size": size,
+                    "mtime": mtime,
+                    "background_color": self._color_scheme_data.background_color,
+                    "existing_colors": self._color_scheme_data.existing_colors,
+                }))
+        except (IOError, OSError) as error:
+            print("ColorHighlighter: action=save_color_scheme_cache error=%s" % error)
+
+
+def load_color_scheme_cache(cache_path, color_scheme):
+    """
+    Load ColorSchemeData for a color scheme file from the cache.
+
+    Arguments:
+    - cache_path - an absolute path to the cache file.
+    - color_scheme - an absolute path to the color scheme file.
+    Returns the ColorSchemeData or None, if the cache doesn't exist or is outdated.
+    """
+    try:
+        with codecs.open(cache_path, "r", "utf-8") as cache_file:
+            cache = json.loads(cache_file.read())
+        file_stat = _file_stat(color_scheme)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(cache, dict):
+        return None
+    if (cache.get("color_scheme", None), cache.get("size", None), cache.get("mtime", None)) != (
+            color_scheme, file_stat[0], file_stat[1]):
+        return None
+    background_color = cache.get("background_color", None)
+    existing_colors = cache.get("existing_colors", None)
+    if background_color is None or not isinstance(existing_colors, dict):
+        return None
+    return ColorSchemeData(background_color, existing_colors)
+
+
 class ColorSchemeWriter(object):
-    """A class that writes elements to a color scheme."""
+    """
+    A class that writes elements to a color scheme.
+
+    The whole color scheme is only written the first time and when the file was changed by someone else, after that
+    new scopes are inserted in place right before the end of the scopes array. The color scheme is only parsed when
+    it needs to be written whole. Writes are serialized, so the writer can be used from the UI and the async threads.
+    """
+
+    # A comment that marks the end of the scopes array in the written color scheme file.
+    _end_of_scopes_marker = " ColorHighlighter: end of scopes "
 
-    def __init__(self, color_scheme, xml_tree, scopes_array_element, debug):
+    def __init__(self, color_scheme, xml_tree, scopes_array_element,  # pylint: disable=too-many-arguments
+                 debug, color_scheme_cache):
         """
         Create a ColorSchemeWriter.
 
         Arguments:
         - color_scheme - an absolute path to a color scheme.
-        - xml_tree - an ElementTree object for the color scheme.
-        - scopes_array_element - an Element that represents the dict array in the color scheme XML.
+        - xml_tree - an ElementTree object for the color scheme or None to parse the color scheme when needed.
+        - scopes_array_element - an Element that represents the dict array in the color scheme XML or None, if
+          xml_tree is None.
         - debug - whether to enable debug mode.
+        - color_scheme_cache - a ColorSchemeCache to update after writing the color scheme or None.
         """
         self._color_scheme = color_scheme
         self._xml_tree = xml_tree
         self._scopes_array_element = scopes_array_element
         self._debug = debug
+        self._color_scheme_cache = color_scheme_cache
+        self._end_of_scopes_offset = None
+        self._written_file_stat = None
+        self._lock = threading.RLock()
+        if xml_tree is None:
+            self._find_end_of_scopes()
 
     def add_scopes(self, scopes):
         """
@@ -101,35 +239,222 @@ class ColorSchemeWriter(object):
         Arguments:
         - scopes -- an iterable of Elements with scopes to add.
         """
-        self._scopes_array_element.extend(scopes)
+        scopes = list(scopes)
+        with self._lock:
+            if self._xml_tree is not None:
+                self._scopes_array_element.extend(scopes)
+            if not self._insert_scopes(scopes):
+                if self._xml_tree is None:
+                    if not self._load_color_scheme():
+                        return
+                    self._scopes_array_element.extend(scopes)
+                self._write_color_scheme()
+            self._color_scheme_written()
+
+    def remove_scopes(self, scope_names):
+        """
+        Remove scopes from the color scheme.
+
+        Arguments:
+        - scope_names -- an iterable of names of scopes to remove.
+        """
+        with self._lock:
+            if not self._load_color_scheme():
+                return
+            scope_names = set(scope_names)
+            for child in list(self._scopes_array_element):
+                if child.tag != "dict":
+                    continue
+                scope = _get_value_child_with_tag(child, "scope", "string")
+                if scope is not None and scope.text in scope_names:
+                    self._scopes_array_element.remove(child)
+            self._write_color_scheme()
+            self._color_scheme_written()
+
+    def _load_color_scheme(self):
+        if self._xml_tree is not None:
+            return True
         if self._debug:
-            packages_path = os.path.dirname(path.packages_path(path.ABSOLUTE))
-            print("ColorHighlighter: action=write_color_scheme scheme=%s" % self._color_scheme[len(packages_path) + 1:])
+            print("ColorHighlighter: action=parse_color_scheme scheme=%s" % self._color_scheme)
+        try:
+            xml_tree = ElementTree.parse(self._color_scheme)
+        except (IOError, OSError, ElementTree.ParseError) as error:
+            print("ColorHighlighter: action=parse_color_scheme error=%s" % error)
+            return False
+        scopes_array_element = _get_array_element(xml_tree.getroot())
+        if scopes_array_element is None:
+            return False
+        self._xml_tree = xml_tree
+        self._scopes_array_element = scopes_array_element
+        return True
 
-        init_color_scheme_dir()
-        self._xml_tree.write(self._color_scheme, encoding="utf-8")
+    def _color_scheme_written(self):
+        self._remove_cached_scheme()
+        if self._color_scheme_cache is not None:
+            self._color_scheme_cache.save(self._color_scheme)
+
+    def _remove_cached_scheme(self):
         try:
             os.remove(path.cached_scheme_path(self._color_scheme))
         except FileNotFoundError:
             # No cache -- no problems.
             pass
 
+    def _write_color_scheme(self):
+        if self._debug:
+            packages_path = os.path.dirname(path.packages_path(path.ABSOLUTE))
+            print("ColorHighlighter: action=write_color_scheme scheme=%s" % self._color_scheme[len(packages_path) + 1:])
+
+        init_color_scheme_dir()
+        marker = ElementTree.Comment(ColorSchemeWriter._end_of_scopes_marker)
+        self._scopes_array_element.append(marker)
+        try:
+            self._xml_tree.write(self._color_scheme, encoding="utf-8")
+        finally:
+            self._scopes_array_element.remove(marker)
+        self._find_end_of_scopes()
+
+    def _find_end_of_scopes(self):
+        self._end_of_scopes_offset = None
+        self._written_file_stat = None
+        content = self._read_color_scheme()
+        if content is None:
+            return
+        offset = content.rfind(("<!--%s-->" % ColorSchemeWriter._end_of_scopes_marker).encode("utf-8"))
+        if offset >= 0:
+            self._end_of_scopes_offset = offset
+            self._written_file_stat = _file_stat(self._color_scheme)
+
+    def _read_color_scheme(self):
+        try:
+            with open(self._color_scheme, "rb") as color_scheme_file:
+                return color_scheme_file.read()
+        except (IOError, OSError):
+            return None
+
+    def _insert_scopes(self, scopes):
+        if self._end_of_scopes_offset is None:
+            return False
+        try:
+            if _file_stat(self._color_scheme) != self._written_file_stat:
+                return False
+            if self._debug:
+                print("ColorHighlighter: action=insert_color_scheme_scopes scopes=%d" % len(scopes))
+            content = b"".join([ElementTree.tostring(scope) for scope in scopes])
+            with open(self._color_scheme, "r+b") as color_scheme_file:
+                color_scheme_file.seek(self._end_of_scopes_offset)
+                tail = color_scheme_file.read()
+                color_scheme_file.seek(self._end_of_scopes_offset)
+                color_scheme_file.write(content)
+                color_scheme_file.write(tail)
+                color_scheme_file.truncate()
+            self._end_of_scopes_offset += len(content)
+            self._written_file_stat = _file_stat(self._color_scheme)
+        except (IOError, OSError):
+            return False
+        return True
+
     def fix_color_scheme_for_gutter_colors(self):  # pylint: disable=invalid-name
         """Fix color scheme for gutter icons to work properly."""
-        for child in self._scopes_array_element:
-            if child.tag != "dict":
-                continue
+        with self._lock:
+            if self._xml_tree is None:
+                content = self._read_color_scheme()
+                # The scheme is already fixed.
+                if content is not None and (
+                        ("<string>%s</string>" % GutterIconsColorHighlighter.region_scope).encode("utf-8") in content):
+                    return
+            else:
+                for child in self._scopes_array_element:
+                    if child.tag != "dict":
+                        continue
+
+                    scope = _get_value_child_with_tag(child, "scope", "string")
+                    if scope is None:
+                        continue
+                    # The scheme is already fixed.
+                    if scope.text == GutterIconsColorHighlighter.region_scope:
+                        return
+
+            if self._debug:
+                print("ColorHighlighter: action=fix_color_scheme")
+            self.add_scopes([_gutter_colors_fix_scope()])
+
+
+class ColorSchemeOverrideWriter(object):
+    """
+    A class that writes scopes as rules to the color highlighter's .sublime-color-scheme override of a color scheme.
 
-            scope = _get_value_child_with_tag(child, "scope", "string")
-            if scope is None:
-                continue
-            # The scheme is already fixed.
-            if scope == GutterIconsColorHighlighter.region_scope:
-                return
+    Writes are serialized, so the writer can be used from the UI and the async threads.
+    """
+
+    _rule_settings = ["foreground", "background"]
+
+    def __init__(self, rules_path, rules, debug):
+        """
+        Create a ColorSchemeOverrideWriter.
+
+        Arguments:
+        - rules_path - an absolute path to the color highlighter's override of the color scheme.
+        - rules - a dict with the current content of the color highlighter's override.
+        - debug - whether to enable debug mode.
+        """
+        self._rules_path = rules_path
+        self._rules = rules
+        self._debug = debug
+        self._lock = threading.RLock()
+
+    def add_scopes(self, scopes):
+        """
+        Add scopes to the color scheme override.
+
+        Arguments:
+        - scopes -- an iterable of Elements with scopes to add.
+        """
+        with self._lock:
+            rules = self._rules.setdefault("rules", [])
+            for scope in scopes:
+                rules.append(_scope_to_rule(scope))
+            self._write_override()
+
+    def remove_scopes(self, scope_names):
+        """
+        Remove scopes from the color scheme override.
 
+        Arguments:
+        - scope_names -- an iterable of names of scopes to remove.
+        """
+        scope_names = set(scope_names)
+        with self._lock:
+            self._rules["rules"] = [
+                rule for rule in self._rules.get("rules", [])
+                if not isinstance(rule, dict) or rule.get("scope", None) not in scope_names]
+            self._write_override()
+
+    def _write_override(self):
         if self._debug:
-            print("ColorHighlighter: action=fix_color_scheme")
-        self.add_scopes([ElementTree.fromstring("""
+            print("ColorHighlighter: action=write_color_scheme_override override=%s" % self._rules_path)
+        try:
+            init_color_scheme_dir()
+            with codecs.open(self._rules_path, "w", "utf-8") as rules_file:
+                rules_file.write(json.dumps(self._rules, indent=4))
+        except (IOError, OSError) as error:
+            print("ColorHighlighter: action=write_color_scheme_override error=%s" % error)
+
+    def fix_color_scheme_for_gutter_colors(self):  # pylint: disable=invalid-name
+        """Fix color scheme for gutter icons to work properly."""
+        with self._lock:
+            for rule in self._rules.get("rules", []):
+                # The scheme is already fixed.
+                if isinstance(rule, dict) and rule.get("scope", None) == GutterIconsColorHighlighter.region_scope:
+                    return
+
+            if self._debug:
+                print("ColorHighlighter: action=fix_color_scheme")
+            self.add_scopes([_gutter_colors_fix_scope()])
+
+
+def _gutter_colors_fix_scope():
+    return ElementTree.fromstring("""
 <dict>
     <key>name</key>
     <string>CH_color_scheme_fix</string>
@@ -141,7 +466,94 @@ class ColorSchemeWriter(object):
         <string>#ffffff</string>
     </dict>
 </dict>
-""" % GutterIconsColorHighlighter.region_scope)])
+""" % GutterIconsColorHighlighter.region_scope)
+
+
+def _scope_to_rule(scope):
+    rule = {}
+    for key in ["name", "scope"]:
+        value = _get_value_child_with_tag(scope, key, "string")
+        if value is not None:
+            rule[key] = value.text
+    settings = _get_value_child_with_tag(scope, "settings", "dict")
+    if settings is not None:
+        for key in ColorSchemeOverrideWriter._rule_settings:  # pylint: disable=protected-access
+            value = _get_value_child_with_tag(settings, key, "string")
+            if value is not None:
+                rule[key] = value.text
+    return rule
+
+
+def _decode_json(content):
+    # ST's JSON allows comments and trailing commas.
+    if st_helper.running_in_st() and hasattr(sublime, "decode_value"):
+        return sublime.decode_value(content)
+    return json.loads(content)
+
+
+def _load_background_color(color_scheme, override):
+    variables = {}
+    if color_scheme.endswith(".sublime-color-scheme"):
+        scheme = _decode_json(load_resource.load_resource(color_scheme))
+        if not isinstance(scheme, dict):
+            return None
+        variables.update(scheme.get("variables", {}))
+        background_color = scheme.get("globals", {}).get("background", None)
+    else:
+        color_scheme_content = load_resource.load_resource(color_scheme)
+        if not st_helper.is_st3():
+            color_scheme_content = color_scheme_content.encode("utf-8")
+        scopes_array_element = _get_array_element(ElementTree.fromstring(color_scheme_content))
+        if scopes_array_element is None:
+            return None
+        scheme_settings_element = _get_scheme_settings_element(scopes_array_element)
+        if scheme_settings_element is None:
+            return None
+        background_color = _get_value_child_with_tag(scheme_settings_element, "background", "string")
+        if background_color is not None:
+            background_color = background_color.text
+
+    variables.update(override.get("variables", {}))
+    background_color = override.get("globals", {}).get("background", background_color)
+    background_color = _resolve_variable(background_color, variables)
+    if background_color is None or not background_color.startswith("#"):
+        return None
+    return background_color
+
+
+def _resolve_variable(value, variables):
+    resolved_variables = set()
+    while value is not None and value.startswith("var(") and value.endswith(")"):
+        variable = value[len("var("):-len(")")].strip()
+        if variable in resolved_variables:
+            return None
+        resolved_variables.add(variable)
+        value = variables.get(variable, None)
+    return value
+
+
+def _load_rules(rules_path):
+    # The file is only written by the color highlighter, so a broken file is dropped and rewritten.
+    try:
+        with codecs.open(rules_path, "r", "utf-8") as rules_file:
+            rules = json.loads(rules_file.read())
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(rules, dict):
+        return {}
+    return rules
+
+
+def _load_override_colors(rules):
+    existing_colors = {}
+    for rule in rules.get("rules", []):
+        if not isinstance(rule, dict) or rule.get("name", None) != CH_COLOR_SCOPE_NAME:
+            continue
+        color = rule.get("background", None)
+        if color is None:
+            continue
+        existing_colors[color] = color[1:]
+    return existing_colors
 
 
 def _get_child_by_tag(element, child_tag):
@@ -208,6 +620,11 @@ def _load_colors(scopes_array_element):
     return existing_colors
 
 
+def _file_stat(file_path):
+    file_stat = os.stat(file_path)
+    return (file_stat.st_size, file_stat.st_mtime)
+
+
 def init_color_scheme_dir():
     """Initialise the directory for color schemes."""
     _create_if_not_exists(path.data_path(path.ABSOLUTE))
@@ -1,16 +1,19 @@
 """A color highlighter that uses color scheme scopes to highlight colors."""
 
+import codecs
+import json
+import os
 import threading
 from xml.etree import ElementTree
 
 try:
     from .st_helper import running_in_st, is_st3
     from . import colors
-    from .color_highlighter import ColorHighlighter
+    from .color_highlighter import ColorHighlighter, RegionGroups, RegionKeys
 except ValueError:
     from st_helper import running_in_st, is_st3
     import colors
-    from color_highlighter import ColorHighlighter
+    from color_highlighter import ColorHighlighter, RegionGroups, RegionKeys
 
 if running_in_st():
     import sublime  # pylint: disable=import-error
@@ -57,7 +60,8 @@ class ColorSchemeBuilder(object):
 </dict>
 """
 
-    def __init__(self, color_scheme_data, color_scheme_writer, async_update):
+    def __init__(self, color_scheme_data, color_scheme_writer,  # pylint: disable=too-many-arguments
+                 async_update, write_interval_ms, color_usage):
         """
         Init the ColorSchemeBuilder.
 
@@ -65,12 +69,116 @@ class ColorSchemeBuilder(object):
         - color_scheme_data - a ColorSchemeData instance for a color scheme.
         - color_scheme_writer - a ColorSchemeWriter instance for a color scheme.
         - async_update - whether to update the color scheme asynchronously or not.
+        - write_interval_ms - the minimal interval between color scheme writes in milliseconds. New scopes are buffered
+          and written together at the end of the interval. 0 means writing new scopes right away.
+        - color_usage - a ColorSchemeUsage instance to record used colors in or None to not track colors usage.
         """
         self._color_scheme_data = color_scheme_data
         self._color_scheme_writer = color_scheme_writer
         self._async_update = async_update
+        self._write_interval_ms = write_interval_ms
+        self._color_usage = color_usage
+        self._color_references = {}
+        self._pending_scopes = []
+        self._flush_scheduled = False
+        self._gutter_colors_fixed = False
         self._lock = threading.Lock()
 
+    def add_color_reference(self, color):
+        """
+        Record that a color is highlighted.
+
+        Colors with references are never removed from the color scheme.
+        Arguments:
+        - color - the color.
+        """
+        with self._lock:
+            self._color_references[color] = self._color_references.get(color, 0) + 1
+            if self._color_usage is not None:
+                self._color_usage.use(color)
+
+    def remove_color_reference(self, color):
+        """
+        Record that a color is not highlighted anymore.
+
+        Arguments:
+        - color - the color.
+        """
+        with self._lock:
+            references = self._color_references.get(color, 0) - 1
+            if references > 0:
+                self._color_references[color] = references
+            else:
+                self._color_references.pop(color, None)
+
+    def collect_unused_colors(self, max_unused_sessions, max_colors):
+        """
+        Remove scopes for unused colors from the color scheme in the background.
+
+        Colors without references are removed if they were not used for max_unused_sessions sessions or, the least
+        recently used first, if there are more than max_colors colors in the color scheme. Only colors that were not
+        used in the current session are removed over the limit, and colors without usage data are never removed. The
+        color scheme is rewritten at most once.
+        Arguments:
+        - max_unused_sessions - the number of sessions after which an unused color is removed.
+        - max_colors - the maximal number of colors to keep in the color scheme.
+        """
+        if self._color_usage is None:
+            return
+        _run_later(lambda: self._collect_unused_colors(max_unused_sessions, max_colors), 0)
+
+    def _collect_unused_colors(self, max_unused_sessions, max_colors):
+        with self._lock:
+            existing_colors = self._color_scheme_data.existing_colors
+            garbage = {}
+            old_colors = []
+            for color in existing_colors:
+                if color in self._color_references:
+                    continue
+                unused_sessions = self._color_usage.unused_sessions(color)
+                if unused_sessions is None or unused_sessions == 0:
+                    continue
+                if unused_sessions >= max_unused_sessions:
+                    garbage[color] = True
+                else:
+                    old_colors.append(color)
+            overflow = len(existing_colors) - len(garbage) - max_colors
+            if overflow > 0:
+                least_recently_used_colors = sorted(
+                    old_colors, key=lambda color: (-self._color_usage.unused_sessions(color), color))
+                for color in least_recently_used_colors[:overflow]:
+                    garbage[color] = True
+
+            scope_names = []
+            for color in garbage:
+                color_name = existing_colors.pop(color)
+                scope_names.append(self._get_color_name(False, color_name))
+                scope_names.append(self._get_color_name(True, color_name))
+                self._color_usage.forget(color)
+            if scope_names:
+                self._color_scheme_writer.remove_scopes(scope_names)
+            self._color_usage.save()
+
+    def fix_color_scheme_for_gutter_colors(self):  # pylint: disable=invalid-name
+        """
+        Fix color scheme for gutter icons to work properly.
+
+        The color scheme is only checked for the fix the first time, later calls do nothing.
+        """
+        if self._gutter_colors_fixed:
+            return
+        self._gutter_colors_fixed = True
+        if self._async_update:
+            sublime.set_timeout_async(self._fix_color_scheme_for_gutter_colors, 0)
+        else:
+            self._fix_color_scheme_for_gutter_colors()
+
+    def _fix_color_scheme_for_gutter_colors(self):  # pylint: disable=invalid-name
+        # The color scheme data is saved to the color scheme cache on every write, so all writes go under the lock that
+        # guards it.
+        with self._lock:
+            self._color_scheme_writer.fix_color_scheme_for_gutter_colors()
+
     def get_scopes(self, for_colors, for_text_coloring):
         """
         Get scope names for a list of colors.
@@ -113,8 +221,29 @@ class ColorSchemeBuilder(object):
                     self._text_color_scope_template % (color_name, fixed_background_color, fixed_color, opposite_color))
                 scopes.append(text_scope)
                 existing_colors[color] = color_name
+            usage_changed = self._color_usage is not None and self._color_usage.changed()
+            if not scopes and not usage_changed:
+                return
+            if self._write_interval_ms <= 0:
+                if scopes:
+                    self._color_scheme_writer.add_scopes(scopes)
+                if usage_changed:
+                    self._color_usage.save()
+                return
+            self._pending_scopes.extend(scopes)
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                _run_later(self._flush_scopes, self._write_interval_ms)
+
+    def _flush_scopes(self):
+        with self._lock:
+            scopes = self._pending_scopes
+            self._pending_scopes = []
+            self._flush_scheduled = False
             if scopes:
                 self._color_scheme_writer.add_scopes(scopes)
+            if self._color_usage is not None:
+                self._color_usage.save()
 
     def _get_color_name(self, for_text_coloring, color_name):
         if for_text_coloring:
@@ -122,10 +251,100 @@ class ColorSchemeBuilder(object):
         return self._scope_name_template % color_name
 
 
+class ColorSchemeUsage(object):
+    """
+    Sessions in which colors of a color scheme were last used.
+
+    A session lasts as long as the ST plugin host process, so reloading the plugin or it's settings doesn't start a
+    new session.
+    """
+
+    def __init__(self, usage_path):
+        """
+        Init the ColorSchemeUsage.
+
+        Arguments:
+        - usage_path - an absolute path to the file to persist the usage in between sessions.
+        """
+        self._usage_path = usage_path
+        self._session = 0
+        self._process = None
+        self._last_used = {}
+        self._changed = False
+
+    def load(self):
+        """Load the usage from the file and start a new session, if the usage was saved by another ST process."""
+        try:
+            with codecs.open(self._usage_path, "r", "utf-8") as usage_file:
+                usage = json.loads(usage_file.read())
+        except (IOError, OSError, ValueError):
+            usage = {}
+        if not isinstance(usage, dict):
+            usage = {}
+        self._process = os.getpid()
+        self._session = usage.get("session", 0)
+        if usage.get("process", None) != self._process:
+            self._session += 1
+            self._changed = True
+        self._last_used = usage.get("colors", {})
+
+    def use(self, color):
+        """
+        Record that a color is used in the current session.
+
+        Arguments:
+        - color - the color.
+        """
+        if self._last_used.get(color, None) != self._session:
+            self._last_used[color] = self._session
+            self._changed = True
+
+    def unused_sessions(self, color):
+        """
+        Get the number of sessions since the color was used last time.
+
+        Arguments:
+        - color - the color.
+        Returns the number of sessions or None, if there is no usage data for the color.
+        """
+        last_used = self._last_used.get(color, None)
+        if last_used is None:
+            return None
+        return self._session - last_used
+
+    def forget(self, color):
+        """
+        Forget usage data for a color.
+
+        Arguments:
+        - color - the color.
+        """
+        if self._last_used.pop(color, None) is not None:
+            self._changed = True
+
+    def changed(self):
+        """Whether the usage was changed since it was saved last time."""
+        return self._changed
+
+    def save(self):
+        """Save the usage to the file, if it has changed."""
+        if not self._changed:
+            return
+        try:
+            with codecs.open(self._usage_path, "w", "utf-8") as usage_file:
+                usage_file.write(json.dumps(
+                    {"session": self._session, "process": self._process, "colors": self._last_used}))
+        except (IOError, OSError) as error:
+            print("ColorHighlighter: action=save_color_scheme_usage error=%s" % error)
+            return
+        self._changed = False
+
+
 class ColorSchemeColorHighlighter(ColorHighlighter):
     """A color highlighter that uses color scheme scopes to highlight colors."""
 
-    region_name_template = "CH_color_%s_%d_%d"
+    region_name_template = "CH_color_%s_%d"
+    group_region_name_template = "CH_color_%s_%s"
 
     if is_st3():
         _region_style_flags = {
@@ -143,7 +362,8 @@ class ColorSchemeColorHighlighter(ColorHighlighter):
             "outlined": sublime.DRAW_OUTLINED,
         }
 
-    def __init__(self, view, style, color_scheme_builder, name, debug):  # pylint: disable=too-many-arguments
+    def __init__(self, view, style, color_scheme_builder, name,  # pylint: disable=too-many-arguments
+                 group_regions, debug):
         """
         Init a ColorSchemeColorHighlighter.
 
@@ -152,6 +372,7 @@ class ColorSchemeColorHighlighter(ColorHighlighter):
         - style - the style of color highlighting.
         - color_scheme_builder - the color scheme builder to build regions for colors.
         - name - the name of the color highlighter.
+        - group_regions - whether to highlight all regions with the same color with a single region key.
         - debug - whether to enable debug mode.
         """
         assert style in ColorSchemeColorHighlighter._region_style_flags
@@ -161,6 +382,10 @@ class ColorSchemeColorHighlighter(ColorHighlighter):
         self._flags = ColorSchemeColorHighlighter._region_style_flags[style]
         self._name = name
         self._debug = debug
+        self._region_keys = RegionKeys(ColorSchemeColorHighlighter.region_name_template, name)
+        self._region_groups = None
+        if group_regions:
+            self._region_groups = RegionGroups()
 
     def highlight_region(self, context, value):
         """
@@ -171,6 +396,11 @@ class ColorSchemeColorHighlighter(ColorHighlighter):
         - value - tuple (region to highlight, it's color).
         Returns True, if highlighted, False otherwise.
         """
+        if self._region_groups is not None:
+            (region, color) = value
+            if self._region_groups.add(color, region):
+                self._color_scheme_builder.add_color_reference(color)
+            return
         if "values" not in context:
             context["values"] = []
         context["values"].append(value)
@@ -182,6 +412,10 @@ class ColorSchemeColorHighlighter(ColorHighlighter):
         Arguments:
         - context - a dict with color highlighter run data.
         """
+        if self._region_groups is not None:
+            self._highlight_region_groups()
+            return
+
         values = context.get("values", None)
         if not values:
             return
@@ -193,7 +427,8 @@ class ColorSchemeColorHighlighter(ColorHighlighter):
 
         for index, value in enumerate(values):
             (region, color) = value
-            region_key = ColorSchemeColorHighlighter.region_name_template % (self._name, region.a, region.b)
+            self._color_scheme_builder.add_color_reference(color)
+            region_key = self._region_keys.add(region)
             if self._debug:
                 print("ColorHighlighter: action=highlight highlighter=ColorSchemeColorHighlighter region=%s color=%s"
                       % (region, color))
@@ -207,6 +442,51 @@ class ColorSchemeColorHighlighter(ColorHighlighter):
         - context - a dict with color highlighter run data.
         - value - tuple (region to unhighlight, it's color).
         """
-        (region, _) = value
-        region_key = ColorSchemeColorHighlighter.region_name_template % (self._name, region.a, region.b)
-        self._view.erase_regions(region_key)
+        (region, color) = value
+        if self._region_groups is not None:
+            if self._region_groups.remove(color, region):
+                self._color_scheme_builder.remove_color_reference(color)
+            return
+        region_key = self._region_keys.pop(region)
+        if region_key is not None:
+            self._color_scheme_builder.remove_color_reference(color)
+            self._view.erase_regions(region_key)
+
+    def shift_regions(self, changes):
+        """
+        Shift highlighted regions after the text in the view has changed.
+
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        if self._region_groups is not None:
+            self._region_groups.shift(changes)
+            return
+        self._region_keys.shift(changes)
+
+    def _highlight_region_groups(self):
+        changed_groups = self._region_groups.pop_changed()
+        colors_to_highlight = [color for (color, regions) in changed_groups if regions]
+        scopes = {}
+        if colors_to_highlight:
+            color_scopes = self._color_scheme_builder.get_scopes(colors_to_highlight, self._text_coloring)
+            for index, color in enumerate(colors_to_highlight):
+                scopes[color] = color_scopes[index]
+
+        for (color, regions) in changed_groups:
+            region_key = ColorSchemeColorHighlighter.group_region_name_template % (self._name, color[1:])
+            if not regions:
+                self._view.erase_regions(region_key)
+                continue
+            if self._debug:
+                print("ColorHighlighter: action=highlight highlighter=ColorSchemeColorHighlighter color=%s regions=%d"
+                      % (color, len(regions)))
+            self._view.add_regions(
+                region_key, [region.region() for region in regions], scopes[color], "", self._flags)
+
+
+def _run_later(callback, delay_ms):
+    if is_st3():
+        sublime.set_timeout_async(callback, delay_ms)
+    else:
+        sublime.set_timeout(callback, delay_ms)
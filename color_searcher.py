@@ -1,5 +1,8 @@
 """The module with tools for searching for colors in ST views."""
 
+import bisect
+import threading
+
 try:
     from . import regions
 except ValueError:
@@ -28,16 +31,100 @@ class ColorSearcher(object):
         Arguments:
         - view - the view to look in.
         - region - the initial region to look around.
-        Yields tuples of of NormalizedRegion-s, canonical colors that are in this regions and color matches for them.
+        Yields tuples of of NormalizedRegion-s, canonical colors that are in this regions and formats of them.
         """
         region_text = view.substr(region.region())
-        match = self._color_regex.search(region_text)
-        while match:
-            start = match.start()
-            end = match.end()
-            color_region = regions.NormalizedRegion(region.a + start, region.a + end)
-            groups = match.groupdict()
-            color = self._color_converter.to_color(groups)
+        offset = region.a
+        for match in self._color_regex.finditer(region_text):
+            color = self._color_converter.match_to_color(match)
             if color is not None:
-                yield color_region, color, groups
-            match = self._color_regex.search(region_text, end)
+                yield regions.NormalizedRegion(offset + match.start(), offset + match.end()), color, match.lastgroup
+
+
+class CachingColorSearcher(object):
+    """
+    A color searcher that remembers search results for a buffer until the buffer's content changes.
+
+    All listeners of all views of a buffer share one caching color searcher, so every line is scanned once per buffer
+    version, however many listeners and cloned views search it.
+    """
+
+    def __init__(self, color_searcher):
+        """
+        Init a CachingColorSearcher.
+
+        Arguments:
+        - color_searcher - the color searcher to search colors with on cache misses.
+        """
+        self._color_searcher = color_searcher
+        self._change_count = None
+        self._results = _SearchResults()
+        self._lock = threading.Lock()
+
+    def search(self, view, region):
+        """
+        Get a region with a color in the view.
+
+        Given a region, yield regions inside of it that contain colors.
+        Arguments:
+        - view - the view to look in.
+        - region - the initial region to look around.
+        Yields tuples of of NormalizedRegion-s, canonical colors that are in this regions and formats of them.
+        """
+        # The view's content is read after it's change count, so the results are at least as new as the change count.
+        # Searches may run in a background thread while the view changes, so results are always stored to the cache
+        # of the version they were tagged with.
+        change_count = view.change_count()
+        with self._lock:
+            if change_count != self._change_count:
+                self._change_count = change_count
+                self._results = _SearchResults()
+            cache = self._results
+            results = cache.get(region)
+        if results is None:
+            results = list(self._color_searcher.search(view, region))
+            with self._lock:
+                cache.add(region, results)
+        return iter(results)
+
+
+class _SearchResults(object):
+    """Search results for one version of a buffer."""
+
+    def __init__(self):
+        self._results = {}
+        # Searched regions with the starts and the ends of colors found in them, to look up results of regions inside
+        # of them.
+        self._spans = []
+
+    def get(self, region):
+        """
+        Get search results for a region.
+
+        Colors never span multiple lines and regions are searched by whole lines, so results for a region inside of a
+        searched region are the colors of the searched region that lie within it.
+        Arguments:
+        - region - the region to get search results for.
+        Returns a list of search results or None, if the region was not searched yet.
+        """
+        results = self._results.get((region.a, region.b), None)
+        if results is not None:
+            return results
+        for (span, span_results, starts, ends) in self._spans:
+            if span.a <= region.a and region.b <= span.b:
+                begin = bisect.bisect_left(starts, region.a)
+                end = bisect.bisect_right(ends, region.b)
+                return span_results[begin:max(begin, end)]
+        return None
+
+    def add(self, region, results):
+        """
+        Add search results for a region.
+
+        Arguments:
+        - region - the searched region.
+        - results - the list of search results for the region, ordered by their positions.
+        """
+        self._results[(region.a, region.b)] = results
+        self._spans.append(
+            (region, results, [result[0].a for result in results], [result[0].b for result in results]))
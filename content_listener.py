@@ -1,15 +1,35 @@
 """Component for listening for loaded views and highlighting colors in them."""
 
+import hashlib
+import time
+
 try:
+    from .st_helper import running_in_st
     from .regions import NormalizedRegion, deduplicate_regions
+    from .text_change import dirty_regions
 except ValueError:
+    from st_helper import running_in_st
     from regions import NormalizedRegion, deduplicate_regions
+    from text_change import dirty_regions
+
+if running_in_st():
+    import sublime  # pylint: disable=import-error
+else:
+    from . import sublime
 
 
 class ContentListener(object):
     """Component for listening for loaded views and highlighting colors in them."""
 
-    def __init__(self, color_searcher, view, color_highlighter):
+    # The number of characters around each changed region that are rescanned as well, so that colors which were glued
+    # to or split from the changed text are found.
+    _context_margin = 1
+
+    # The number of characters searched at once when searching progressively. Chunks are extended to line ends.
+    _chunk_size = 64 * 1024
+
+    def __init__(self, color_searcher, view, color_highlighter,  # pylint: disable=too-many-arguments
+                 search_asynchronously, progressive_search_budget_ms, debug):
         """
         Init ContentListener.
 
@@ -17,37 +37,192 @@ class ContentListener(object):
         - color_searcher - a color searcher to search colors with.
         - view - a view to highlight colors in.
         - color_highlighter - a combined color highlighter to highlight colors with.
+        - search_asynchronously - whether to search the whole buffer for colors in the ST async thread.
+        - progressive_search_budget_ms - if positive, the visible part of the buffer is searched first and the rest of
+          it is searched in chunks taking about this much time each.
+        - debug - whether to enable debug mode.
         """
         self._color_searcher = color_searcher
         self._view = view
         self._color_highlighter = color_highlighter
+        self._search_asynchronously = search_asynchronously
+        self._progressive_search_budget_ms = progressive_search_budget_ms
+        self._debug = debug
+        self._tracks_text_changes = False
+        self._search_generation = 0
+        # The change count of the buffer, when it was searched completely last time.
+        self._searched_change_count = None
+        # The content hash of the buffer and it's change count, when it was hashed on save last time.
+        self._hashed_change_count = None
+        self._content_hash = None
+        self.save_searches = 0
+        self.skipped_save_searches = 0
 
     def on_load(self):
-        """Call when view's content is loaded."""
-        color_regions = self._generate_color_regions()
+        """
+        Call when view's content is loaded.
+
+        When searching asynchronously or progressively, search results are only applied if the buffer hasn't changed
+        during the search. Otherwise they are dropped and the buffer is searched again.
+        """
+        self._search_generation += 1
+        generation = self._search_generation
+        if self._progressive_search_budget_ms > 0:
+            self._search_progressively(generation)
+        elif self._search_asynchronously:
+            sublime.set_timeout_async(lambda: self._search_in_background(generation), 0)
+        else:
+            color_regions = self._generate_color_regions()
+            self._color_highlighter.highlight_regions(color_regions)
+            self._searched_completely()
+
+    def on_pre_save(self):
+        """
+        Call before the view is saved.
+
+        The buffer is searched again only if it has changed since it was searched completely last time. The content is
+        only hashed, when the change count has changed, to catch edits that were undone since the last save.
+        """
+        change_count = self._view.change_count()
+        if self._searched_change_count is not None and self._searched_change_count == change_count:
+            self.skipped_save_searches += 1
+        else:
+            content_hash = self._hash_content()
+            if (self._searched_change_count is not None and self._hashed_change_count == self._searched_change_count and
+                    self._content_hash == content_hash):
+                self._searched_change_count = change_count
+                self.skipped_save_searches += 1
+            else:
+                self.save_searches += 1
+                self.on_load()
+            # The hash is valid while the search, that was just started, is applied to the same change count.
+            self._hashed_change_count = change_count
+            self._content_hash = content_hash
+        if self._debug:
+            print("ColorHighlighter: action=save_search view=%d searches=%d skipped=%d"
+                  % (self._view.id(), self.save_searches, self.skipped_save_searches))
+
+    def _searched_completely(self):
+        self._searched_change_count = self._view.change_count()
+
+    def _hash_content(self):
+        content = self._view.substr(NormalizedRegion(0, self._view.size()).region())
+        return hashlib.md5(content.encode("utf-8")).digest()
+
+    def on_close(self):
+        """Call when the view is closed."""
+        # Cancel unfinished searches.
+        self._search_generation += 1
+
+    def _search_progressively(self, generation):
+        change_count = self._view.change_count()
+        size = self._view.size()
+        visible_region = NormalizedRegion(self._view.visible_region())
+        # Colors just outside of the visible region are highlighted right away too, so that scrolling a bit doesn't
+        # show unhighlighted colors.
+        margin = visible_region.length()
+        viewport = NormalizedRegion(
+            NormalizedRegion(self._view.line(max(0, visible_region.a - margin))).a,
+            NormalizedRegion(self._view.line(min(size, visible_region.b + margin))).b)
+        self._color_highlighter.highlight_regions_in(self._generate_color_regions_for_selection([viewport]), [viewport])
+
+        # The pending regions are a stack: the rest of the buffer is searched downwards from the viewport first.
+        pending_regions = [
+            region for region in [NormalizedRegion(0, viewport.a), NormalizedRegion(viewport.b, size)]
+            if region.length() > 0]
+        if pending_regions:
+            sublime.set_timeout(
+                lambda: self._search_pending_regions(generation, change_count, pending_regions), 0)
+        else:
+            self._searched_completely()
+
+    def _search_pending_regions(self, generation, change_count, pending_regions):
+        if generation != self._search_generation:
+            return
+        if change_count != self._view.change_count():
+            self.on_load()
+            return
+        deadline = time.time() + self._progressive_search_budget_ms / 1000.0
+        searched_regions = []
+        color_regions = []
+        while pending_regions and (not searched_regions or time.time() < deadline):
+            region = pending_regions.pop()
+            if region.length() > self._chunk_size:
+                chunk_end = NormalizedRegion(self._view.line(region.a + self._chunk_size)).b
+                if chunk_end < region.b:
+                    pending_regions.append(NormalizedRegion(chunk_end, region.b))
+                    region = NormalizedRegion(region.a, chunk_end)
+            searched_regions.append(region)
+            color_regions.extend(self._generate_color_regions_for_selection([region]))
+        self._color_highlighter.highlight_regions_in(color_regions, searched_regions)
+        if pending_regions:
+            sublime.set_timeout(
+                lambda: self._search_pending_regions(generation, change_count, pending_regions), 0)
+        else:
+            self._searched_completely()
+
+    def _search_in_background(self, generation):
+        if generation != self._search_generation:
+            return
+        change_count = self._view.change_count()
+        color_regions = list(self._generate_color_regions())
+        sublime.set_timeout(lambda: self._apply_search_results(generation, change_count, color_regions), 0)
+
+    def _apply_search_results(self, generation, change_count, color_regions):
+        # A newer search was requested, it will apply it's own results.
+        if generation != self._search_generation:
+            return
+        if change_count != self._view.change_count():
+            self.on_load()
+            return
         self._color_highlighter.highlight_regions(color_regions)
+        self._searched_completely()
 
     def on_modified(self):
-        """on_modified event."""
-        lines = deduplicate_regions(self._generate_lines_for_selection())
+        """
+        on_modified event.
+
+        Without text change information only lines with cursors on them are rescanned. When text changes are reported
+        with on_text_changed, this event is ignored.
+        """
+        if self._tracks_text_changes:
+            return
+        lines = deduplicate_regions(self._generate_lines_for_regions(self._view.sel()))
         color_regions = self._generate_color_regions_for_selection(lines)
         self._color_highlighter.highlight_regions_in(color_regions, lines)
 
-    def _generate_color_regions(self):
-        for line in self._generate_lines():
-            for (region, color, _) in self._color_searcher.search(self._view, line):
-                yield (region, color)
+    def on_text_changed(self, changes):
+        """
+        on_text_changed event.
+
+        Only lines, touched by the changes, are rescanned.
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        self._tracks_text_changes = True
+        lines = deduplicate_regions(self._generate_lines_for_regions(self._dirty_regions(changes)))
+        color_regions = self._generate_color_regions_for_selection(lines)
+        self._color_highlighter.highlight_regions_in(color_regions, lines)
 
-    def _generate_lines(self):
-        for line in self._view.lines(NormalizedRegion(0, self._view.size()).region()):
-            yield NormalizedRegion(line)
+    def _dirty_regions(self, changes):
+        size = self._view.size()
+        for region in dirty_regions(changes):
+            yield NormalizedRegion(
+                max(0, region.a - self._context_margin), min(size, region.b + self._context_margin)).region()
+
+    def _generate_color_regions(self):
+        # Colors never span multiple lines, so the whole buffer is fetched and scanned in a single pass instead of
+        # making a view.substr call for every line.
+        whole_buffer = NormalizedRegion(0, self._view.size())
+        for (region, color, _) in self._color_searcher.search(self._view, whole_buffer):
+            yield (region, color)
 
     def _generate_color_regions_for_selection(self, lines):
         for line in lines:
             for (region, color, _) in self._color_searcher.search(self._view, line):
                 yield (region, color)
 
-    def _generate_lines_for_selection(self):
-        for region in self._view.sel():
+    def _generate_lines_for_regions(self, regions):
+        for region in regions:
             for line in self._view.lines(region):
                 yield NormalizedRegion(line)
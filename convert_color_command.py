@@ -37,7 +37,7 @@ class ColorHighlighterNextColor(sublime_plugin.TextCommand):
         settings = Settings(sublime.load_settings(COLOR_HIGHLIGHTER_SETTINGS_NAME))
         formats = [value for value in sorted(settings.regex_compiler.formats.keys())]
         color_converter = ColorConverter(formats)
-        for (region, color, format_name) in _get_colors(self.view, settings, formats, color_converter):
+        for (region, color, format_name) in _get_colors(self.view, settings, color_converter):
             index = formats.index(format_name) + 1
             if index == len(formats):
                 index = 0
@@ -67,7 +67,7 @@ class ColorHighlighterPreviousColor(sublime_plugin.TextCommand):
         settings = Settings(sublime.load_settings(COLOR_HIGHLIGHTER_SETTINGS_NAME))
         formats = [value for value in sorted(settings.regex_compiler.formats.keys())]
         color_converter = ColorConverter(formats)
-        for (region, color, format_name) in _get_colors(self.view, settings, formats, color_converter):
+        for (region, color, format_name) in _get_colors(self.view, settings, color_converter):
             index = formats.index(format_name) - 1
             if index == -1:
                 index = len(formats) - 1
@@ -84,11 +84,9 @@ class ColorHighlighterPreviousColor(sublime_plugin.TextCommand):
         return _any_colors_selected(self.view)
 
 
-def _get_colors(view, settings, formats, color_converter):
+def _get_colors(view, settings, color_converter):
     color_searcher = ColorSearcher(compile_regex(settings.regex_compiler), color_converter)
-    for (region, color, match) in search_colors_in_selection(view, color_searcher):
-        format_name = _get_format_name(match, formats)
-        yield region, color, format_name
+    return search_colors_in_selection(view, color_searcher)
 
 
 def _any_colors_selected(view):
@@ -99,10 +97,3 @@ def _any_colors_selected(view):
     for _ in search_colors_in_selection(view, color_searcher):
         return True
     return False
-
-
-def _get_format_name(match, formats):
-    for name in formats:
-        if match.get(name, None) is not None:
-            return name
-    raise Exception("Unreachable code.")
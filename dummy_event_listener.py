@@ -20,6 +20,14 @@ class DummyEventListener(object):
         """Call when view's content is loaded."""
         pass
 
+    def on_pre_save(self):
+        """Call before the view is saved."""
+        pass
+
+    def on_close(self):
+        """Call when the view is closed."""
+        pass
+
     def on_hover(self, point, hover_zone):
         """on_hover event."""
         pass
@@ -27,3 +35,7 @@ class DummyEventListener(object):
     def on_modified(self):
         """on_modified event."""
         pass
+
+    def on_text_changed(self, changes):
+        """on_text_changed event."""
+        pass
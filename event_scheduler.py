@@ -0,0 +1,92 @@
+"""A module with a scheduler for merging bursts of ST events into single passes."""
+
+import time
+
+try:
+    from .st_helper import running_in_st
+except ValueError:
+    from st_helper import running_in_st
+
+if running_in_st():
+    import sublime  # pylint: disable=import-error
+else:
+    from . import sublime
+
+
+class EventScheduler(object):
+    """
+    A scheduler that debounces events per key.
+
+    Events for a key are handled after no new events came for the debounce interval, but no later than the max latency
+    after the first of them. All events that came in between are merged into one pass.
+    """
+
+    def __init__(self, debounce_ms, max_latency_ms, debug):
+        """
+        Create an event scheduler.
+
+        Arguments:
+        - debounce_ms - the time to wait for more events before handling them. If 0, events are handled immediately.
+        - max_latency_ms - the maximal time to delay handling of the first event in a burst.
+        - debug - whether to enable debug mode.
+        """
+        self._debounce_ms = debounce_ms
+        self._max_latency_ms = max(max_latency_ms, debounce_ms)
+        self._debug = debug
+        self._pending = {}
+        self.coalesced_events = 0
+
+    def schedule(self, key, event, callback):
+        """
+        Schedule an event.
+
+        Arguments:
+        - key - the key to merge events by, like a view id.
+        - event - the event name. Events with the same name for a key are merged into one.
+        - callback - the function to call with a list of pending event names, in the order they first came, when the
+          events for the key are handled.
+        """
+        if self._debounce_ms <= 0:
+            callback([event])
+            return
+
+        now = time.time()
+        pending = self._pending.get(key, None)
+        if pending is None:
+            pending = _PendingEvents(now)
+            self._pending[key] = pending
+        else:
+            self.coalesced_events += 1
+        pending.add(event, callback)
+
+        elapsed_ms = (now - pending.first_event_time) * 1000
+        delay_ms = int(round(max(0, min(self._debounce_ms, self._max_latency_ms - elapsed_ms))))
+        generation = pending.generation
+        sublime.set_timeout(lambda: self._run(key, generation), delay_ms)
+
+    def _run(self, key, generation):
+        pending = self._pending.get(key, None)
+        # A newer event has scheduled another run, which is due no later than the max latency.
+        if pending is None or pending.generation != generation:
+            return
+        del self._pending[key]
+        if self._debug and pending.count > 1:
+            print("ColorHighlighter: action=coalesce_events key=%s events=%d total_coalesced=%d"
+                  % (key, pending.count, self.coalesced_events))
+        pending.callback(pending.events)
+
+
+class _PendingEvents(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, first_event_time):
+        self.first_event_time = first_event_time
+        self.events = []
+        self.callback = None
+        self.count = 0
+        self.generation = 0
+
+    def add(self, event, callback):
+        if event not in self.events:
+            self.events.append(event)
+        self.callback = callback
+        self.count += 1
+        self.generation += 1
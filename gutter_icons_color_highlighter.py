@@ -4,14 +4,23 @@ import os
 import subprocess
 import threading
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # pylint: disable=import-error
+
 try:
     from . import path
     from .st_helper import running_in_st
-    from .color_highlighter import ColorHighlighter
+    from .color_highlighter import ColorHighlighter, RegionGroups, RegionKeys
+    from .icon_renderer import write_icon
+    from .text_change import shift_region
 except ValueError:
     import path
     from st_helper import running_in_st
-    from color_highlighter import ColorHighlighter
+    from color_highlighter import ColorHighlighter, RegionGroups, RegionKeys
+    from icon_renderer import write_icon
+    from text_change import shift_region
 
 
 if running_in_st():
@@ -33,26 +42,34 @@ class IconFactory(object):
         '%s -type TrueColorMatte -channel RGBA -size 32x32 -alpha transparent xc:none -fill "%s" -draw "%s" png32:"%s"')
     _icon_name_template = "%s_icon_%s.png"
     _bad_icon_name = "bad-icon.png"
+    renderer_builtin = "builtin"
+    renderer_convert = "convert"
+    # An empty icon path draws no icon, so regions don't flash a wrong icon while the right one is being created.
+    placeholder_icon_path = ""
 
-    def __init__(self, icons_path, sublime_icons_path, convert_command,  # pylint: disable=too-many-arguments
-                 execute_timeout_seconds, debug):
+    def __init__(self, icons_path, sublime_icons_path, renderer,  # pylint: disable=too-many-arguments
+                 convert_command, execute_timeout_seconds, debug):
         """
         Init the icon factory.
 
         Arguments:
         - icons_path - an absolute path to the icons directory.
         - sublime_icons_path - a relative to ST Packages path to the icons directory.
+        - renderer - the icon renderer to use: "builtin" to draw icons in-process or "convert" to run ImageMagick.
         - convert_command - a convert tool path.
         - execute_timeout_seconds - the timeout in seconds to wait for convert to finish.
         - debug - whether to enable debug mode.
         """
         self._icons_path = icons_path
         self._sublime_icons_path = sublime_icons_path
+        self._renderer = renderer
         self._convert_command = convert_command
         self._execute_timeout_seconds = execute_timeout_seconds
         self._debug = debug
         self._icons_cache = {}
+        self._pending_icons = {}
         self._lock = threading.Lock()
+        self._worker = None
 
     def get_icon_path(self, style, color):
         """
@@ -66,27 +83,84 @@ class IconFactory(object):
         """
         assert style in self._convert_styles
 
-        icon_name = self._icon_name_template % (style, color[1:])
-        sublime_icon_path = path.normalize_path_for_st(os.path.join(self._sublime_icons_path, icon_name))
-        # TODO(#5): return sublime_icon_path immediately and create icon in background.  # pylint: disable=fixme
-        icon_path = os.path.join(self._icons_path, icon_name)
+        with self._lock:
+            cached_icon_path = self._icons_cache.get((style, color), None)
+        if cached_icon_path is not None:
+            return cached_icon_path
+        return self._load_icon(style, color)
+
+    def request_icon_path(self, style, color, callback):
+        """
+        Get the icon path given the icon style and color without waiting for the icon to be created.
+
+        If the icon does not exist, create it in the background and call the callback with the icon path on the UI
+        thread when it's ready. Requests for an icon that is already being created wait for the same icon.
+        Arguments:
+        - style - the style of the icon.
+        - color -- the color of the icon.
+        - callback - a function of the icon path to call when the icon is created.
+        Returns the icon path, if the icon exists, or the placeholder icon path otherwise.
+        """
+        assert style in self._convert_styles
+
         cache_key = (style, color)
         with self._lock:
-            if cache_key in self._icons_cache:
-                return self._icons_cache[cache_key]
+            cached_icon_path = self._icons_cache.get(cache_key, None)
+        if cached_icon_path is not None:
+            return cached_icon_path
 
-            if os.path.exists(icon_path):
+        icon_name = self._icon_name_template % (style, color[1:])
+        if os.path.exists(os.path.join(self._icons_path, icon_name)):
+            sublime_icon_path = path.normalize_path_for_st(os.path.join(self._sublime_icons_path, icon_name))
+            with self._lock:
                 self._icons_cache[cache_key] = sublime_icon_path
-                return sublime_icon_path
+            return sublime_icon_path
 
-            if self._create_icon(style, color, icon_path)[1]:
-                self._icons_cache[cache_key] = sublime_icon_path
-                return sublime_icon_path
+        with self._lock:
+            callbacks = self._pending_icons.get(cache_key, None)
+            if callbacks is not None:
+                callbacks.append(callback)
+                return IconFactory.placeholder_icon_path
+            self._pending_icons[cache_key] = [callback]
+        self._run_in_background(lambda: self._load_icon_in_background(style, color))
+        return IconFactory.placeholder_icon_path
+
+    def _load_icon(self, style, color):
+        icon_name = self._icon_name_template % (style, color[1:])
+        sublime_icon_path = path.normalize_path_for_st(os.path.join(self._sublime_icons_path, icon_name))
+        icon_path = os.path.join(self._icons_path, icon_name)
+        if os.path.exists(icon_path) or self._create_icon(style, color, icon_path)[1]:
+            with self._lock:
+                self._icons_cache[(style, color)] = sublime_icon_path
+            return sublime_icon_path
 
         if self._debug:
             print("ColorHighlighter: action=could_not_create_icon style=%s color=%s" % (style, color))
+        return self._bad_icon_path()
+
+    def _bad_icon_path(self):
         return path.normalize_path_for_st(os.path.join(self._sublime_icons_path, IconFactory._bad_icon_name))
 
+    def _load_icon_in_background(self, style, color):
+        icon_path = None
+        try:
+            icon_path = self._load_icon(style, color)
+        finally:
+            # If creating the icon has failed, the icon is requested again next time and waiting regions get the bad
+            # icon, just like when it could not be created.
+            if icon_path is None:
+                icon_path = self._bad_icon_path()
+            with self._lock:
+                callbacks = self._pending_icons.pop((style, color), [])
+            sublime.set_timeout(lambda: _call_all(callbacks, icon_path), 0)
+
+    def _run_in_background(self, task):
+        with self._lock:
+            if self._worker is None:
+                self._worker = _IconWorker()
+                self._worker.start()
+        self._worker.submit(task)
+
     def check(self):
         """
         Get the icon path given the icon style and color.
@@ -105,6 +179,8 @@ class IconFactory(object):
         return result[0] and result[1]
 
     def _create_icon(self, style, color, icon_path):
+        if self._renderer == IconFactory.renderer_builtin:
+            return self._render_icon(style, color, icon_path)
         convert_style = IconFactory._convert_styles[style]
         convert_command = IconFactory._convert_command_template % (
             self._convert_command, color, convert_style, icon_path)
@@ -113,9 +189,23 @@ class IconFactory(object):
         success = self._run_command(convert_command)
         return (success, os.path.exists(icon_path))
 
-    def _run_command(self, command):
+    def _render_icon(self, style, color, icon_path):
+        if self._debug:
+            print("ColorHighlighter: action=render_icon style=%s color=%s" % (style, color))
+        self._create_icons_dir()
+        try:
+            write_icon(style, color, icon_path)
+        except (IOError, OSError, ValueError) as error:
+            print("ColorHighlighter: action=render_icon style=%s color=%s error=%s" % (style, color, error))
+            return (False, False)
+        return (True, os.path.exists(icon_path))
+
+    def _create_icons_dir(self):  # pylint: disable=no-self-use
         _create_if_not_exists(path.data_path(path.ABSOLUTE))
         _create_if_not_exists(path.icons_path(path.ABSOLUTE))
+
+    def _run_command(self, command):
+        self._create_icons_dir()
         process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
         try:
             output, error = process.communicate(timeout=self._execute_timeout_seconds)
@@ -132,13 +222,33 @@ class IconFactory(object):
         return True
 
 
+class _IconWorker(threading.Thread):
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._tasks = queue.Queue()
+
+    def submit(self, task):
+        self._tasks.put(task)
+
+    def run(self):
+        while True:
+            task = self._tasks.get()
+            try:
+                task()
+            except Exception as exception:  # pylint: disable=broad-except
+                print("ColorHighlighter: action=create_icon_in_background error=%s" % exception)
+
+
 class GutterIconsColorHighlighter(ColorHighlighter):
     """A color highlighter that uses gutter icons to highlight colors."""
 
-    region_name_template = "CH_icon_%s_%d_%d"
+    region_name_template = "CH_icon_%s_%d"
+    group_region_name_template = "CH_icon_%s_%s"
     region_scope = "ch_gutter_icon"
 
-    def __init__(self, view, icon_style, icon_factory, name, debug):  # pylint: disable=too-many-arguments
+    def __init__(self, view, icon_style, icon_factory, name,  # pylint: disable=too-many-arguments
+                 group_regions, debug):
         """
         Init a GutterIconsColorHighlighter.
 
@@ -147,6 +257,7 @@ class GutterIconsColorHighlighter(ColorHighlighter):
         - icon_style - the icon style.
         - icon_factory - the icon factory to create icons with.
         - name - the name of the color highlighter.
+        - group_regions - whether to highlight all regions with the same icon with a single region key.
         - debug - whether to enable debug mode.
         """
         assert icon_style in IconFactory._convert_styles  # pylint: disable=protected-access
@@ -155,6 +266,12 @@ class GutterIconsColorHighlighter(ColorHighlighter):
         self._icon_factory = icon_factory
         self._name = name
         self._debug = debug
+        self._region_keys = RegionKeys(GutterIconsColorHighlighter.region_name_template, name)
+        self._region_groups = None
+        if group_regions:
+            self._region_groups = RegionGroups()
+        # Colors with icons that are being created, with regions that wait for them.
+        self._regions_waiting_for_icons = {}
 
     def highlight_region(self, context, value):
         """
@@ -166,8 +283,13 @@ class GutterIconsColorHighlighter(ColorHighlighter):
         Returns True, if highlighted, False otherwise.
         """
         (region, color) = value
-        icon_path = self._icon_factory.get_icon_path(self._icon_style, color)
-        region_key = GutterIconsColorHighlighter.region_name_template % (self._name, region.a, region.b)
+        if self._region_groups is not None:
+            self._region_groups.add(color, region)
+            return
+        icon_path = self._request_icon_path(color)
+        if icon_path == IconFactory.placeholder_icon_path:
+            self._regions_waiting_for_icons[color].add(region)
+        region_key = self._region_keys.add(region)
         if self._debug:
             print("ColorHighlighter: action=highlight highlighter=GutterIconsColorHighlighter region=%s color=%s"
                   % (region, color))
@@ -182,9 +304,88 @@ class GutterIconsColorHighlighter(ColorHighlighter):
         - context - a dict with color highlighter run data.
         - value - tuple (region to unhighlight, it's color).
         """
-        (region, _) = value
-        region_key = GutterIconsColorHighlighter.region_name_template % (self._name, region.a, region.b)
-        self._view.erase_regions(region_key)
+        (region, color) = value
+        if self._region_groups is not None:
+            self._region_groups.remove(color, region)
+            return
+        regions_waiting_for_icon = self._regions_waiting_for_icons.get(color, None)
+        if regions_waiting_for_icon is not None:
+            regions_waiting_for_icon.discard(region)
+        region_key = self._region_keys.pop(region)
+        if region_key is not None:
+            self._view.erase_regions(region_key)
+
+    def highlight_regions_done(self, context):  # noqa: D401
+        """
+        Called after all calls to highlight_region and unhighlight_region from highlight_regions have been made.
+
+        Arguments:
+        - context - a dict with color highlighter run data.
+        """
+        if self._region_groups is None:
+            return
+        for (color, regions) in self._region_groups.pop_changed():
+            region_key = GutterIconsColorHighlighter.group_region_name_template % (self._name, color[1:])
+            if not regions:
+                self._view.erase_regions(region_key)
+                continue
+            icon_path = self._request_icon_path(color)
+            if self._debug:
+                print("ColorHighlighter: action=highlight highlighter=GutterIconsColorHighlighter color=%s regions=%d"
+                      % (color, len(regions)))
+            self._view.add_regions(
+                region_key, [region.region() for region in regions], GutterIconsColorHighlighter.region_scope,
+                icon_path, sublime.HIDDEN)
+
+    def shift_regions(self, changes):
+        """
+        Shift highlighted regions after the text in the view has changed.
+
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        if self._region_groups is not None:
+            self._region_groups.shift(changes)
+            return
+        self._region_keys.shift(changes)
+        for color in self._regions_waiting_for_icons:
+            shifted_regions = set()
+            for region in self._regions_waiting_for_icons[color]:
+                shifted_region = shift_region(region, changes)
+                if shifted_region is not None:
+                    shifted_regions.add(shifted_region)
+            self._regions_waiting_for_icons[color] = shifted_regions
+
+    def _request_icon_path(self, color):
+        # One callback per color is enough, it updates all regions waiting for the icon.
+        if color in self._regions_waiting_for_icons:
+            return IconFactory.placeholder_icon_path
+        icon_path = self._icon_factory.request_icon_path(
+            self._icon_style, color, lambda icon_path: self._on_icon_ready(color, icon_path))
+        if icon_path == IconFactory.placeholder_icon_path:
+            self._regions_waiting_for_icons[color] = set()
+        return icon_path
+
+    def _on_icon_ready(self, color, icon_path):
+        regions = self._regions_waiting_for_icons.pop(color, set())
+        if self._region_groups is not None:
+            regions = self._region_groups.regions(color)
+            if regions:
+                region_key = GutterIconsColorHighlighter.group_region_name_template % (self._name, color[1:])
+                self._view.add_regions(
+                    region_key, [region.region() for region in regions], GutterIconsColorHighlighter.region_scope,
+                    icon_path, sublime.HIDDEN)
+            return
+        for region in regions:
+            region_key = self._region_keys.get(region)
+            if region_key is not None:
+                self._view.add_regions(
+                    region_key, [region.region()], GutterIconsColorHighlighter.region_scope, icon_path, sublime.HIDDEN)
+
+
+def _call_all(callbacks, icon_path):
+    for callback in callbacks:
+        callback(icon_path)
 
 
 def _decode_data(data):
@@ -0,0 +1,106 @@
+"""A module for drawing gutter icons without external tools."""
+
+import struct
+import zlib
+
+
+ICON_SIZE = 32
+
+# The number of samples per pixel side used for antialiasing shape edges.
+_SAMPLES = 4
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _circle_contains(x, y):  # pylint: disable=invalid-name
+    # Keep in sync with the "circle 15,16 8,10" ImageMagick primitive: the center and a point on the circle.
+    return (x - 15) ** 2 + (y - 16) ** 2 <= (15 - 8) ** 2 + (16 - 10) ** 2
+
+
+def _square_contains(x, y):  # pylint: disable=invalid-name
+    # Keep in sync with the "rectangle 4,4 24,24" ImageMagick primitive.
+    return 3.5 <= x <= 24.5 and 3.5 <= y <= 24.5
+
+
+_SHAPES = {
+    "circle": _circle_contains,
+    "square": _square_contains,
+}
+
+
+def render_icon(style, color):
+    """
+    Render an icon.
+
+    Arguments:
+    - style - the style of the icon.
+    - color - the color of the icon in #RRGGBBAA format.
+    Returns the PNG file content for the icon.
+    """
+    assert style in _SHAPES
+    red = int(color[1:3], 16)
+    green = int(color[3:5], 16)
+    blue = int(color[5:7], 16)
+    alpha = int(color[7:9], 16)
+    coverage = _coverage(_SHAPES[style])
+    transparent_pixel = struct.pack("BBBB", 0, 0, 0, 0)
+    pixels = {}
+    rows = []
+    for row in coverage:
+        data = [b"\x00"]
+        for value in row:
+            if value == 0:
+                data.append(transparent_pixel)
+                continue
+            pixel = pixels.get(value, None)
+            if pixel is None:
+                pixel = struct.pack("BBBB", red, green, blue, int(round(alpha * value)))
+                pixels[value] = pixel
+            data.append(pixel)
+        rows.append(b"".join(data))
+    return _png(ICON_SIZE, ICON_SIZE, b"".join(rows))
+
+
+def write_icon(style, color, icon_path):
+    """
+    Render an icon and write it to a file.
+
+    Arguments:
+    - style - the style of the icon.
+    - color - the color of the icon in #RRGGBBAA format.
+    - icon_path - the path to write the icon to.
+    """
+    content = render_icon(style, color)
+    with open(icon_path, "wb") as file:
+        file.write(content)
+
+
+def _coverage(contains):
+    total_samples = float(_SAMPLES * _SAMPLES)
+    offsets = [(index + 0.5) / _SAMPLES - 0.5 for index in range(_SAMPLES)]
+    coverage = []
+    for y in range(ICON_SIZE):  # pylint: disable=invalid-name
+        row = []
+        for x in range(ICON_SIZE):  # pylint: disable=invalid-name
+            samples = 0
+            for y_offset in offsets:
+                for x_offset in offsets:
+                    if contains(x + x_offset, y + y_offset):
+                        samples += 1
+            row.append(samples / total_samples)
+        coverage.append(row)
+    return coverage
+
+
+def _png(width, height, raw_data):
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"".join([
+        _PNG_SIGNATURE,
+        _png_chunk(b"IHDR", header),
+        _png_chunk(b"IDAT", zlib.compress(raw_data, 9)),
+        _png_chunk(b"IEND", b""),
+    ])
+
+
+def _png_chunk(chunk_type, data):
+    checksum = zlib.crc32(chunk_type + data) & 0xffffffff
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", checksum)
@@ -11,36 +11,44 @@ try:
     from . import st_helper
     from . import path
     from .color_converter import ColorConverter
-    from .color_searcher import ColorSearcher
+    from .color_searcher import CachingColorSearcher, ColorSearcher
     from .dummy_event_listener import DummyEventListener
+    from .event_scheduler import EventScheduler
     from .settings import Settings, COLOR_HIGHLIGHTER_SETTINGS_NAME
     from .content_listener import ContentListener
-    from .color_highlighter import CachingColorHighlighter
+    from .color_highlighter import CachingColorHighlighter, QuantizingColorHighlighter
     from .phantoms_color_highlighter import PhantomColorHighlighter
     from .gutter_icons_color_highlighter import IconFactory, GutterIconsColorHighlighter
-    from .color_scheme import init_color_scheme_dir, parse_color_scheme
-    from .color_scheme_color_highlighter import ColorSchemeBuilder, ColorSchemeColorHighlighter
+    from .color_scheme import init_color_scheme_dir, parse_color_scheme, parse_color_scheme_override
+    from .color_scheme_color_highlighter import ColorSchemeBuilder, ColorSchemeColorHighlighter, ColorSchemeUsage
     from .color_selection_listener import ColorSelectionListener
     from .color_hover_listener import ColorHoverListener
     from .load_resource import copy_resource
+    from .palette import Palette
     from .regex_compiler import compile_regex
+    from .regions import NormalizedRegion
+    from .text_change import TextChange
 except ValueError:
     import st_helper
     import path
     from color_converter import ColorConverter
-    from color_searcher import ColorSearcher
+    from color_searcher import CachingColorSearcher, ColorSearcher
     from dummy_event_listener import DummyEventListener
+    from event_scheduler import EventScheduler
     from settings import Settings, COLOR_HIGHLIGHTER_SETTINGS_NAME
     from content_listener import ContentListener
     from phantoms_color_highlighter import PhantomColorHighlighter
-    from color_highlighter import CachingColorHighlighter
+    from color_highlighter import CachingColorHighlighter, QuantizingColorHighlighter
     from gutter_icons_color_highlighter import IconFactory, GutterIconsColorHighlighter
-    from color_scheme import init_color_scheme_dir, parse_color_scheme
-    from color_scheme_color_highlighter import ColorSchemeBuilder, ColorSchemeColorHighlighter
+    from color_scheme import init_color_scheme_dir, parse_color_scheme, parse_color_scheme_override
+    from color_scheme_color_highlighter import ColorSchemeBuilder, ColorSchemeColorHighlighter, ColorSchemeUsage
     from color_selection_listener import ColorSelectionListener
     from color_hover_listener import ColorHoverListener
     from load_resource import copy_resource
+    from palette import Palette
     from regex_compiler import compile_regex
+    from regions import NormalizedRegion
+    from text_change import TextChange
 
 # ST2's python doesn't have XMLTreeBuilder, this code is supposed to fix this, see
 # https://stackoverflow.com/questions/1068510/using-simplexmltreebuilder-in-elementtree for details.
@@ -87,6 +95,8 @@ class ColorHighlighterComponents(object):
         """Create a ColorHighlighterComponents object."""
         self._settings = Settings(sublime.load_settings(COLOR_HIGHLIGHTER_SETTINGS_NAME))
         self._color_searcher = None
+        self._buffer_color_searchers = {}
+        self._view_buffers = {}
         self._fake_color_scheme_data = None
         self._color_scheme_builder = None
         self._color_selection_event_listener = None
@@ -94,11 +104,12 @@ class ColorHighlighterComponents(object):
         for name in self._settings.search_colors_in.color_searcher_names:
             self._color_highlighters[name] = {}
         self._icon_factory = None
+        self._palette = None
         color_searchers = self._settings.search_colors_in
         if _gutter_icons_color_highlighter_enabled(self._settings):
             self._icon_factory = self.provide_icon_factory()
             if not self._icon_factory.check():
-                print("Highlighting colors with gutter icons is not supported with current ImageMagick setup. " +
+                print("Highlighting colors with gutter icons is not supported with current icon renderer setup. " +
                       "Try configuring the \"icon_factory setting\"")
                 color_searchers.selection.color_highlighters.gutter_icons.enabled = False
                 color_searchers.all_content.color_highlighters.gutter_icons.enabled = False
@@ -126,6 +137,23 @@ class ColorHighlighterComponents(object):
             self.provide_color_converter())
         return self._color_searcher
 
+    def provide_buffer_color_searcher(self, view):
+        """
+        Provide a color searcher for a view's buffer, shared by all listeners of all views of the buffer.
+
+        Arguments:
+        - view -- the view.
+        """
+        buffer_id = view.buffer_id()
+        self._view_buffers[view.id()] = buffer_id
+        color_searcher = self._buffer_color_searchers.get(buffer_id, None)
+        if color_searcher is not None:
+            return color_searcher
+
+        color_searcher = CachingColorSearcher(self.provide_color_searcher())
+        self._buffer_color_searchers[buffer_id] = color_searcher
+        return color_searcher
+
     def provide_color_selection_listener(self, view):  # pylint: disable=invalid-name
         """
         Provide a color selection listener for a view.
@@ -136,7 +164,7 @@ class ColorHighlighterComponents(object):
         if not self._settings.search_colors_in.selection.enabled:
             return DummyEventListener()
         return ColorSelectionListener(
-            self.provide_color_searcher(), view,
+            self.provide_buffer_color_searcher(view), view,
             self.provide_color_highlighter(view, self._settings.search_colors_in.selection))
 
     def provide_color_hover_listener(self, view):  # pylint: disable=invalid-name
@@ -149,7 +177,7 @@ class ColorHighlighterComponents(object):
         if not self._settings.search_colors_in.hover.enabled:
             return DummyEventListener()
         return ColorHoverListener(
-            self.provide_color_searcher(), view,
+            self.provide_buffer_color_searcher(view), view,
             self.provide_color_highlighter(view, self._settings.search_colors_in.hover))
 
     def provide_content_listener(self, view):
@@ -162,8 +190,10 @@ class ColorHighlighterComponents(object):
         if not self._settings.search_colors_in.all_content.enabled:
             return DummyEventListener()
         return ContentListener(
-            self.provide_color_searcher(), view,
-            self.provide_color_highlighter(view, self._settings.search_colors_in.all_content))
+            self.provide_buffer_color_searcher(view), view,
+            self.provide_color_highlighter(view, self._settings.search_colors_in.all_content),
+            self._settings.experimental.asynchronously_search_colors,
+            self._settings.experimental.progressive_search_budget_ms, self._settings.debug)
 
     def provide_color_selection(self, view):
         """
@@ -185,7 +215,12 @@ class ColorHighlighterComponents(object):
         if self._fake_color_scheme_data is not None:
             return self._fake_color_scheme_data
 
-        self._fake_color_scheme_data = parse_color_scheme(self.provide_color_scheme(), self._settings.debug)
+        if self._settings.experimental.use_color_scheme_overrides:
+            self._fake_color_scheme_data = parse_color_scheme_override(
+                self.provide_color_scheme(), self._settings.debug)
+        # Fall back to a fake color scheme, if the color scheme can't be overridden.
+        if self._fake_color_scheme_data is None:
+            self._fake_color_scheme_data = parse_color_scheme(self.provide_color_scheme(), self._settings.debug)
         return self._fake_color_scheme_data
 
     def provide_fake_color_scheme_writer(self):  # pylint: disable=invalid-name
@@ -208,11 +243,25 @@ class ColorHighlighterComponents(object):
             return self._color_scheme_builder
 
         _, color_scheme_data, _ = self.provide_fake_color_scheme_data()
+        gc_settings = self._settings.color_scheme_gc
+        color_usage = None
+        if gc_settings.enabled:
+            init_color_scheme_dir()
+            color_usage = ColorSchemeUsage(path.color_scheme_usage_path(self.provide_color_scheme(), path.ABSOLUTE))
+            color_usage.load()
         self._color_scheme_builder = ColorSchemeBuilder(
             color_scheme_data, self.provide_fake_color_scheme_writer(),
-            self._settings.experimental.asynchronosly_update_color_scheme)
+            self._settings.experimental.asynchronosly_update_color_scheme,
+            self._settings.experimental.color_scheme_write_interval_ms, color_usage)
         return self._color_scheme_builder
 
+    def collect_unused_colors(self):
+        """Remove unused colors from the color scheme, if it's used and collecting unused colors is enabled."""
+        gc_settings = self._settings.color_scheme_gc
+        if not gc_settings.enabled or self._color_scheme_builder is None:
+            return
+        self._color_scheme_builder.collect_unused_colors(gc_settings.max_unused_sessions, gc_settings.max_colors)
+
     def provide_icon_factory(self):
         """Provide an icon factory."""
         if self._icon_factory is not None:
@@ -221,9 +270,18 @@ class ColorHighlighterComponents(object):
         settings = self._settings.icon_factory
         self._icon_factory = IconFactory(
             path.icons_path(path.ABSOLUTE), path.icons_path(path.RELATIVE),
-            settings.convert_command, settings.convert_timeout, self._settings.debug)
+            settings.renderer, settings.convert_command, settings.convert_timeout, self._settings.debug)
         return self._icon_factory
 
+    def provide_palette(self):
+        """Provide a palette to snap highlighted colors to."""
+        if self._palette is not None:
+            return self._palette
+
+        settings = self._settings.color_palette
+        self._palette = Palette(settings.size)
+        return self._palette
+
     def provide_color_highlighter(self, view, searcher):
         """
         Provide a color highlighter for a view.
@@ -238,28 +296,53 @@ class ColorHighlighterComponents(object):
 
         color_highlighters = []
         if searcher.color_highlighters.color_scheme.enabled:
-            color_highlighters.append(ColorSchemeColorHighlighter(
+            color_highlighters.append(self._quantize_colors(ColorSchemeColorHighlighter(
                 view, searcher.color_highlighters.color_scheme.highlight_style, self.provide_color_scheme_builder(),
-                searcher.name, self._settings.debug))
+                searcher.name, self._settings.experimental.group_regions, self._settings.debug)))
         if searcher.color_highlighters.gutter_icons.enabled:
-            self.provide_fake_color_scheme_writer().fix_color_scheme_for_gutter_colors()
-            color_highlighters.append(GutterIconsColorHighlighter(
+            self.provide_color_scheme_builder().fix_color_scheme_for_gutter_colors()
+            color_highlighters.append(self._quantize_colors(GutterIconsColorHighlighter(
                 view, searcher.color_highlighters.gutter_icons.icon_style, self.provide_icon_factory(), searcher.name,
-                self._settings.debug))
+                self._settings.experimental.group_regions, self._settings.debug)))
         if searcher.color_highlighters.phantoms.enabled:
             color_highlighters.append(PhantomColorHighlighter(
                 view, searcher.name, searcher.color_highlighters.phantoms.style,
-                searcher.color_highlighters.phantoms.length, self._settings.debug))
+                searcher.color_highlighters.phantoms.length, self._settings.experimental.use_phantom_sets,
+                self._settings.debug))
         color_highlighter = CachingColorHighlighter(color_highlighters)
         self._color_highlighters[searcher.name][view.id()] = color_highlighter
         return color_highlighter
 
+    def _quantize_colors(self, color_highlighter):
+        # Only highlighters that create a color scheme scope or an icon per color are quantized, phantoms are cheap
+        # and keep exact colors.
+        if not self._settings.color_palette.enabled:
+            return color_highlighter
+        return QuantizingColorHighlighter(color_highlighter, self.provide_palette())
+
+    def forget_view(self, view_id):
+        """
+        Forget all components for a closed view.
+
+        Arguments:
+        - view_id - the id of the view.
+        """
+        for name in self._color_highlighters:
+            self._color_highlighters[name].pop(view_id, None)
+        buffer_id = self._view_buffers.pop(view_id, None)
+        if buffer_id is not None and buffer_id not in self._view_buffers.values():
+            self._buffer_color_searchers.pop(buffer_id, None)
+
     def provide_color_selection_event_listener(self):  # pylint: disable=invalid-name
         """Provide a color selection event listener."""
         if self._color_selection_event_listener is not None:
             return self._color_selection_event_listener
 
-        self._color_selection_event_listener = ColorSelectionEventListener(self._settings.file_extensions)
+        settings = self._settings.event_scheduler
+        self._color_selection_event_listener = ColorSelectionEventListener(
+            self._settings.file_extensions,
+            EventScheduler(settings.debounce_ms, settings.max_latency_ms, self._settings.debug),
+            self._settings.experimental.virtualize_highlightings, self._settings.debug)
         return self._color_selection_event_listener
 
 
@@ -274,6 +357,13 @@ def _color_scheme_color_highlighter_enabled(settings):
         (hover_seacher.enabled and hover_seacher.color_highlighters.color_scheme.enabled))
 
 
+def _view_is_valid(view):
+    # ST2 doesn't have View.is_valid, closed views don't have a buffer there.
+    if hasattr(view, "is_valid"):
+        return view.is_valid()
+    return view.buffer_id() != 0
+
+
 def _gutter_icons_color_highlighter_enabled(settings):
     color_searchers = settings.search_colors_in
     selection_searcher = color_searchers.selection
@@ -298,6 +388,9 @@ class ColorHighlighterPlugin(object):
     _fake_color_scheme = None
 
     _ON_SETTINGS_CHANGE_KEY = "ColorHighlighter"
+    # Unused colors are collected when all open views have been loaded and highlighted. Until then it's unknown which
+    # colors they use.
+    _LOADING_VIEWS_POLL_INTERVAL_MS = 1000
 
     @staticmethod
     def init():
@@ -328,6 +421,24 @@ class ColorHighlighterPlugin(object):
             for view in window.views():
                 ColorHighlighterPlugin.color_selection_event_listener.on_new(view)
                 ColorHighlighterPlugin.color_selection_event_listener.on_selection_modified(view)
+        components = ColorHighlighterPlugin.components
+        sublime.set_timeout(
+            lambda: ColorHighlighterPlugin._collect_unused_colors(components),
+            ColorHighlighterPlugin._LOADING_VIEWS_POLL_INTERVAL_MS)
+
+    @staticmethod
+    def _collect_unused_colors(components):
+        # The plugin was restarted, the new components collect unused colors themselves.
+        if components is not ColorHighlighterPlugin.components:
+            return
+        for window in sublime.windows():
+            for view in window.views():
+                if view.is_loading():
+                    sublime.set_timeout(
+                        lambda: ColorHighlighterPlugin._collect_unused_colors(components),
+                        ColorHighlighterPlugin._LOADING_VIEWS_POLL_INTERVAL_MS)
+                    return
+        components.collect_unused_colors()
 
     @staticmethod
     def _on_settings_change():
@@ -379,23 +490,51 @@ class ColorSelection(object):
         self._color_hover_listener = color_hover_listener
         self._color_selection_listener = color_selection_listener
         self._content_listener = content_listener
+        self._viewport = None
 
     def on_pre_save(self):
         """on_pre_save event."""
-        self._content_listener.on_load()
+        self._content_listener.on_pre_save()
 
     def on_new(self):
         """on_new event."""
         self._content_listener.on_load()
 
     def on_clone(self):
-        """on_clone event."""
+        """
+        on_clone event.
+
+        The buffer was already searched for another view, so the clone is highlighted from the shared search results.
+        """
         self._content_listener.on_load()
 
     def on_load(self):
         """on_load event."""
         self._content_listener.on_load()
 
+    def on_close(self):
+        """on_close event."""
+        self._content_listener.on_close()
+
+    def on_viewport_changed(self, visible_region):
+        """
+        Render only highlightings around the visible region.
+
+        Arguments:
+        - visible_region - the visible region of the view.
+        """
+        visible_region = NormalizedRegion(visible_region)
+        # Highlightings just outside of the visible region are rendered too, so that scrolling a bit doesn't show
+        # unhighlighted colors.
+        margin = visible_region.length()
+        viewport = NormalizedRegion(max(0, visible_region.a - margin), visible_region.b + margin)
+        if viewport == self._viewport:
+            return
+        self._viewport = viewport
+        self._content_color_highlighter.set_viewport(viewport)
+        self._selection_color_highlighter.set_viewport(viewport)
+        self._hover_color_highlighter.set_viewport(viewport)
+
     def on_selection_modified(self):
         """on_selection_modified event."""
         self._color_selection_listener.on_selection_modified()
@@ -411,8 +550,21 @@ class ColorSelection(object):
         self._color_selection_listener.on_modified()
         self._color_hover_listener.on_modified()
 
+    def on_text_changed(self, changes):
+        """
+        on_text_changed event.
+
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        self._content_color_highlighter.shift_regions(changes)
+        self._selection_color_highlighter.shift_regions(changes)
+        self._hover_color_highlighter.shift_regions(changes)
+        self._content_listener.on_text_changed(changes)
+
     def clear_all(self):
-        """Clean up all highlightings."""
+        """Clean up all highlightings and cancel unfinished searches, so that they don't highlight colors again."""
+        self._content_listener.on_close()
         self._content_color_highlighter.clear_all()
         self._selection_color_highlighter.clear_all()
         self._hover_color_highlighter.clear_all()
@@ -421,16 +573,29 @@ class ColorSelection(object):
 class ColorSelectionEventListener(object):
     """The main class for listening ST events."""
 
-    def __init__(self, file_extenstions):
+    # ST doesn't report scrolling, so visible regions of views are checked periodically.
+    _viewport_poll_interval_ms = 100
+    # ST doesn't always report closed views, for example when a window is closed, so states of views that don't exist
+    # anymore are evicted periodically.
+    _sweep_interval_ms = 60 * 1000
+
+    def __init__(self, file_extenstions, event_scheduler, virtualize_highlightings, debug):
         """
         Initialize the event listener.
 
         Arguments:
         - file_extenstions - a list with file extensions in which colors should be highlighted.
+        - event_scheduler - the scheduler for merging bursts of modification events.
+        - virtualize_highlightings - whether to render only highlightings around visible regions of views.
+        - debug - whether to enable debug mode.
         """
         self._listening = False
         self._view_listeners = {}
+        self._views = {}
         self._file_extenstions = file_extenstions
+        self._event_scheduler = event_scheduler
+        self._virtualize_highlightings = virtualize_highlightings
+        self._debug = debug
 
     def on_pre_save(self, view):
         """on_pre_save event."""
@@ -464,13 +629,51 @@ class ColorSelectionEventListener(object):
             return
         self._view_listeners[view.id()].on_clone()
 
+    def on_pre_close(self, view):
+        """on_pre_close event."""
+        if not self._listening:
+            return
+        self._evict_view(view.id())
+
+    def on_close(self, view):
+        """on_close event."""
+        if not self._listening:
+            return
+        # ST2 doesn't have on_pre_close.
+        self._evict_view(view.id())
+
+    def live_views_count(self):
+        """Get the number of views with highlighting state."""
+        return len(self._view_listeners)
+
+    def _evict_view(self, view_id):
+        self._views.pop(view_id, None)
+        view_listener = self._view_listeners.pop(view_id, None)
+        if view_listener is None:
+            return
+        view_listener.on_close()
+        # Unhighlighting releases color scheme colors used by the view.
+        view_listener.clear_all()
+        ColorHighlighterPlugin.components.forget_view(view_id)
+        if self._debug:
+            print("ColorHighlighter: action=evict_view view=%d live_views=%d" % (view_id, self.live_views_count()))
+
+    def _sweep_closed_views(self):
+        if not self._listening:
+            return
+        # Panels, widgets and previews are not in window views, so a view is only closed when it's not valid anymore.
+        for view_id in list(self._view_listeners.keys()):
+            if not _view_is_valid(self._views[view_id]):
+                self._evict_view(view_id)
+        sublime.set_timeout(self._sweep_closed_views, self._sweep_interval_ms)
+
     def on_selection_modified(self, view):
         """on_selection_modified event."""
         if not self._listening:
             return
         if not self._init_view(view):
             return
-        self._view_listeners[view.id()].on_selection_modified()
+        self._schedule(view.id(), "on_selection_modified")
 
     def on_hover(self, view, point, hover_zone):
         """on_hover event."""
@@ -486,7 +689,26 @@ class ColorSelectionEventListener(object):
             return
         if not self._init_view(view):
             return
-        self._view_listeners[view.id()].on_modified()
+        self._schedule(view.id(), "on_modified")
+
+    def on_text_changed(self, view, changes):
+        """on_text_changed event."""
+        if not self._listening:
+            return
+        if not self._init_view(view):
+            return
+        self._view_listeners[view.id()].on_text_changed(changes)
+
+    def _schedule(self, view_id, event):
+        self._event_scheduler.schedule(view_id, event, lambda events: self._run_events(view_id, events))
+
+    def _run_events(self, view_id, events):
+        view_listener = self._view_listeners.get(view_id, None)
+        # The highlightings were cleared before the events were handled.
+        if view_listener is None:
+            return
+        for event in events:
+            getattr(view_listener, event)()
 
     def _init_view(self, view):
         view_id = view.id()
@@ -496,12 +718,17 @@ class ColorSelectionEventListener(object):
         if not self._supported_file_extension(view):
             return False
         self._view_listeners[view_id] = ColorHighlighterPlugin.components.provide_color_selection(view)
-        if _color_scheme_color_highlighter_enabled(ColorHighlighterPlugin.components.provide_settings()):
+        self._views[view_id] = view
+        if self._virtualize_highlightings:
+            self._view_listeners[view_id].on_viewport_changed(view.visible_region())
+        settings = ColorHighlighterPlugin.components.provide_settings()
+        if _color_scheme_color_highlighter_enabled(settings):
             color_scheme = ColorHighlighterPlugin.components.provide_color_scheme()
-            # Do not change the color scheme on widgets.
-            if not view.settings().get("color_scheme", None).endswith(".stTheme"):
-                set_fake_color_scheme(
-                    view, color_scheme, ColorHighlighterPlugin.components.provide_fake_color_scheme())
+            fake_color_scheme = ColorHighlighterPlugin.components.provide_fake_color_scheme()
+            # An override is merged into the color scheme itself. Do not change the color scheme on widgets.
+            if (fake_color_scheme != color_scheme and
+                    not view.settings().get("color_scheme", None).endswith(".stTheme")):
+                set_fake_color_scheme(view, color_scheme, fake_color_scheme)
         return True
 
     def _supported_file_extension(self, view):
@@ -514,13 +741,31 @@ class ColorSelectionEventListener(object):
 
     def clear_all(self):
         """Clean up all highlightings."""
+        self._listening = False
         for view_id in self._view_listeners:
             self._view_listeners[view_id].clear_all()
         self._view_listeners = {}
+        self._views = {}
 
     def start(self):
         """Start listening to ST events."""
         self._listening = True
+        sublime.set_timeout(self._sweep_closed_views, self._sweep_interval_ms)
+        if self._virtualize_highlightings:
+            self._poll_viewports()
+
+    def _poll_viewports(self):
+        if not self._listening:
+            return
+        for window in sublime.windows():
+            for group in range(window.num_groups()):
+                view = window.active_view_in_group(group)
+                if view is None:
+                    continue
+                view_listener = self._view_listeners.get(view.id(), None)
+                if view_listener is not None:
+                    view_listener.on_viewport_changed(view.visible_region())
+        sublime.set_timeout(self._poll_viewports, self._viewport_poll_interval_ms)
 
 
 class ColorSelectionEventSublimeListener(sublime_plugin.EventListener):
@@ -554,6 +799,20 @@ class ColorSelectionEventSublimeListener(sublime_plugin.EventListener):
             return
         ColorHighlighterPlugin.components.provide_color_selection_event_listener().on_clone(view)
 
+    def on_pre_close(self, view):  # pylint: disable=no-self-use
+        """on_pre_close event."""
+        # ST2 calls these events before our simulated plugin_loaded.
+        if ColorHighlighterPlugin.components is None:
+            return
+        ColorHighlighterPlugin.components.provide_color_selection_event_listener().on_pre_close(view)
+
+    def on_close(self, view):  # pylint: disable=no-self-use
+        """on_close event."""
+        # ST2 calls these events before our simulated plugin_loaded.
+        if ColorHighlighterPlugin.components is None:
+            return
+        ColorHighlighterPlugin.components.provide_color_selection_event_listener().on_close(view)
+
     def on_selection_modified(self, view):  # pylint: disable=no-self-use
         """on_selection_modified event."""
         # ST2 calls these events before our simulated plugin_loaded.
@@ -586,6 +845,21 @@ class ColorSelectionEventSublimeListener(sublime_plugin.EventListener):
         ColorHighlighterPlugin.components.provide_color_selection_event_listener().on_modified(view)
 
 
+# ST3 doesn't have text change listeners, so the plugin falls back to rescanning lines with cursors on them.
+if hasattr(sublime_plugin, "TextChangeListener"):
+    class ColorSelectionTextChangeSublimeListener(sublime_plugin.TextChangeListener):  # pylint: disable=no-member
+        """The class for listening to detailed text changes in ST buffers."""
+
+        def on_text_changed(self, changes):
+            """on_text_changed event."""
+            if ColorHighlighterPlugin.components is None:
+                return
+            text_changes = [TextChange(change.a.pt, change.b.pt, len(change.str)) for change in changes]
+            event_listener = ColorHighlighterPlugin.components.provide_color_selection_event_listener()
+            for view in self.buffer.views():
+                event_listener.on_text_changed(view, text_changes)
+
+
 def _remove_old_user_settings():
     settings = sublime.load_settings(COLOR_HIGHLIGHTER_SETTINGS_NAME)  # pylint: disable=assignment-from-none
     if settings.get("channels", None) is None:
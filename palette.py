@@ -0,0 +1,175 @@
+"""A module with a bounded color palette to snap highlighted colors to."""
+
+import threading
+
+
+class Palette(object):
+    """
+    A bounded palette of colors.
+
+    Colors are added to the palette as they are seen, until the palette is full. After that the palette doesn't change
+    and every new color is snapped to the perceptually nearest color in it. Colors are compared in the CIE Lab color
+    space with alpha.
+
+    A color is always snapped to the same palette color: colors in the palette are snapped to themselves and the
+    palette is fixed when other colors are snapped. So the remembered quantized colors are only a cache and are
+    dropped when there are too many of them.
+    """
+
+    # The maximal number of remembered quantized colors.
+    _max_quantized_colors = 4096
+
+    def __init__(self, size):
+        """
+        Create a palette.
+
+        Arguments:
+        - size - the maximal number of colors in the palette.
+        """
+        self._size = size
+        self._tree = KdTree()
+        self._quantized_colors = {}
+        self._lock = threading.Lock()
+
+    def quantize(self, color):
+        """
+        Snap a color to the palette.
+
+        Arguments:
+        - color - the color in #RRGGBBAA format.
+        Returns the palette color in #RRGGBBAA format.
+        """
+        with self._lock:
+            quantized_color = self._quantized_colors.get(color, None)
+            if quantized_color is not None:
+                return quantized_color
+
+            point = color_to_lab(color)
+            nearest = self._tree.nearest(point)
+            if nearest is not None and (nearest[2] == 0 or len(self._tree) >= self._size):
+                quantized_color = nearest[1]
+            else:
+                self._tree.add(point, color)
+                quantized_color = color
+            if len(self._quantized_colors) >= Palette._max_quantized_colors:
+                self._quantized_colors = {}
+            self._quantized_colors[color] = quantized_color
+            return quantized_color
+
+
+class KdTree(object):
+    """A k-d tree for the nearest point lookups."""
+
+    def __init__(self):
+        """Create an empty k-d tree."""
+        self._root = None
+        self._size = 0
+
+    def add(self, point, value):
+        """
+        Add a point to the tree.
+
+        Arguments:
+        - point - a tuple of coordinates. All points in the tree must have the same number of coordinates.
+        - value - the value for the point.
+        """
+        self._size += 1
+        node = _KdNode(point, value)
+        if self._root is None:
+            self._root = node
+            return
+        parent = self._root
+        depth = 0
+        while True:
+            axis = depth % len(point)
+            if point[axis] < parent.point[axis]:
+                if parent.left is None:
+                    parent.left = node
+                    return
+                parent = parent.left
+            else:
+                if parent.right is None:
+                    parent.right = node
+                    return
+                parent = parent.right
+            depth += 1
+
+    def nearest(self, point):
+        """
+        Find the nearest point in the tree.
+
+        Arguments:
+        - point - a tuple of coordinates.
+        Returns a tuple (nearest point, it's value, distance to it) or None, if the tree is empty.
+        """
+        if self._root is None:
+            return None
+        best = [None, float("inf")]
+        stack = [(self._root, 0)]
+        while stack:
+            (node, depth) = stack.pop()
+            distance = _distance_squared(point, node.point)
+            if distance < best[1]:
+                best[0] = node
+                best[1] = distance
+            axis = depth % len(point)
+            difference = point[axis] - node.point[axis]
+            (near, far) = (node.left, node.right) if difference < 0 else (node.right, node.left)
+            # The far branch is pushed first, so that the near branch is searched first and shrinks the best distance.
+            if far is not None and difference * difference < best[1]:
+                stack.append((far, depth + 1))
+            if near is not None:
+                stack.append((near, depth + 1))
+        return (best[0].point, best[0].value, best[1] ** 0.5)
+
+    def __len__(self):
+        """Get the number of points in the tree."""
+        return self._size
+
+
+class _KdNode(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, point, value):
+        self.point = point
+        self.value = value
+        self.left = None
+        self.right = None
+
+
+def _distance_squared(point1, point2):
+    return sum([(coordinate1 - coordinate2) ** 2 for (coordinate1, coordinate2) in zip(point1, point2)])
+
+
+# D65 white point.
+_WHITE_X = 0.95047
+_WHITE_Y = 1.0
+_WHITE_Z = 1.08883
+
+
+def color_to_lab(color):
+    """
+    Convert a color to the CIE Lab color space.
+
+    Arguments:
+    - color - the color in #RRGGBBAA format.
+    Returns a tuple (L, a, b, alpha), where alpha is scaled to the range of L: [0, 100].
+    """
+    red = _srgb_to_linear(int(color[1:3], 16) / 255.0)
+    green = _srgb_to_linear(int(color[3:5], 16) / 255.0)
+    blue = _srgb_to_linear(int(color[5:7], 16) / 255.0)
+    alpha = int(color[7:9], 16) / 255.0
+    x = _lab_f((0.4124564 * red + 0.3575761 * green + 0.1804375 * blue) / _WHITE_X)  # pylint: disable=invalid-name
+    y = _lab_f((0.2126729 * red + 0.7151522 * green + 0.0721750 * blue) / _WHITE_Y)  # pylint: disable=invalid-name
+    z = _lab_f((0.0193339 * red + 0.1191920 * green + 0.9503041 * blue) / _WHITE_Z)  # pylint: disable=invalid-name
+    return (116.0 * y - 16.0, 500.0 * (x - y), 200.0 * (y - z), 100.0 * alpha)
+
+
+def _srgb_to_linear(value):
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def _lab_f(value):
+    if value > 216.0 / 24389.0:
+        return value ** (1.0 / 3.0)
+    return (24389.0 / 27.0 * value + 16.0) / 116.0
@@ -149,6 +149,73 @@ def fake_color_scheme_path(color_scheme, relative):
     return path
 
 
+def color_scheme_cache_path(color_scheme, relative):
+    """
+    Given a color scheme, get the path of the file with cached data, parsed from it's fake color scheme.
+
+    Arguments:
+    - color_scheme - color scheme sublime relative path.
+    - relative - whether to get an absolute path or a relative to sublime packages directory.
+    Returns a path to the color scheme cache file for this color scheme.
+    """
+    file_name = os.path.basename(color_scheme) + ".cache.json"
+    path = os.path.join(themes_path(relative), file_name)
+    if relative:
+        path = normalize_path_for_st(path)
+    return path
+
+
+def color_scheme_usage_path(color_scheme, relative):
+    """
+    Given a color scheme, get the path of the file with usage of it's color highlighter colors.
+
+    Arguments:
+    - color_scheme - color scheme sublime relative path.
+    - relative - whether to get an absolute path or a relative to sublime packages directory.
+    Returns a path to the color scheme usage file for this color scheme.
+    """
+    file_name = os.path.basename(color_scheme) + ".usage.json"
+    path = os.path.join(themes_path(relative), file_name)
+    if relative:
+        path = normalize_path_for_st(path)
+    return path
+
+
+def color_scheme_override_path(color_scheme, relative):
+    """
+    Given a color scheme, get the path of the user's override for it.
+
+    ST merges a .sublime-color-scheme file from the User package into the color scheme with the same name.
+    Arguments:
+    - color_scheme - color scheme sublime relative path.
+    - relative - whether to get an absolute path or a relative to sublime packages directory.
+    Returns a path to the color scheme override for this color scheme.
+    """
+    file_name = os.path.splitext(os.path.basename(color_scheme))[0] + ".sublime-color-scheme"
+    path = os.path.join(packages_path(relative), "User", file_name)
+    if relative:
+        path = normalize_path_for_st(path)
+    return path
+
+
+def color_scheme_rules_path(color_scheme, relative):
+    """
+    Given a color scheme, get the path of the color highlighter's own override for it.
+
+    ST merges every .sublime-color-scheme file with the same name into the color scheme, so color highlighter rules are
+    kept in a file of it's own and the user's override is never rewritten.
+    Arguments:
+    - color_scheme - color scheme sublime relative path.
+    - relative - whether to get an absolute path or a relative to sublime packages directory.
+    Returns a path to the color highlighter rules file for this color scheme.
+    """
+    file_name = os.path.splitext(os.path.basename(color_scheme))[0] + ".sublime-color-scheme"
+    path = os.path.join(themes_path(relative), file_name)
+    if relative:
+        path = normalize_path_for_st(path)
+    return path
+
+
 def cached_scheme_path(color_scheme):
     """
     Get the .cache file path for a color scheme file.
@@ -2,10 +2,12 @@
 
 try:
     from . import st_helper
-    from .color_highlighter import ColorHighlighter
+    from .color_highlighter import ColorHighlighter, RegionKeys
+    from .text_change import shift_region
 except ValueError:
     import st_helper
-    from color_highlighter import ColorHighlighter
+    from color_highlighter import ColorHighlighter, RegionKeys
+    from text_change import shift_region
 
 
 if st_helper.running_in_st():
@@ -21,7 +23,8 @@ class PhantomColorHighlighter(ColorHighlighter):
     Only supported on ST3.
     """
 
-    phantom_key_template = "CH_phantom_%s_%d_%d"
+    phantom_key_template = "CH_phantom_%s_%d"
+    phantom_set_key_template = "CH_phantom_set_%s"
 
     html_template = '''
 <body>
@@ -44,7 +47,7 @@ class PhantomColorHighlighter(ColorHighlighter):
 
     _inline_styles = {"right": True, "left": True}
 
-    def __init__(self, view, name, style, length, debug):  # pylint: disable=too-many-arguments
+    def __init__(self, view, name, style, length, use_phantom_set, debug):  # pylint: disable=too-many-arguments
         """
         Create a phantom color highlighter.
 
@@ -53,6 +56,7 @@ class PhantomColorHighlighter(ColorHighlighter):
         - name - the name of the color highlighter.
         - style - the style of the phantoms.
         - length - the length of the block in the "inline" mode.
+        - use_phantom_set - whether to update all phantoms at once with a phantom set.
         - debug - whether to enable debug mode.
         """
         assert style in self._phantom_styles
@@ -61,6 +65,13 @@ class PhantomColorHighlighter(ColorHighlighter):
         self._style = style
         self._length = length
         self._debug = debug
+        self._phantom_keys = RegionKeys(PhantomColorHighlighter.phantom_key_template, name)
+        self._html_cache = {}
+        self._phantom_set = None
+        if use_phantom_set:
+            self._phantom_set = sublime.PhantomSet(view, PhantomColorHighlighter.phantom_set_key_template % name)
+            self._phantom_set_colors = {}
+            self._phantom_set_changed = False
 
     def highlight_region(self, context, value):
         """
@@ -72,13 +83,16 @@ class PhantomColorHighlighter(ColorHighlighter):
         Returns True, if highlighted, False otherwise.
         """
         (region, color) = value
+        if self._phantom_set is not None:
+            self._phantom_set_colors[region] = color
+            self._phantom_set_changed = True
+            return
         html = self._generate_phantom_html(region, color)
         if self._debug:
             print("ColorHighlighter: action=highlight highlighter=PhantomColorHighlighter region=%s color=%s"
                   % (str(region), str(color)))
         self._view.add_phantom(
-            PhantomColorHighlighter.phantom_key_template % (self._name, region.a, region.b),
-            self._get_region(region), html,
+            self._phantom_keys.add(region), self._get_region(region), html,
             self._phantom_styles[self._style], None)
 
     def unhighlight_region(self, context, value):
@@ -90,7 +104,49 @@ class PhantomColorHighlighter(ColorHighlighter):
         - value - tuple (region to unhighlight, it's color).
         """
         (region, _) = value
-        self._view.erase_phantoms(PhantomColorHighlighter.phantom_key_template % (self._name, region.a, region.b))
+        if self._phantom_set is not None:
+            if self._phantom_set_colors.pop(region, None) is not None:
+                self._phantom_set_changed = True
+            return
+        phantom_key = self._phantom_keys.pop(region)
+        if phantom_key is not None:
+            self._view.erase_phantoms(phantom_key)
+
+    def highlight_regions_done(self, context):  # noqa: D401
+        """
+        Called after all calls to highlight_region and unhighlight_region from highlight_regions have been made.
+
+        Arguments:
+        - context - a dict with color highlighter run data.
+        """
+        if self._phantom_set is None or not self._phantom_set_changed:
+            return
+        self._phantom_set_changed = False
+        phantoms = []
+        for region in sorted(self._phantom_set_colors.keys(), key=lambda region: (region.a, region.b)):
+            html = self._generate_phantom_html(region, self._phantom_set_colors[region])
+            phantoms.append(sublime.Phantom(self._get_region(region), html, self._phantom_styles[self._style]))
+        if self._debug:
+            print("ColorHighlighter: action=highlight highlighter=PhantomColorHighlighter phantoms=%d"
+                  % len(phantoms))
+        self._phantom_set.update(phantoms)
+
+    def shift_regions(self, changes):
+        """
+        Shift highlighted regions after the text in the view has changed.
+
+        Arguments:
+        - changes - a list of TextChange-s in the order they were applied.
+        """
+        if self._phantom_set is not None:
+            phantom_set_colors = {}
+            for region in self._phantom_set_colors:
+                shifted_region = shift_region(region, changes)
+                if shifted_region is not None:
+                    phantom_set_colors[shifted_region] = self._phantom_set_colors[region]
+            self._phantom_set_colors = phantom_set_colors
+            return
+        self._phantom_keys.shift(changes)
 
     def _get_region(self, region):
         if self._style == "below":
@@ -105,4 +161,9 @@ class PhantomColorHighlighter(ColorHighlighter):
             size = region.length()
         elif self._style in self._inline_styles:
             size = self._length
-        return PhantomColorHighlighter.html_template % (color, PhantomColorHighlighter.space_symbol * size)
+        cache_key = (color, size)
+        html = self._html_cache.get(cache_key, None)
+        if html is None:
+            html = PhantomColorHighlighter.html_template % (color, PhantomColorHighlighter.space_symbol * size)
+            self._html_cache[cache_key] = html
+        return html
@@ -52,7 +52,7 @@ class ColorHighlighterPickColor(sublime_plugin.TextCommand):
         settings = Settings(sublime.load_settings(COLOR_HIGHLIGHTER_SETTINGS_NAME))
         formats = [value for value in sorted(settings.regex_compiler.formats.keys())]
         color_converter = ColorConverter(formats)
-        colors = [value for value in _get_colors(self.view, settings, formats, color_converter)]
+        colors = [value for value in _get_colors(self.view, settings, color_converter)]
         replace_colors = len(colors) > 0
         if replace_colors:
             initial_color = colors[0][1][1:]
@@ -89,18 +89,9 @@ class ColorHighlighterPickColor(sublime_plugin.TextCommand):
         self.view.run_command("color_highlighter_impl_replace_color", {"replace_data": str(replace_data)})
 
 
-def _get_colors(view, settings, formats, color_converter):
+def _get_colors(view, settings, color_converter):
     color_searcher = ColorSearcher(compile_regex(settings.regex_compiler), color_converter)
-    for (region, color, match) in search_colors_in_selection(view, color_searcher):
-        format_name = _get_format_name(match, formats)
-        yield region, color, format_name
-
-
-def _get_format_name(match, formats):
-    for name in formats:
-        if match.get(name, None) is not None:
-            return name
-    raise Exception("Unreachable code.")
+    return search_colors_in_selection(view, color_searcher)
 
 
 class ColorHighlighterImplReplaceColor(sublime_plugin.TextCommand):
@@ -1,5 +1,7 @@
 """Helper functions for manipulating regions."""
 
+import bisect
+
 try:
     from .st_helper import running_in_st
 except ValueError:
@@ -125,3 +127,69 @@ def deduplicate_regions(regions):
             continue
         processed_regions[region] = True
     return processed_regions.keys()
+
+
+class RegionIndex(object):
+    """
+    An ordered index of regions for fast intersection lookups.
+
+    Regions are kept sorted by their beginning, so finding regions that intersect a given region takes O(log n + k)
+    instead of checking every region.
+    """
+
+    def __init__(self, regions=None):
+        """
+        Create a region index.
+
+        Arguments:
+        - regions - an optional iterable of NormalizedRegion-s to put to the index.
+        """
+        self._regions = []
+        self._max_length = 0
+        if regions is not None:
+            self._regions = sorted((region.a, region.b) for region in regions)
+            for (a, b) in self._regions:  # pylint: disable=invalid-name
+                self._max_length = max(self._max_length, b - a)
+
+    def add(self, region):
+        """
+        Add a region to the index.
+
+        Arguments:
+        - region - a NormalizedRegion to add.
+        """
+        bisect.insort(self._regions, (region.a, region.b))
+        self._max_length = max(self._max_length, region.length())
+
+    def remove(self, region):
+        """
+        Remove a region from the index.
+
+        Arguments:
+        - region - a NormalizedRegion to remove.
+        """
+        value = (region.a, region.b)
+        index = bisect.bisect_left(self._regions, value)
+        if index < len(self._regions) and self._regions[index] == value:
+            del self._regions[index]
+
+    def intersecting(self, region):
+        """
+        Find regions in the index that intersect with a region.
+
+        Arguments:
+        - region - a region to check.
+        Yields NormalizedRegion-s from the index that intersect with the input region.
+        """
+        # Only regions that begin no further than the longest region in the index away can reach the input region.
+        start = bisect.bisect_left(self._regions, (region.a - self._max_length,))
+        end = bisect.bisect_right(self._regions, (region.b, region.b + self._max_length))
+        for index in range(start, end):
+            (a, b) = self._regions[index]  # pylint: disable=invalid-name
+            candidate = NormalizedRegion(a, b)
+            if intersects(candidate, region):
+                yield candidate
+
+    def __len__(self):
+        """Get the number of regions in the index."""
+        return len(self._regions)
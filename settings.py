@@ -29,6 +29,9 @@ class Settings(object):  # pylint: disable=too-few-public-methods,too-many-insta
             self.file_extensions[extension] = True
         self.autoreload = _AutoreloadSettings(copy.deepcopy(settings.get("autoreload", {})))
         self.icon_factory = _IconFactorySettings(copy.deepcopy(settings.get("icon_factory", {})))
+        self.color_scheme_gc = _ColorSchemeGcSettings(copy.deepcopy(settings.get("color_scheme_gc", {})))
+        self.color_palette = _ColorPaletteSettings(copy.deepcopy(settings.get("color_palette", {})))
+        self.event_scheduler = _EventSchedulerSettings(copy.deepcopy(settings.get("event_scheduler", {})))
         self.search_colors_in = _SearchColorsSettings(copy.deepcopy(settings.get("search_colors_in", {})))
         self.regex_compiler = _RegexCompilerSettings(copy.deepcopy(settings.get("regex_compiler", {})))
         self.default_keybindings = settings.get("default_keybindings", True)
@@ -51,6 +54,22 @@ class _ExperimentalSettings(object):  # pylint: disable=too-few-public-methods
         if not st_helper.is_st3():
             print("Updating the color scheme asynchronously is not supported in ST2.")
             self.asynchronosly_update_color_scheme = False
+        self.color_scheme_write_interval_ms = settings.get(  # pylint: disable=invalid-name
+            "color_scheme_write_interval_ms", 250)
+        self.use_color_scheme_overrides = settings.get("use_color_scheme_overrides", False)
+        if not st_helper.is_st3():
+            print("Color scheme overrides are not supported in ST2.")
+            self.use_color_scheme_overrides = False
+        self.asynchronously_search_colors = settings.get(  # pylint: disable=invalid-name
+            "asynchronously_search_colors", False)
+        if not st_helper.is_st3():
+            print("Searching colors asynchronously is not supported in ST2.")
+            self.asynchronously_search_colors = False
+        self.progressive_search_budget_ms = settings.get(  # pylint: disable=invalid-name
+            "progressive_search_budget_ms", 0)
+        self.virtualize_highlightings = settings.get("virtualize_highlightings", False)
+        self.group_regions = settings.get("group_regions", False)
+        self.use_phantom_sets = settings.get("use_phantom_sets", False)
 
 
 class _AutoreloadSettings(object):  # pylint: disable=too-few-public-methods
@@ -67,6 +86,49 @@ class _AutoreloadSettings(object):  # pylint: disable=too-few-public-methods
         self.when_color_scheme_change = settings.get("when_color_scheme_change", False)
 
 
+class _ColorSchemeGcSettings(object):  # pylint: disable=too-few-public-methods
+    """The data structure for holding settings of collecting unused color scheme colors."""
+
+    def __init__(self, settings):
+        """
+        Init color scheme garbage collection settings.
+
+        Arguments:
+        - settings - the color scheme garbage collection settings dict.
+        """
+        self.enabled = settings.get("enabled", True)
+        self.max_unused_sessions = settings.get("max_unused_sessions", 10)
+        self.max_colors = settings.get("max_colors", 1000)
+
+
+class _ColorPaletteSettings(object):  # pylint: disable=too-few-public-methods
+    """The data structure for holding settings of snapping highlighted colors to a bounded palette."""
+
+    def __init__(self, settings):
+        """
+        Init color palette settings.
+
+        Arguments:
+        - settings - the color palette settings dict.
+        """
+        self.enabled = settings.get("enabled", False)
+        self.size = settings.get("size", 256)
+
+
+class _EventSchedulerSettings(object):  # pylint: disable=too-few-public-methods
+    """The data structure for holding settings of merging bursts of modification events."""
+
+    def __init__(self, settings):
+        """
+        Init event scheduler settings.
+
+        Arguments:
+        - settings - the event scheduler settings dict.
+        """
+        self.debounce_ms = settings.get("debounce_ms", 50)
+        self.max_latency_ms = settings.get("max_latency_ms", 200)
+
+
 class _IconFactorySettings(object):  # pylint: disable=too-few-public-methods
     """The data structure for holding icon factory settings."""
 
@@ -77,6 +139,7 @@ class _IconFactorySettings(object):  # pylint: disable=too-few-public-methods
         Arguments:
         - settings - the icon factory dict.
         """
+        self.renderer = settings.get("renderer", "builtin")
         self.convert_command = settings.get("convert_command", "convert")
         self.convert_timeout = settings.get("convert_timeout", 5)
 
@@ -5,6 +5,14 @@ def Region(*args):  # noqa: D103  # pylint: disable=invalid-name,missing-docstri
     return None
 
 
+def Phantom(*args):  # noqa: D103  # pylint: disable=invalid-name,missing-docstring,unused-argument
+    return None
+
+
+def PhantomSet(*args):  # noqa: D103  # pylint: disable=invalid-name,missing-docstring,unused-argument
+    return None
+
+
 def version():  # noqa: D103  # pylint: disable=missing-docstring
     return None
 
@@ -0,0 +1,213 @@
+"""Tests for color_converter.ColorConverter."""
+
+import colorsys
+import os
+import random
+import re
+import timeit
+import unittest
+
+from ColorHighlighter.color_converter import ColorConverter  # pylint: disable=no-name-in-module,import-error
+
+
+class ColorConverterTest(unittest.TestCase):
+    """Tests for ColorConverter."""
+
+    converter = ColorConverter(["sharp8", "sharp6", "sharp4", "sharp3", "rgba", "rgb", "hsva", "hsv", "hsla", "hsl"])
+
+    def test_to_color(self):
+        """Test converting colors in all formats to the canonical representation."""
+        self.assertEqual("#aabbccdd", self._to_color("sharp8", {"sharp8": "#AABBCCDD"}))
+        self.assertEqual("#aabbccff", self._to_color("sharp6", {"sharp6": "#aabbcc"}))
+        self.assertEqual("#aabbccdd", self._to_color(
+            "sharp4", {"sharp4_R": "a", "sharp4_G": "b", "sharp4_B": "c", "sharp4_A": "d"}))
+        self.assertEqual("#aabbccff", self._to_color("sharp3", {"sharp3_R": "a", "sharp3_G": "b", "sharp3_B": "c"}))
+        self.assertEqual("#ff8000bf", self._to_color(
+            "rgba", {"rgba_R": "255", "rgba_G": "50%", "rgba_B": "0", "rgba_A": ".75"}))
+        self.assertEqual("#0a141eff", self._to_color("rgb", {"rgb_R": "10", "rgb_G": "020", "rgb_B": "30"}))
+        self.assertEqual("#ff000080", self._to_color(
+            "hsla", {"hsla_H": "360", "hsla_S": "100%", "hsla_L": "50%", "hsla_A": "0.5"}))
+        self.assertEqual("#00ff00ff", self._to_color("hsv", {"hsv_H": "120", "hsv_S": "100%", "hsv_V": "100%"}))
+
+    def test_to_color_bad(self):
+        """Test that colors with channels out of range are not converted."""
+        self.assertIsNone(self._to_color("rgb", {"rgb_R": "256", "rgb_G": "0", "rgb_B": "0"}))
+        self.assertIsNone(self._to_color("rgb", {"rgb_R": "101%", "rgb_G": "0", "rgb_B": "0"}))
+        self.assertIsNone(self._to_color("rgba", {"rgba_R": "0", "rgba_G": "0", "rgba_B": "0", "rgba_A": "."}))
+        self.assertIsNone(self._to_color("hsl", {"hsl_H": "361", "hsl_S": "0", "hsl_L": "0"}))
+        self.assertIsNone(self._to_color("hsl", {"hsl_H": "0", "hsl_S": "10", "hsl_L": "0"}))
+
+    def test_from_color(self):
+        """Test converting the canonical representation to all formats."""
+        color = "#ff8000bf"
+        self.assertEqual("#ff8000bf", self.converter.from_color((color, "sharp8")))
+        self.assertEqual("#ff8000", self.converter.from_color((color, "sharp6")))
+        self.assertEqual(
+            "rgba(255, 128, 0, %s)" % _reference_float_text(0xbf), self.converter.from_color((color, "rgba")))
+        self.assertEqual("rgb(255, 128, 0)", self.converter.from_color((color, "rgb")))
+        self.assertEqual("hsl(30, 100%, 50%)", self.converter.from_color((color, "hsl")))
+        self.assertEqual("hsv(30, 100%, 100%)", self.converter.from_color((color, "hsv")))
+
+    def test_channels_match_reference(self):
+        """Test that table driven channel conversions match straightforward conversions."""
+        for value in range(256):
+            color = "#%02x%02x%02x%02x" % (value, 255 - value, (value * 7) % 256, value)
+            r, g, b, a = value, 255 - value, (value * 7) % 256, value  # pylint: disable=invalid-name
+            self.assertEqual(
+                "rgba(%d, %d, %d, %s)" % (r, g, b, _reference_float_text(a)),
+                self.converter.from_color((color, "rgba")))
+            h, l, s = colorsys.rgb_to_hls(r / 255.0, g / 255.0, b / 255.0)  # pylint: disable=invalid-name
+            self.assertEqual(
+                "hsl(%d, %d%%, %d%%)" % (int(round(h * 360)), int(round(s * 100)), int(round(l * 100))),
+                self.converter.from_color((color, "hsl")))
+        for text in [str(value) for value in range(300)] + ["%d%%" % value for value in range(110)] + ["007", "0"]:
+            self.assertEqual(
+                _reference_to_rgb(text), self._to_color("rgb", {"rgb_R": text, "rgb_G": "0", "rgb_B": "0"}))
+        for hue in range(362):
+            for percent in range(0, 101, 5):
+                expected = None
+                if hue <= 360:
+                    r, g, b = colorsys.hls_to_rgb(  # pylint: disable=invalid-name
+                        (hue % 360) / 360.0, percent / 100.0, (100 - percent) / 100.0)
+                    expected = "#%02x%02x%02xff" % (int(round(r * 255)), int(round(g * 255)), int(round(b * 255)))
+                self.assertEqual(expected, self._to_color(
+                    "hsl", {"hsl_H": str(hue), "hsl_S": "%d%%" % (100 - percent), "hsl_L": "%d%%" % percent}))
+
+    def _to_color(self, name, groups):
+        return self.converter.match_to_color(_Match(name, groups))
+
+
+class _Match(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, name, groups):
+        self.lastgroup = name
+        self._groups = groups
+
+    def group(self, name):  # pylint: disable=missing-docstring
+        if name == 0:
+            return str(self._groups)
+        return self._groups[name]
+
+
+def _reference_float_text(value):
+    text = str(value / 255.0)
+    if text.find(".") == -1:
+        return text
+    return re.sub("0+$", "", text).replace("0.", ".", 1) if text.startswith("0.") else re.sub("0+$", "", text)
+
+
+def _reference_to_rgb(text):
+    if text.isdigit():
+        value = int(text)
+    else:
+        value = int(round(int(text[:-1]) / 100.0 * 255)) if int(text[:-1]) <= 100 else 256
+    if value > 255:
+        return None
+    return "#%02x0000ff" % value
+
+
+@unittest.skipUnless(os.environ.get("COLOR_HIGHLIGHTER_BENCHMARKS"), "Set COLOR_HIGHLIGHTER_BENCHMARKS=1 to run.")
+class ColorConverterBenchmark(unittest.TestCase):
+    """
+    Benchmark for table driven channel conversions against the previous arithmetic ones.
+
+    Run with COLOR_HIGHLIGHTER_BENCHMARKS=1 py.test -s tests/test_color_converter.py.
+    """
+
+    converter = ColorConverter(["rgba"])
+
+    def test_rgba(self):
+        """Compare converting 20k random rgba colors to and from the canonical representation."""
+        rand = random.Random(42)
+        matches = [_Match("rgba", _random_rgba_groups(rand)) for _ in range(20000)]
+        colors = ["#%08x" % rand.randint(0, 0xFFFFFFFF) for _ in range(20000)]
+
+        def previous_to_color():
+            return [_previous_rgba_to_color(match) for match in matches]
+
+        def to_color():
+            return [self.converter.match_to_color(match) for match in matches]
+
+        def previous_from_color():
+            return [_previous_rgba_from_color(color) for color in colors]
+
+        def from_color():
+            return [self.converter.from_color((color, "rgba")) for color in colors]
+
+        self.assertEqual(previous_to_color(), to_color())
+        self.assertEqual(previous_from_color(), from_color())
+        for (name, previous, current) in [
+                ("to_color", previous_to_color, to_color), ("from_color", previous_from_color, from_color)]:
+            previous_time = min(timeit.Timer(previous).repeat(5, 1))
+            current_time = min(timeit.Timer(current).repeat(5, 1))
+            print("\nfunction=%s colors=20000 previous_ms=%.1f tables_ms=%.1f speedup=%.1f" % (
+                name, previous_time * 1000, current_time * 1000, previous_time / current_time))
+            self.assertLess(current_time, previous_time)
+
+
+def _random_rgba_groups(rand):
+    groups = {}
+    for channel in ["R", "G", "B"]:
+        if rand.random() < 0.5:
+            groups["rgba_" + channel] = str(rand.randint(0, 255))
+        else:
+            groups["rgba_" + channel] = "%d%%" % rand.randint(0, 100)
+    groups["rgba_A"] = rand.choice(["0", "1", "1.", ".5", "0.25", ".75", "%.3f" % rand.random()])
+    return groups
+
+
+# The channel conversions before they were table driven.
+def _previous_rgba_to_color(match):
+    r = _previous_parse_decimal_or_percent_channel(match.group("rgba_R"))  # pylint: disable=invalid-name
+    g = _previous_parse_decimal_or_percent_channel(match.group("rgba_G"))  # pylint: disable=invalid-name
+    b = _previous_parse_decimal_or_percent_channel(match.group("rgba_B"))  # pylint: disable=invalid-name
+    a = _previous_parse_float_channel(match.group("rgba_A"))  # pylint: disable=invalid-name
+    if r is None or g is None or b is None or a is None:
+        return None
+    return ("#%02X%02X%02X%02X" % (r, g, b, a)).lower()
+
+
+def _previous_rgba_from_color(color):
+    r = int(color[1:3], 16)  # pylint: disable=invalid-name
+    g = int(color[3:5], 16)  # pylint: disable=invalid-name
+    b = int(color[5:7], 16)  # pylint: disable=invalid-name
+    a = _previous_channel_to_float(color[7:9])  # pylint: disable=invalid-name
+    return "rgba(%d, %d, %d, %s)" % (r, g, b, a)
+
+
+def _previous_channel_to_float(channel):
+    value = str(int(channel, 16) / 255.0)
+    if value.find(".") == -1:
+        return value
+    while value[-1] == "0":
+        value = value[:-1]
+    if value.startswith("0."):
+        value = value[1:]
+    return value
+
+
+def _previous_parse_decimal_or_percent_channel(text):
+    try:
+        value = int(text)
+    except ValueError:
+        return int(round(_previous_parse_percent_channel(text) * 255))
+    if value < 0 or value > 255:
+        return None
+    return value
+
+
+def _previous_parse_float_channel(text):
+    if text == ".":
+        return None
+    value = float(text)
+    if value < 0 or value > 1:
+        return None
+    return int(round(value * 255.0))
+
+
+def _previous_parse_percent_channel(text):
+    if text == "0":
+        return 0.0
+    value = int(text[:-1])
+    if value < 0 or value > 100:
+        return None
+    return value / 100.0
@@ -3,9 +3,11 @@
 import unittest
 
 from ColorHighlighter.color_highlighter import (  # pylint: disable=no-name-in-module,import-error
-    CachingColorHighlighter, CombinedColorHighlighter)
+    CachingColorHighlighter, CombinedColorHighlighter, QuantizingColorHighlighter)
+from ColorHighlighter.regions import NormalizedRegion  # pylint: disable=no-name-in-module,import-error
+from ColorHighlighter.text_change import TextChange  # pylint: disable=no-name-in-module,import-error
 
-from mockito import ANY, mock, verify
+from mockito import ANY, mock, verify, when
 
 
 class CombinedColorHighlighterTest(unittest.TestCase):
@@ -39,6 +41,26 @@ class CombinedColorHighlighterTest(unittest.TestCase):
         verify(self.color_highlighter2).highlight_regions_done(self.context2)
 
 
+class QuantizingColorHighlighterTest(unittest.TestCase):
+    """Tests for QuantizingColorHighlighter."""
+
+    def test_highlight(self):  # pylint: disable=no-self-use
+        """Test that colors are snapped to the palette before highlighting and unhighlighting."""
+        base_color_highlighter = mock()
+        palette = mock()
+        when(palette).quantize("#FF0001FF").thenReturn("#FF0000FF")
+        color_highlighter = QuantizingColorHighlighter(base_color_highlighter, palette)
+        region = NormalizedRegion(1, 10)
+        context = {}
+
+        color_highlighter.highlight_region(context, (region, "#FF0001FF"))
+        color_highlighter.unhighlight_region(context, (region, "#FF0001FF"))
+        color_highlighter.highlight_regions_done(context)
+        verify(base_color_highlighter).highlight_region(context, (region, "#FF0000FF"))
+        verify(base_color_highlighter).unhighlight_region(context, (region, "#FF0000FF"))
+        verify(base_color_highlighter).highlight_regions_done(context)
+
+
 class _TestColorHighlighter(CachingColorHighlighter):
     def __init__(self, object_mock):
         super(_TestColorHighlighter, self).__init__([])
@@ -64,8 +86,8 @@ class CachingColorHighlighterTest(unittest.TestCase):
         """Test that highlight_region is called for every new region."""
         mock_color_highlighter = mock()
         color_highlighter = _TestColorHighlighter(mock_color_highlighter)
-        region1 = (1, 2)
-        region2 = (3, 4)
+        region1 = (NormalizedRegion(1, 2), 2)
+        region2 = (NormalizedRegion(3, 4), 4)
         color_highlighter.highlight_regions([region1, region2])
         verify(mock_color_highlighter).highlight_region(ANY, region1)
         verify(mock_color_highlighter).highlight_region(ANY, region2)
@@ -75,7 +97,7 @@ class CachingColorHighlighterTest(unittest.TestCase):
         """Test that highlight_region is not called for existing regions."""
         mock_color_highlighter = mock()
         color_highlighter = _TestColorHighlighter(mock_color_highlighter)
-        region = (1, 2)
+        region = (NormalizedRegion(1, 2), 2)
         color_highlighter.highlight_regions([region])
         verify(mock_color_highlighter).highlight_region(ANY, region)
         verify(mock_color_highlighter).highlight_regions_done(ANY)
@@ -87,8 +109,8 @@ class CachingColorHighlighterTest(unittest.TestCase):
         """Test that highlight_region is called for existing regions with updated color."""
         mock_color_highlighter = mock()
         color_highlighter = _TestColorHighlighter(mock_color_highlighter)
-        region1 = (1, 2)
-        region2 = (1, 3)
+        region1 = (NormalizedRegion(1, 2), 2)
+        region2 = (NormalizedRegion(1, 2), 3)
         color_highlighter.highlight_regions([region1])
         verify(mock_color_highlighter).highlight_region(ANY, region1)
         verify(mock_color_highlighter).highlight_regions_done(ANY)
@@ -101,7 +123,7 @@ class CachingColorHighlighterTest(unittest.TestCase):
         """Test that unhighlight_region is called for all regions that were highlighted, but not any more."""
         mock_color_highlighter = mock()
         color_highlighter = _TestColorHighlighter(mock_color_highlighter)
-        region = (1, 2)
+        region = (NormalizedRegion(1, 2), 2)
         color_highlighter.highlight_regions([region])
         verify(mock_color_highlighter).highlight_region(ANY, region)
         verify(mock_color_highlighter).highlight_regions_done(ANY)
@@ -114,8 +136,63 @@ class CachingColorHighlighterTest(unittest.TestCase):
         """Test that unhighlight_region is called for every highlighted region."""
         mock_color_highlighter = mock()
         color_highlighter = _TestColorHighlighter(mock_color_highlighter)
-        region = (1, 2)
+        region = (NormalizedRegion(1, 2), 2)
         color_highlighter.highlight_regions([region])
         color_highlighter.clear_all()
         verify(mock_color_highlighter).unhighlight_region(ANY, region)
         verify(mock_color_highlighter, times=2).highlight_regions_done(ANY)
+
+    def test_shift_regions(self):  # pylint: disable=no-self-use
+        """Test that shifted regions are not rehighlighted and modified regions are unhighlighted."""
+        mock_color_highlighter = mock()
+        color_highlighter = _TestColorHighlighter(mock_color_highlighter)
+        region1 = (NormalizedRegion(1, 2), 1)
+        region2 = (NormalizedRegion(5, 8), 2)
+        color_highlighter.highlight_regions([region1, region2])
+        color_highlighter.shift_regions([TextChange(1, 1, 3), TextChange(9, 10, 2)])
+        verify(mock_color_highlighter).unhighlight_region(ANY, region2)
+        verify(mock_color_highlighter, times=2).highlight_regions_done(ANY)
+        shifted_region1 = (NormalizedRegion(4, 5), 1)
+        color_highlighter.highlight_regions([shifted_region1])
+        verify(mock_color_highlighter, times=0).highlight_region(ANY, shifted_region1)
+        verify(mock_color_highlighter, times=0).unhighlight_region(ANY, region1)
+        verify(mock_color_highlighter, times=0).unhighlight_region(ANY, shifted_region1)
+
+    def test_highlight_regions_in(self):  # pylint: disable=no-self-use
+        """Test that only regions intersecting the input regions are updated."""
+        mock_color_highlighter = mock()
+        color_highlighter = _TestColorHighlighter(mock_color_highlighter)
+        region1 = (NormalizedRegion(1, 4), 1)
+        region2 = (NormalizedRegion(10, 14), 2)
+        region3 = (NormalizedRegion(20, 24), 3)
+        color_highlighter.highlight_regions([region1, region2, region3])
+        color_highlighter.highlight_regions_in([], [NormalizedRegion(8, 12), NormalizedRegion(24, 30)])
+        verify(mock_color_highlighter).unhighlight_region(ANY, region2)
+        verify(mock_color_highlighter, times=0).unhighlight_region(ANY, region1)
+        verify(mock_color_highlighter, times=0).unhighlight_region(ANY, region3)
+
+    def test_viewport(self):  # pylint: disable=no-self-use
+        """Test that only regions within the viewport are rendered."""
+        mock_color_highlighter = mock()
+        color_highlighter = _TestColorHighlighter(mock_color_highlighter)
+        region1 = (NormalizedRegion(1, 4), 1)
+        region2 = (NormalizedRegion(10, 14), 2)
+        region3 = (NormalizedRegion(20, 24), 3)
+        color_highlighter.set_viewport(NormalizedRegion(0, 12))
+        color_highlighter.highlight_regions([region1, region2, region3])
+        verify(mock_color_highlighter).highlight_region(ANY, region1)
+        verify(mock_color_highlighter).highlight_region(ANY, region2)
+        verify(mock_color_highlighter, times=0).highlight_region(ANY, region3)
+
+        color_highlighter.set_viewport(NormalizedRegion(12, 30))
+        verify(mock_color_highlighter).unhighlight_region(ANY, region1)
+        verify(mock_color_highlighter, times=0).unhighlight_region(ANY, region2)
+        verify(mock_color_highlighter).highlight_region(ANY, region3)
+
+        color_highlighter.highlight_regions([region1])
+        verify(mock_color_highlighter, times=1).unhighlight_region(ANY, region1)
+        verify(mock_color_highlighter).unhighlight_region(ANY, region2)
+        verify(mock_color_highlighter).unhighlight_region(ANY, region3)
+
+        color_highlighter.set_viewport(None)
+        verify(mock_color_highlighter, times=2).highlight_region(ANY, region1)
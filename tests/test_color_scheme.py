@@ -1,16 +1,23 @@
 """Tests for parse_color_scheme."""
 
+import json
 import os
+import tempfile
+import threading
 import unittest
 
+from xml.etree import ElementTree
 from xml.etree.ElementTree import ParseError
 
 from ColorHighlighter import load_resource, path, sublime  # pylint: disable=no-name-in-module
 from ColorHighlighter.color_scheme import (  # pylint: disable=no-name-in-module,import-error
-    CH_COLOR_SCOPE_NAME, ColorSchemeData, ColorSchemeWriter, parse_color_scheme)
+    CH_COLOR_SCOPE_NAME, ColorSchemeCache, ColorSchemeData, ColorSchemeOverrideWriter, ColorSchemeWriter,
+    load_color_scheme_cache, parse_color_scheme, parse_color_scheme_override)
 
 from mockito import ANY, mock, unstub, verify, when
 
+_EXISTS = os.path.exists
+
 
 class ParseColorSchemeTest(unittest.TestCase):
     """Tests for parse_color_scheme."""
@@ -486,9 +493,397 @@ class ColorSchemeWriterTest(unittest.TestCase):
         color_scheme = "test color scheme"
         initial_scopes = ["test"]
         scopes = initial_scopes[:]
-        color_scheme_writer = ColorSchemeWriter(color_scheme, xml_tree, scopes, False)
+        color_scheme_writer = ColorSchemeWriter(color_scheme, xml_tree, scopes, False, None)
         new_scopes = ["scope1", "scope2"]
         color_scheme_writer.add_scopes(new_scopes)
         self.assertEqual(initial_scopes + new_scopes, scopes)
         verify(xml_tree).write(color_scheme, encoding="utf-8")
         unstub(os)
+
+    def test_add_scopes_in_place(self):
+        """Test that add_scopes inserts new scopes into the written color scheme without rewriting it."""
+        with tempfile.TemporaryDirectory() as directory:
+            color_scheme = os.path.join(directory, "test.tmTheme")
+            when(os.path).exists(ANY).thenReturn(True)
+            when(path).cached_scheme_path(color_scheme).thenReturn(os.path.join(directory, "test.tmTheme.cache"))
+            xml = ElementTree.fromstring(_TEST_COLOR_SCHEME)
+            xml_tree = _CountingElementTree(ElementTree.ElementTree(xml))
+            scopes = xml[0][1]
+            color_scheme_writer = ColorSchemeWriter(color_scheme, xml_tree, scopes, False, None)
+
+            color_scheme_writer.add_scopes([_scope("scope1")])
+            color_scheme_writer.add_scopes([_scope("scope2"), _scope("scope3")])
+            self.assertEqual(1, xml_tree.writes)
+            self.assertEqual(["scheme", "scope1", "scope2", "scope3"], _read_scope_names(color_scheme))
+            self.assertEqual(4, len(scopes))
+            unstub(os)
+
+    def test_remove_scopes(self):
+        """Test that remove_scopes removes scopes and rewrites the color scheme."""
+        with tempfile.TemporaryDirectory() as directory:
+            color_scheme = os.path.join(directory, "test.tmTheme")
+            when(os.path).exists(ANY).thenReturn(True)
+            when(path).cached_scheme_path(color_scheme).thenReturn(os.path.join(directory, "test.tmTheme.cache"))
+            xml = ElementTree.fromstring(_TEST_COLOR_SCHEME)
+            xml_tree = _CountingElementTree(ElementTree.ElementTree(xml))
+            color_scheme_writer = ColorSchemeWriter(color_scheme, xml_tree, xml[0][1], False, None)
+
+            color_scheme_writer.add_scopes([_scope("scope1"), _scope("scope2")])
+            color_scheme_writer.remove_scopes(["scope1"])
+            color_scheme_writer.add_scopes([_scope("scope3")])
+            self.assertEqual(2, xml_tree.writes)
+            self.assertEqual(["scheme", "scope2", "scope3"], _read_scope_names(color_scheme))
+            unstub(os)
+            unstub(path)
+
+    def test_add_scopes_file_changed(self):
+        """Test that add_scopes rewrites the color scheme if it was changed by someone else."""
+        with tempfile.TemporaryDirectory() as directory:
+            color_scheme = os.path.join(directory, "test.tmTheme")
+            when(os.path).exists(ANY).thenReturn(True)
+            when(path).cached_scheme_path(color_scheme).thenReturn(os.path.join(directory, "test.tmTheme.cache"))
+            xml = ElementTree.fromstring(_TEST_COLOR_SCHEME)
+            xml_tree = _CountingElementTree(ElementTree.ElementTree(xml))
+            color_scheme_writer = ColorSchemeWriter(color_scheme, xml_tree, xml[0][1], False, None)
+
+            color_scheme_writer.add_scopes([_scope("scope1")])
+            with open(color_scheme, "wb") as color_scheme_file:
+                color_scheme_file.write(_TEST_COLOR_SCHEME.encode("utf-8"))
+            color_scheme_writer.add_scopes([_scope("scope2")])
+            self.assertEqual(2, xml_tree.writes)
+            self.assertEqual(["scheme", "scope1", "scope2"], _read_scope_names(color_scheme))
+            unstub(os)
+
+    def test_add_scopes_concurrently(self):
+        """Test that scopes added from several threads at once are all written to the color scheme."""
+        with tempfile.TemporaryDirectory() as directory:
+            color_scheme = os.path.join(directory, "test.tmTheme")
+            when(os.path).exists(ANY).thenReturn(True)
+            when(path).cached_scheme_path(color_scheme).thenReturn(os.path.join(directory, "test.tmTheme.cache"))
+            xml = ElementTree.fromstring(_TEST_COLOR_SCHEME)
+            color_scheme_writer = ColorSchemeWriter(color_scheme, ElementTree.ElementTree(xml), xml[0][1], False, None)
+            color_scheme_writer.add_scopes([_scope("scope")])
+
+            def add_scopes(prefix):
+                for index in range(20):
+                    color_scheme_writer.add_scopes([_scope("%s%d" % (prefix, index))])
+
+            threads = [threading.Thread(target=add_scopes, args=(prefix,)) for prefix in ["a", "b"]]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            expected_scope_names = ["scheme", "scope"] + ["%s%d" % (prefix, index)
+                                                          for prefix in ["a", "b"] for index in range(20)]
+            self.assertEqual(sorted(expected_scope_names), sorted(_read_scope_names(color_scheme)))
+            unstub(os)
+            unstub(path)
+
+
+_TEST_COLOR_SCHEME = """<plist version="1.0">
+<dict>
+<key>settings</key>
+<array>
+<dict>
+<key>scope</key>
+<string>scheme</string>
+</dict>
+</array>
+<key>uuid</key>
+<string>test-uuid</string>
+</dict>
+</plist>
+"""
+
+
+class _CountingElementTree(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, xml_tree):
+        self.writes = 0
+        self._xml_tree = xml_tree
+
+    def write(self, *args, **kwargs):
+        self.writes += 1
+        self._xml_tree.write(*args, **kwargs)
+
+
+def _scope(name):
+    return ElementTree.fromstring("<dict><key>scope</key><string>%s</string></dict>" % name)
+
+
+def _read_scope_names(color_scheme):
+    with open(color_scheme, "rb") as color_scheme_file:
+        xml = ElementTree.fromstring(color_scheme_file.read())
+    scope_names = []
+    for scope in xml[0][1]:
+        keys = [child.text for child in scope]
+        scope_names.append(keys[keys.index("scope") + 1])
+    return scope_names
+
+
+class ParseColorSchemeOverrideTest(unittest.TestCase):
+    """Tests for parse_color_scheme_override."""
+
+    def test_parse_tm_theme(self):
+        """Test parsing a .tmTheme color scheme without an override."""
+        scheme_path = "Packages/Color/Scheme.tmTheme"
+        when(path).color_scheme_override_path(scheme_path, path.ABSOLUTE).thenReturn("/override")
+        when(path).color_scheme_rules_path(scheme_path, path.ABSOLUTE).thenReturn("/rules")
+        when(os.path).exists("/override").thenReturn(False)
+        when(load_resource).load_resource(scheme_path).thenReturn(_TEST_TM_THEME_COLOR_SCHEME)
+        color_scheme, color_scheme_data, color_scheme_writer = parse_color_scheme_override(scheme_path, False)
+        self.assertEqual(scheme_path, color_scheme)
+        self.assertEqual("#FFFFFFFF", color_scheme_data.background_color)
+        self.assertEqual({}, color_scheme_data.existing_colors)
+        self.assertEqual("/rules", color_scheme_writer._rules_path)  # pylint: disable=protected-access
+        self.assertEqual({}, color_scheme_writer._rules)  # pylint: disable=protected-access
+        unstub(os)
+        unstub(path)
+
+    def test_parse_sublime_color_scheme(self):
+        """Test parsing a .sublime-color-scheme color scheme with an override."""
+        scheme_path = "Packages/Color/Scheme.sublime-color-scheme"
+        with tempfile.TemporaryDirectory() as directory:
+            override_path = os.path.join(directory, "User.sublime-color-scheme")
+            with open(override_path, "w") as override_file:
+                override_file.write(json.dumps({
+                    "variables": {"bg": "var(white)"},
+                    "rules": [{"scope": "comment", "foreground": "#808080"}],
+                }))
+            rules_path = os.path.join(directory, "Scheme.sublime-color-scheme")
+            with open(rules_path, "w") as rules_file:
+                rules_file.write(json.dumps({
+                    "rules": [{"name": CH_COLOR_SCOPE_NAME, "scope": "CH_color_112233FF", "background": "#112233FF"}],
+                }))
+            when(path).color_scheme_override_path(scheme_path, path.ABSOLUTE).thenReturn(override_path)
+            when(path).color_scheme_rules_path(scheme_path, path.ABSOLUTE).thenReturn(rules_path)
+            when(load_resource).load_resource(scheme_path).thenReturn(json.dumps({
+                "variables": {"white": "#FFFFFF", "bg": "#000000"},
+                "globals": {"background": "var(bg)"},
+            }))
+            _, color_scheme_data, color_scheme_writer = parse_color_scheme_override(scheme_path, False)
+            self.assertEqual("#FFFFFFFF", color_scheme_data.background_color)
+            self.assertEqual({"#112233FF": "112233FF"}, color_scheme_data.existing_colors)
+            self.assertEqual(rules_path, color_scheme_writer._rules_path)  # pylint: disable=protected-access
+        unstub(path)
+
+    def test_parse_invalid_override(self):
+        """Test that a user's override, that is not valid JSON, is not supported and is kept as is."""
+        scheme_path = "Packages/Color/Scheme.sublime-color-scheme"
+        with tempfile.TemporaryDirectory() as directory:
+            override_path = os.path.join(directory, "Scheme.sublime-color-scheme")
+            content = '{\n    // A comment.\n    "rules": [],\n}\n'
+            with open(override_path, "w") as override_file:
+                override_file.write(content)
+            when(path).color_scheme_override_path(scheme_path, path.ABSOLUTE).thenReturn(override_path)
+            self.assertIsNone(parse_color_scheme_override(scheme_path, False))
+            with open(override_path) as override_file:
+                self.assertEqual(content, override_file.read())
+        unstub(path)
+
+    def test_parse_invalid_rules(self):
+        """Test that a broken color highlighter override is dropped."""
+        scheme_path = "Packages/Color/Scheme.sublime-color-scheme"
+        with tempfile.TemporaryDirectory() as directory:
+            rules_path = os.path.join(directory, "Scheme.sublime-color-scheme")
+            with open(rules_path, "w") as rules_file:
+                rules_file.write("{")
+            when(path).color_scheme_override_path(scheme_path, path.ABSOLUTE).thenReturn("/override")
+            when(path).color_scheme_rules_path(scheme_path, path.ABSOLUTE).thenReturn(rules_path)
+            when(os.path).exists("/override").thenReturn(False)
+            when(load_resource).load_resource(scheme_path).thenReturn(json.dumps({
+                "globals": {"background": "#FFFFFF"},
+            }))
+            _, color_scheme_data, color_scheme_writer = parse_color_scheme_override(scheme_path, False)
+            self.assertEqual({}, color_scheme_data.existing_colors)
+            self.assertEqual({}, color_scheme_writer._rules)  # pylint: disable=protected-access
+        unstub(os)
+        unstub(path)
+
+    def test_parse_non_hex_background(self):
+        """Test a color scheme with a background color that is not a hex color is not supported."""
+        scheme_path = "Packages/Color/Scheme.sublime-color-scheme"
+        when(path).color_scheme_override_path(scheme_path, path.ABSOLUTE).thenReturn("/override")
+        when(os.path).exists("/override").thenReturn(False)
+        when(load_resource).load_resource(scheme_path).thenReturn(json.dumps({
+            "globals": {"background": "rgb(255, 255, 255)"},
+        }))
+        self.assertIsNone(parse_color_scheme_override(scheme_path, False))
+        unstub(os)
+        unstub(path)
+
+
+class ColorSchemeOverrideWriterTest(unittest.TestCase):
+    """Tests for ColorSchemeOverrideWriter."""
+
+    def tearDown(self):
+        """Restore the path and os modules."""
+        unstub(os)
+        unstub(path)
+
+    def test_add_scopes(self):
+        """Test that add_scopes adds rules to the override and keeps the existing rules."""
+        with tempfile.TemporaryDirectory() as directory:
+            override_path = _stub_data_path(directory)
+            existing_rule = {"name": "CH_color", "scope": "CH_color_000000FF", "background": "#000000FF"}
+            color_scheme_writer = ColorSchemeOverrideWriter(override_path, {"rules": [existing_rule]}, False)
+            color_scheme_writer.add_scopes([ElementTree.fromstring("""
+<dict>
+<key>name</key>
+<string>CH_color</string>
+<key>scope</key>
+<string>CH_color_FFFFFFFF</string>
+<key>settings</key>
+<dict>
+<key>background</key>
+<string>#FFFFFFFF</string>
+<key>foreground</key>
+<string>#000000FF</string>
+<key>caret</key>
+<string>#000000FF</string>
+</dict>
+</dict>
+""")])
+            with open(override_path) as override_file:
+                override = json.loads(override_file.read())
+            self.assertEqual({"rules": [existing_rule, {
+                "name": "CH_color", "scope": "CH_color_FFFFFFFF", "background": "#FFFFFFFF",
+                "foreground": "#000000FF"}]}, override)
+
+    def test_remove_scopes(self):
+        """Test that remove_scopes removes rules from the override and keeps the other rules."""
+        with tempfile.TemporaryDirectory() as directory:
+            override_path = _stub_data_path(directory)
+            other_rule = {"name": "CH_color", "scope": "CH_color_000000FF", "background": "#000000FF"}
+            rule = {"name": "CH_color", "scope": "CH_color_FFFFFFFF", "background": "#FFFFFFFF"}
+            color_scheme_writer = ColorSchemeOverrideWriter(override_path, {"rules": [other_rule, rule]}, False)
+            color_scheme_writer.remove_scopes(["CH_color_FFFFFFFF"])
+            with open(override_path) as override_file:
+                self.assertEqual({"rules": [other_rule]}, json.loads(override_file.read()))
+
+    def test_fix_color_scheme_for_gutter_colors(self):  # pylint: disable=invalid-name
+        """Test that the gutter colors fix is only added once."""
+        with tempfile.TemporaryDirectory() as directory:
+            override_path = _stub_data_path(directory)
+            override = {}
+            color_scheme_writer = ColorSchemeOverrideWriter(override_path, override, False)
+            color_scheme_writer.fix_color_scheme_for_gutter_colors()
+            color_scheme_writer.fix_color_scheme_for_gutter_colors()
+            self.assertEqual(1, len(override["rules"]))
+            self.assertEqual("ch_gutter_icon", override["rules"][0]["scope"])
+
+    def test_create_dir(self):
+        """Test that the color highlighter data directory is created on a fresh install."""
+        with tempfile.TemporaryDirectory() as directory:
+            override_path = _stub_data_path(os.path.join(directory, "ColorHighlighter"))
+            color_scheme_writer = ColorSchemeOverrideWriter(override_path, {}, False)
+            color_scheme_writer.fix_color_scheme_for_gutter_colors()
+            with open(override_path) as override_file:
+                self.assertEqual(1, len(json.loads(override_file.read())["rules"]))
+
+    def test_write_error(self):
+        """Test that a failed write is not raised to the caller."""
+        with tempfile.TemporaryDirectory() as directory:
+            data_path = os.path.join(directory, "ColorHighlighter")
+            with open(data_path, "w"):
+                pass
+            override_path = _stub_data_path(data_path)
+            color_scheme_writer = ColorSchemeOverrideWriter(override_path, {}, False)
+            color_scheme_writer.fix_color_scheme_for_gutter_colors()
+            self.assertFalse(os.path.exists(override_path))
+
+
+def _stub_data_path(data_path):
+    # Other tests leave os.path.exists stubbed, the data directory is checked in the real file system.
+    when(os.path).exists(ANY).thenAnswer(_EXISTS)
+    themes_path = os.path.join(data_path, "themes")
+    when(path).data_path(path.ABSOLUTE).thenReturn(data_path)
+    when(path).themes_path(path.ABSOLUTE).thenReturn(themes_path)
+    return os.path.join(themes_path, "Scheme.sublime-color-scheme")
+
+
+_TEST_TM_THEME_COLOR_SCHEME = """
+<root>
+<dict>
+    <key>settings</key>
+    <array>
+        <dict>
+            <key>settings</key>
+            <dict>
+                <key>background</key>
+                <string>#FFFFFFFF</string>
+            </dict>
+        </dict>
+    </array>
+</dict>
+</root>
+"""
+
+
+class ColorSchemeCacheTest(unittest.TestCase):
+    """Tests for ColorSchemeCache."""
+
+    def test_save_and_load(self):
+        """Test that the cache is valid until the color scheme file changes."""
+        with tempfile.TemporaryDirectory() as directory:
+            color_scheme = os.path.join(directory, "test.tmTheme")
+            cache_path = os.path.join(directory, "test.tmTheme.cache.json")
+            with open(color_scheme, "w") as color_scheme_file:
+                color_scheme_file.write(_TEST_COLOR_SCHEME)
+            ColorSchemeCache(cache_path, ColorSchemeData("#FFFFFFFF", {"#000000FF": "000000FF"})).save(color_scheme)
+            color_scheme_data = load_color_scheme_cache(cache_path, color_scheme)
+            self.assertEqual("#FFFFFFFF", color_scheme_data.background_color)
+            self.assertEqual({"#000000FF": "000000FF"}, color_scheme_data.existing_colors)
+
+            with open(color_scheme, "a") as color_scheme_file:
+                color_scheme_file.write("\n")
+            self.assertIsNone(load_color_scheme_cache(cache_path, color_scheme))
+            self.assertIsNone(load_color_scheme_cache(os.path.join(directory, "missing.json"), color_scheme))
+
+    def test_parse_cached_color_scheme(self):
+        """Test that parse_color_scheme doesn't parse the fake color scheme, if it's cached."""
+        with tempfile.TemporaryDirectory() as directory:
+            scheme_path = "Packages/Color/Cached.tmTheme"
+            fake_scheme_path = "Packages/User/ColorHighlighter/themes/Cached.tmTheme"
+            fake_color_scheme = os.path.join(directory, "Cached.tmTheme")
+            cache_path = os.path.join(directory, "Cached.tmTheme.cache.json")
+            with open(fake_color_scheme, "w") as color_scheme_file:
+                color_scheme_file.write(_TEST_COLOR_SCHEME)
+            ColorSchemeCache(cache_path, ColorSchemeData("#FFFFFFFF", {"#000000FF": "000000FF"})).save(
+                fake_color_scheme)
+            when(path).fake_color_scheme_path(scheme_path, path.ABSOLUTE).thenReturn(fake_color_scheme)
+            when(path).fake_color_scheme_path(scheme_path, path.RELATIVE).thenReturn(fake_scheme_path)
+            when(path).color_scheme_cache_path(scheme_path, path.ABSOLUTE).thenReturn(cache_path)
+            when(load_resource).load_resource(fake_scheme_path).thenRaise(AssertionError("should not be loaded"))
+
+            new_color_scheme, color_scheme_data, color_scheme_writer = parse_color_scheme(scheme_path, False)
+            self.assertEqual(fake_scheme_path, new_color_scheme)
+            self.assertEqual({"#000000FF": "000000FF"}, color_scheme_data.existing_colors)
+            self.assertIsNone(color_scheme_writer._xml_tree)  # pylint: disable=protected-access
+            unstub(path)
+
+    def test_lazy_writer(self):
+        """Test that a writer for a cached color scheme inserts scopes without parsing the color scheme."""
+        with tempfile.TemporaryDirectory() as directory:
+            color_scheme = os.path.join(directory, "test.tmTheme")
+            cache_path = os.path.join(directory, "test.tmTheme.cache.json")
+            when(os.path).exists(ANY).thenReturn(True)
+            when(path).cached_scheme_path(color_scheme).thenReturn(os.path.join(directory, "test.tmTheme.cache"))
+            xml = ElementTree.fromstring(_TEST_COLOR_SCHEME)
+            ColorSchemeWriter(color_scheme, ElementTree.ElementTree(xml), xml[0][1], False, None).add_scopes(
+                [_scope("scope1")])
+
+            color_scheme_data = ColorSchemeData("#FFFFFFFF", {})
+            color_scheme_writer = ColorSchemeWriter(
+                color_scheme, None, None, False, ColorSchemeCache(cache_path, color_scheme_data))
+            color_scheme_writer.fix_color_scheme_for_gutter_colors()
+            color_scheme_data.existing_colors["#000000FF"] = "000000FF"
+            color_scheme_writer.add_scopes([_scope("scope2")])
+            self.assertIsNone(color_scheme_writer._xml_tree)  # pylint: disable=protected-access
+            self.assertEqual(["scheme", "scope1", "ch_gutter_icon", "scope2"], _read_scope_names(color_scheme))
+            self.assertEqual(
+                {"#000000FF": "000000FF"}, load_color_scheme_cache(cache_path, color_scheme).existing_colors)
+
+            color_scheme_writer.remove_scopes(["scope1"])
+            self.assertEqual(["scheme", "ch_gutter_icon", "scope2"], _read_scope_names(color_scheme))
+            unstub(os)
+            unstub(path)
@@ -1,5 +1,8 @@
 """Tests for color_scheme_color_highlighter."""
 
+import json
+import os
+import tempfile
 import unittest
 
 from xml.etree import ElementTree
@@ -7,12 +10,13 @@ from xml.etree import ElementTree
 from ColorHighlighter import sublime  # pylint: disable=no-name-in-module
 from ColorHighlighter.color_scheme import ColorSchemeData  # pylint: disable=no-name-in-module,import-error
 from ColorHighlighter.color_scheme_color_highlighter import (  # pylint: disable=no-name-in-module,import-error
-    ColorSchemeBuilder, ColorSchemeColorHighlighter)
+    ColorSchemeBuilder, ColorSchemeColorHighlighter, ColorSchemeUsage)
 from ColorHighlighter.regions import NormalizedRegion  # pylint: disable=no-name-in-module,import-error
 from ColorHighlighter.settings import (  # pylint: disable=no-name-in-module,import-error
     ColorSchemeColorHighlighterSettings)
+from ColorHighlighter.text_change import TextChange  # pylint: disable=no-name-in-module,import-error
 
-from mockito import ANY, captor, mock, verify, when
+from mockito import ANY, captor, mock, unstub, verify, when
 
 
 class ColorSchemeColorHighlighterTest(unittest.TestCase):
@@ -23,7 +27,7 @@ class ColorSchemeColorHighlighterTest(unittest.TestCase):
     def test_bad_style(self):
         """Check that bad style failes."""
         with self.assertRaises(AssertionError):
-            ColorSchemeColorHighlighter(None, "bad-style", None, self.test_name, False)
+            ColorSchemeColorHighlighter(None, "bad-style", None, self.test_name, False, False)
 
     def test_valid_style_set(self):
         """Test that sets of valid highlighting styles are consistent."""
@@ -43,14 +47,15 @@ class ColorSchemeColorHighlighterTest(unittest.TestCase):
         scope = mock()
         when(color_scheme_builder).get_scopes(ANY, ANY).thenReturn([scope])
         view = mock()
-        color_highlighter = ColorSchemeColorHighlighter(view, "filled", color_scheme_builder, self.test_name, False)
+        color_highlighter = ColorSchemeColorHighlighter(
+            view, "filled", color_scheme_builder, self.test_name, False, False)
         context = {}
         color_highlighter.highlight_region(context, (region, color))
         color_highlighter.highlight_regions_done(context)
         verify(color_scheme_builder).get_scopes([color], False)
         verify(view).add_regions(
             ColorSchemeColorHighlighter.region_name_template %
-            (self.test_name, region.a, region.b), [sublime_region], scope, "", sublime.DRAW_NO_OUTLINE)
+            (self.test_name, 0), [sublime_region], scope, "", sublime.DRAW_NO_OUTLINE)
 
     def test_text_highlight(self):  # pylint: disable=no-self-use
         """Test highlight a region with text style."""
@@ -64,14 +69,15 @@ class ColorSchemeColorHighlighterTest(unittest.TestCase):
         scope = mock()
         when(color_scheme_builder).get_scopes(ANY, ANY).thenReturn([scope])
         view = mock()
-        color_highlighter = ColorSchemeColorHighlighter(view, "text", color_scheme_builder, self.test_name, False)
+        color_highlighter = ColorSchemeColorHighlighter(
+            view, "text", color_scheme_builder, self.test_name, False, False)
         context = {}
         color_highlighter.highlight_region(context, (region, color))
         color_highlighter.highlight_regions_done(context)
         verify(color_scheme_builder).get_scopes([color], True)
         verify(view).add_regions(
             ColorSchemeColorHighlighter.region_name_template %
-            (self.test_name, region.a, region.b), [sublime_region], scope, "", sublime.DRAW_NO_OUTLINE)
+            (self.test_name, 0), [sublime_region], scope, "", sublime.DRAW_NO_OUTLINE)
 
     def test_highlight_regions(self):  # pylint: disable=no-self-use,too-many-locals
         """Test highlight multiple regions."""
@@ -93,7 +99,8 @@ class ColorSchemeColorHighlighterTest(unittest.TestCase):
         scope2 = mock()
         when(color_scheme_builder).get_scopes(ANY, ANY).thenReturn([scope1, scope2])
         view = mock()
-        color_highlighter = ColorSchemeColorHighlighter(view, "filled", color_scheme_builder, self.test_name, False)
+        color_highlighter = ColorSchemeColorHighlighter(
+            view, "filled", color_scheme_builder, self.test_name, False, False)
         context = {}
         color_highlighter.highlight_region(context, (region1, color1))
         color_highlighter.highlight_region(context, (region2, color2))
@@ -101,16 +108,17 @@ class ColorSchemeColorHighlighterTest(unittest.TestCase):
         verify(color_scheme_builder).get_scopes([color1, color2], False)
         verify(view).add_regions(
             ColorSchemeColorHighlighter.region_name_template %
-            (self.test_name, region1.a, region1.b), [sublime_region1], scope1, "", sublime.DRAW_NO_OUTLINE)
+            (self.test_name, 0), [sublime_region1], scope1, "", sublime.DRAW_NO_OUTLINE)
         verify(view).add_regions(
             ColorSchemeColorHighlighter.region_name_template %
-            (self.test_name, region2.a, region2.b), [sublime_region2], scope2, "", sublime.DRAW_NO_OUTLINE)
+            (self.test_name, 1), [sublime_region2], scope2, "", sublime.DRAW_NO_OUTLINE)
 
     def test_no_regions(self):  # pylint: disable=no-self-use
         """Test highlight zero regions."""
         color_scheme_builder = mock()
         view = mock()
-        color_highlighter = ColorSchemeColorHighlighter(view, "filled", color_scheme_builder, self.test_name, False)
+        color_highlighter = ColorSchemeColorHighlighter(
+            view, "filled", color_scheme_builder, self.test_name, False, False)
         context = {}
         color_highlighter.highlight_regions_done(context)
         verify(color_scheme_builder, times=0).get_scopes(ANY, ANY)
@@ -119,11 +127,40 @@ class ColorSchemeColorHighlighterTest(unittest.TestCase):
     def test_unhighlight_region(self):  # pylint: disable=no-self-use
         """Test unhighlight a region."""
         region = NormalizedRegion(10, 20)
+        when(sublime).Region(region.a, region.b).thenReturn(mock())
+        color_scheme_builder = mock()
+        when(color_scheme_builder).get_scopes(ANY, ANY).thenReturn([mock()])
         view = mock()
-        color_highlighter = ColorSchemeColorHighlighter(view, "filled", None, self.test_name, False)
+        color_highlighter = ColorSchemeColorHighlighter(
+            view, "filled", color_scheme_builder, self.test_name, False, False)
+        context = {}
+        color_highlighter.highlight_region(context, (region, "color"))
+        color_highlighter.highlight_regions_done(context)
         color_highlighter.unhighlight_region(None, (region, None))
-        verify(view).erase_regions(
-            ColorSchemeColorHighlighter.region_name_template % (self.test_name, region.a, region.b))
+        verify(view).erase_regions(ColorSchemeColorHighlighter.region_name_template % (self.test_name, 0))
+
+    def test_unhighlight_not_highlighted_region(self):  # pylint: disable=no-self-use,invalid-name
+        """Test unhighlight a region that was never highlighted."""
+        view = mock()
+        color_highlighter = ColorSchemeColorHighlighter(view, "filled", None, self.test_name, False, False)
+        color_highlighter.unhighlight_region(None, (NormalizedRegion(10, 20), None))
+        verify(view, times=0).erase_regions(ANY)
+
+    def test_unhighlight_shifted_region(self):  # pylint: disable=no-self-use
+        """Test unhighlight a region that was shifted by a text change keeps the region key."""
+        region = NormalizedRegion(10, 20)
+        when(sublime).Region(region.a, region.b).thenReturn(mock())
+        color_scheme_builder = mock()
+        when(color_scheme_builder).get_scopes(ANY, ANY).thenReturn([mock()])
+        view = mock()
+        color_highlighter = ColorSchemeColorHighlighter(
+            view, "filled", color_scheme_builder, self.test_name, False, False)
+        context = {}
+        color_highlighter.highlight_region(context, (region, "color"))
+        color_highlighter.highlight_regions_done(context)
+        color_highlighter.shift_regions([TextChange(5, 5, 3)])
+        color_highlighter.unhighlight_region(None, (NormalizedRegion(13, 23), None))
+        verify(view).erase_regions(ColorSchemeColorHighlighter.region_name_template % (self.test_name, 0))
 
 
 class ColorSchemeBuilderTest(unittest.TestCase):
@@ -134,7 +171,7 @@ class ColorSchemeBuilderTest(unittest.TestCase):
         background_color = "#FFFFF1FF"
         data = ColorSchemeData(background_color, {})
         color_scheme_writer = mock()
-        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False)
+        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False, 0, None)
         color = "#FFFFFFFF"
         scopes = color_scheme_builder.get_scopes([color], False)
         self.assertEqual(
@@ -179,7 +216,7 @@ class ColorSchemeBuilderTest(unittest.TestCase):
         data = ColorSchemeData(background_color, {})
         color_scheme_writer = mock()
         when(sublime).set_timeout_async(ANY, ANY).thenReturn(None)
-        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, True)
+        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, True, 0, None)
         color = "#FFFFFFFF"
         scopes = color_scheme_builder.get_scopes([color], False)
         self.assertEqual(
@@ -222,12 +259,32 @@ class ColorSchemeBuilderTest(unittest.TestCase):
 </dict>""", ElementTree.tostring(scopes.value[1]))
         self.assertEqual({"#FFFFFFFF": "FFFFFFFF"}, data.existing_colors)
 
+    def test_get_scopes_coalesced(self):
+        """Test new scopes from several get_scopes calls are written to the color scheme together."""
+        data = ColorSchemeData("#FFFFF1FF", {})
+        color_scheme_writer = mock()
+        when(sublime).set_timeout_async(ANY, ANY).thenReturn(None)
+        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False, 100, None)
+        color_scheme_builder.get_scopes(["#FFFFFFFF"], False)
+        color_scheme_builder.get_scopes(["#FFFFFFFF", "#000000FF"], True)
+        verify(color_scheme_writer, times=0).add_scopes(ANY)
+        flush = captor()
+        verify(sublime, times=1).set_timeout_async(flush, 100)
+        flush.value()
+        scopes = captor()
+        verify(color_scheme_writer, times=1).add_scopes(scopes)
+        self.assertEqual(4, len(scopes.value))
+        self.assertEqual({"#FFFFFFFF": "FFFFFFFF", "#000000FF": "000000FF"}, data.existing_colors)
+
+        color_scheme_builder.get_scopes(["#FF0000FF"], False)
+        verify(sublime, times=2).set_timeout_async(ANY, 100)
+
     def test_get_scopes_for_background(self):
         """Test get_scopes on a new color that is the same as the background color."""
         background_color = "#FFFFFFFF"
         data = ColorSchemeData(background_color, {})
         color_scheme_writer = mock()
-        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False)
+        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False, 0, None)
         color = "#FFFFFFFF"
         scopes = color_scheme_builder.get_scopes([color], False)
         self.assertEqual(
@@ -271,7 +328,7 @@ class ColorSchemeBuilderTest(unittest.TestCase):
         background_color = "#FFFFF1FF"
         data = ColorSchemeData(background_color, {"#FFFFFFFF": "FFFFFFFF"})
         color_scheme_writer = mock()
-        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False)
+        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False, 0, None)
         color = "#FFFFFFFF"
         scopes = color_scheme_builder.get_scopes([color], False)
         self.assertEqual(
@@ -283,7 +340,7 @@ class ColorSchemeBuilderTest(unittest.TestCase):
         background_color = "#FFFFF1FF"
         data = ColorSchemeData(background_color, {"#FFFFFFFF": "FFFFFFFF"})
         color_scheme_writer = mock()
-        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False)
+        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False, 0, None)
         color = "#FFFFFFFF"
         scopes = color_scheme_builder.get_scopes([color], True)
         self.assertEqual(
@@ -295,7 +352,7 @@ class ColorSchemeBuilderTest(unittest.TestCase):
         background_color = "#FFFFF1FF"
         data = ColorSchemeData(background_color, {})
         color_scheme_writer = mock()
-        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False)
+        color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False, 0, None)
         color1 = "#FFFFFFFF"
         color2 = "#000000FF"
         scopes = color_scheme_builder.get_scopes([color1, color2], False)
@@ -305,3 +362,181 @@ class ColorSchemeBuilderTest(unittest.TestCase):
         scopes = captor()
         verify(color_scheme_writer).add_scopes(scopes)
         self.assertEqual(4, len(scopes.value))
+
+    def test_gutter_colors_fix_async(self):
+        """Test that the gutter colors fix is checked once and written in the background like other scheme writes."""
+        color_scheme_writer = mock()
+        async_work = []
+        when(sublime).set_timeout_async(ANY, ANY).thenAnswer(lambda callback, delay: async_work.append(callback))
+        color_scheme_builder = ColorSchemeBuilder(ColorSchemeData("#FFFFF1FF", {}), color_scheme_writer, True, 0, None)
+        color_scheme_builder.fix_color_scheme_for_gutter_colors()
+        verify(color_scheme_writer, times=0).fix_color_scheme_for_gutter_colors()
+        self.assertEqual(1, len(async_work))
+        async_work[0]()
+        verify(color_scheme_writer).fix_color_scheme_for_gutter_colors()
+
+        color_scheme_builder.fix_color_scheme_for_gutter_colors()
+        self.assertEqual(1, len(async_work))
+
+
+class ColorSchemeBuilderGcTest(unittest.TestCase):
+    """Tests for collecting unused colors in ColorSchemeBuilder."""
+
+    def test_collect_unused_colors(self):
+        """Test that colors without references are removed if they are not used for long or over the limit."""
+        with tempfile.TemporaryDirectory() as directory:
+            usage_path = os.path.join(directory, "usage.json")
+            with open(usage_path, "w") as usage_file:
+                usage_file.write(json.dumps({"session": 5, "colors": {"#AAAAAAFF": 1, "#BBBBBBFF": 1, "#CCCCCCFF": 5}}))
+            color_usage = ColorSchemeUsage(usage_path)
+            color_usage.load()
+            # #EEEEEEFF has no usage data, so it's never removed.
+            data = ColorSchemeData("#000000FF", {
+                "#AAAAAAFF": "AAAAAAFF", "#BBBBBBFF": "BBBBBBFF", "#CCCCCCFF": "CCCCCCFF", "#DDDDDDFF": "DDDDDDFF",
+                "#EEEEEEFF": "EEEEEEFF"})
+            color_scheme_writer = mock()
+            when(sublime).set_timeout_async(ANY, 0).thenAnswer(lambda callback, delay: callback())
+            color_scheme_builder = ColorSchemeBuilder(data, color_scheme_writer, False, 0, color_usage)
+            color_scheme_builder.add_color_reference("#AAAAAAFF")
+            color_scheme_builder.add_color_reference("#DDDDDDFF")
+            color_scheme_builder.remove_color_reference("#DDDDDDFF")
+
+            color_scheme_builder.collect_unused_colors(3, 2)
+            scope_names = captor()
+            verify(color_scheme_writer).remove_scopes(scope_names)
+            self.assertEqual(
+                ["CH_color_BBBBBBFF", "CH_color_CCCCCCFF", "CH_text_color_BBBBBBFF", "CH_text_color_CCCCCCFF"],
+                sorted(scope_names.value))
+            self.assertEqual(
+                {"#AAAAAAFF": "AAAAAAFF", "#DDDDDDFF": "DDDDDDFF", "#EEEEEEFF": "EEEEEEFF"}, data.existing_colors)
+            with open(usage_path) as usage_file:
+                self.assertEqual(
+                    {"session": 6, "process": os.getpid(), "colors": {"#AAAAAAFF": 6, "#DDDDDDFF": 6}},
+                    json.loads(usage_file.read()))
+
+    def test_collect_unused_colors_no_usage(self):  # pylint: disable=invalid-name,no-self-use
+        """Test that colors are not collected without usage tracking."""
+        when(sublime).set_timeout_async(ANY, 0).thenAnswer(lambda callback, delay: callback())
+        color_scheme_writer = mock()
+        color_scheme_builder = ColorSchemeBuilder(
+            ColorSchemeData("#000000FF", {"#AAAAAAFF": "AAAAAAFF"}), color_scheme_writer, False, 0, None)
+        color_scheme_builder.collect_unused_colors(0, 0)
+        verify(color_scheme_writer, times=0).remove_scopes(ANY)
+
+
+class ColorSchemeUsageTest(unittest.TestCase):
+    """Tests for ColorSchemeUsage."""
+
+    def test_sessions(self):
+        """Test that colors usage is tracked between sessions."""
+        with tempfile.TemporaryDirectory() as directory:
+            usage_path = os.path.join(directory, "usage.json")
+            when(os).getpid().thenReturn(1)
+            color_usage = ColorSchemeUsage(usage_path)
+            color_usage.load()
+            color_usage.use("#color1")
+            color_usage.use("#color2")
+            color_usage.save()
+            self.assertFalse(color_usage.changed())
+
+            # Reloading the plugin in the same ST process continues the session.
+            color_usage = ColorSchemeUsage(usage_path)
+            color_usage.load()
+            self.assertEqual(0, color_usage.unused_sessions("#color1"))
+
+            when(os).getpid().thenReturn(2)
+            color_usage.load()
+            color_usage.save()
+            when(os).getpid().thenReturn(3)
+            color_usage.load()
+            color_usage.use("#color2")
+            self.assertEqual(2, color_usage.unused_sessions("#color1"))
+            self.assertEqual(0, color_usage.unused_sessions("#color2"))
+            self.assertIsNone(color_usage.unused_sessions("#color3"))
+            color_usage.forget("#color1")
+            self.assertIsNone(color_usage.unused_sessions("#color1"))
+            unstub(os)
+
+
+class GroupedColorSchemeColorHighlighterTest(unittest.TestCase):
+    """Tests for ColorSchemeColorHighlighter that groups regions by color."""
+
+    test_name = "test-name"
+
+    def test_highlight_regions(self):  # pylint: disable=no-self-use
+        """Test that regions with the same color are highlighted with one region key."""
+        sublime_region1 = mock()
+        when(sublime).Region(10, 20).thenReturn(sublime_region1)
+        sublime_region2 = mock()
+        when(sublime).Region(30, 40).thenReturn(sublime_region2)
+        sublime_region3 = mock()
+        when(sublime).Region(50, 60).thenReturn(sublime_region3)
+        color1 = "#color1"
+        color2 = "#color2"
+        color_scheme_builder = mock()
+        scope1 = mock()
+        scope2 = mock()
+        when(color_scheme_builder).get_scopes([color1, color2], False).thenReturn([scope1, scope2])
+        view = mock()
+        color_highlighter = ColorSchemeColorHighlighter(
+            view, "filled", color_scheme_builder, self.test_name, True, False)
+        context = {}
+        color_highlighter.highlight_region(context, (NormalizedRegion(30, 40), color1))
+        color_highlighter.highlight_region(context, (NormalizedRegion(10, 20), color1))
+        color_highlighter.highlight_region(context, (NormalizedRegion(50, 60), color2))
+        color_highlighter.highlight_regions_done(context)
+        verify(color_scheme_builder, times=1).get_scopes(ANY, ANY)
+        verify(view).add_regions(
+            ColorSchemeColorHighlighter.group_region_name_template % (self.test_name, "color1"),
+            [sublime_region1, sublime_region2], scope1, "", sublime.DRAW_NO_OUTLINE)
+        verify(view).add_regions(
+            ColorSchemeColorHighlighter.group_region_name_template % (self.test_name, "color2"),
+            [sublime_region3], scope2, "", sublime.DRAW_NO_OUTLINE)
+
+    def test_unhighlight_region(self):  # pylint: disable=no-self-use
+        """Test that unhighlighting a region updates it's group and erases empty groups."""
+        sublime_region1 = mock()
+        when(sublime).Region(10, 20).thenReturn(sublime_region1)
+        when(sublime).Region(30, 40).thenReturn(mock())
+        color = "#color"
+        color_scheme_builder = mock()
+        scope = mock()
+        when(color_scheme_builder).get_scopes([color], False).thenReturn([scope])
+        view = mock()
+        color_highlighter = ColorSchemeColorHighlighter(
+            view, "filled", color_scheme_builder, self.test_name, True, False)
+        context = {}
+        color_highlighter.highlight_region(context, (NormalizedRegion(10, 20), color))
+        color_highlighter.highlight_region(context, (NormalizedRegion(30, 40), color))
+        color_highlighter.highlight_regions_done(context)
+        region_key = ColorSchemeColorHighlighter.group_region_name_template % (self.test_name, "color")
+
+        context = {}
+        color_highlighter.unhighlight_region(context, (NormalizedRegion(30, 40), color))
+        color_highlighter.highlight_regions_done(context)
+        verify(view).add_regions(region_key, [sublime_region1], scope, "", sublime.DRAW_NO_OUTLINE)
+
+        context = {}
+        color_highlighter.unhighlight_region(context, (NormalizedRegion(10, 20), color))
+        color_highlighter.highlight_regions_done(context)
+        verify(view).erase_regions(region_key)
+        verify(color_scheme_builder, times=2).get_scopes([color], False)
+
+    def test_color_references(self):  # pylint: disable=no-self-use
+        """Test that each highlighted region references it's color in the color scheme builder."""
+        when(sublime).Region(10, 20).thenReturn(mock())
+        color = "#color"
+        color_scheme_builder = mock()
+        when(color_scheme_builder).get_scopes([color], False).thenReturn([mock()])
+        color_highlighter = ColorSchemeColorHighlighter(
+            mock(), "filled", color_scheme_builder, self.test_name, True, False)
+        context = {}
+        color_highlighter.highlight_region(context, (NormalizedRegion(10, 20), color))
+        color_highlighter.highlight_region(context, (NormalizedRegion(10, 20), color))
+        color_highlighter.highlight_regions_done(context)
+        verify(color_scheme_builder, times=1).add_color_reference(color)
+        context = {}
+        color_highlighter.unhighlight_region(context, (NormalizedRegion(10, 20), color))
+        color_highlighter.unhighlight_region(context, (NormalizedRegion(10, 20), color))
+        color_highlighter.highlight_regions_done(context)
+        verify(color_scheme_builder, times=1).remove_color_reference(color)
@@ -4,10 +4,12 @@ import re
 import unittest
 
 from ColorHighlighter import sublime  # pylint: disable=no-name-in-module
-from ColorHighlighter.color_searcher import ColorSearcher  # pylint: disable=no-name-in-module,import-error
+from ColorHighlighter.color_converter import ColorConverter  # pylint: disable=no-name-in-module,import-error
+from ColorHighlighter.color_searcher import (  # pylint: disable=no-name-in-module,import-error
+    CachingColorSearcher, ColorSearcher)
 from ColorHighlighter.regions import NormalizedRegion  # pylint: disable=no-name-in-module,import-error
 
-from mockito import ANY, mock, when
+from mockito import ANY, mock, verify, when
 
 
 class ColorSearcherTest(unittest.TestCase):
@@ -29,12 +31,12 @@ class ColorSearcherTest(unittest.TestCase):
         test_color = "#FB"
         test_group = "test_group"
         color_converter = mock()
-        when(color_converter).to_color({test_group: test_color_text}).thenReturn(test_color)
+        when(color_converter).match_to_color(ANY).thenReturn(test_color)
         color_searcher = ColorSearcher(re.compile("(?P<%s>#[0-9a-fA-F]{2})" % test_group), color_converter)
 
         results = [result for result in color_searcher.search(view, region)]
         self.assertEqual(
-            [(NormalizedRegion(begin + 1, end - 1), test_color, {test_group: test_color_text})], results)
+            [(NormalizedRegion(begin + 1, end - 1), test_color, test_group)], results)
 
     def test_search_found_bad(self):
         """Test found color which could not be converted to a canonical form."""
@@ -75,14 +77,30 @@ class ColorSearcherTest(unittest.TestCase):
         test_color2 = "#DB"
         test_group = "test_group"
         color_converter = mock()
-        when(color_converter).to_color({test_group: test_color_text1}).thenReturn(test_color1)
-        when(color_converter).to_color({test_group: test_color_text2}).thenReturn(test_color2)
+        when(color_converter).match_to_color(ANY).thenReturn(test_color1).thenReturn(test_color2)
         color_searcher = ColorSearcher(re.compile("(?P<%s>#[0-9a-fA-F]{2})" % test_group), color_converter)
 
         results = [result for result in color_searcher.search(view, region)]
         self.assertEqual(
-            [(NormalizedRegion(begin + 1, begin + 4), test_color1, {test_group: test_color_text1}),
-             (NormalizedRegion(end - 4, end - 1), test_color2, {test_group: test_color_text2})], results)
+            [(NormalizedRegion(begin + 1, begin + 4), test_color1, test_group),
+             (NormalizedRegion(end - 4, end - 1), test_color2, test_group)], results)
+
+    def test_search_formats(self):
+        """Test that colors are converted by the format that matched them."""
+        region = NormalizedRegion(0, 20)
+        whole_region = mock()
+        when(sublime).Region(0, 20).thenReturn(whole_region)
+        view = mock()
+        when(view).substr(whole_region).thenReturn("#AABBCC #abc")
+        regex = re.compile(
+            "(?P<sharp6>#[0-9a-fA-F]{6})|" +
+            "(?P<sharp3>#(?P<sharp3_R>[0-9a-fA-F])(?P<sharp3_G>[0-9a-fA-F])(?P<sharp3_B>[0-9a-fA-F]))")
+        color_searcher = ColorSearcher(regex, ColorConverter(["sharp6", "sharp3"]))
+
+        results = [result for result in color_searcher.search(view, region)]
+        self.assertEqual(
+            [(NormalizedRegion(0, 7), "#aabbccff", "sharp6"), (NormalizedRegion(8, 12), "#aabbccff", "sharp3")],
+            results)
 
     def test_search_not_found(self):
         """Test search."""
@@ -98,3 +116,65 @@ class ColorSearcherTest(unittest.TestCase):
 
         results = [result for result in color_searcher.search(view, region)]
         self.assertEqual([], results)
+
+
+class CachingColorSearcherTest(unittest.TestCase):
+    """Tests for CachingColorSearcher."""
+
+    def test_search_cached(self):  # pylint: disable=no-self-use
+        """Test that a region is searched once per view content version."""
+        view = mock()
+        line = NormalizedRegion(0, 10)
+        sublime_line = mock()
+        when(sublime).Region(0, 10).thenReturn(sublime_line)
+        when(view).lines(sublime_line).thenReturn([sublime_line])
+        result = (NormalizedRegion(1, 4), "#FFFFFFFF", {})
+        color_searcher = mock()
+        when(color_searcher).search(view, line).thenReturn(iter([result])).thenReturn(iter([result]))
+        caching_color_searcher = CachingColorSearcher(color_searcher)
+
+        when(view).change_count().thenReturn(1)
+        self.assertEqual([result], list(caching_color_searcher.search(view, line)))
+        self.assertEqual([result], list(caching_color_searcher.search(view, line)))
+        verify(color_searcher, times=1).search(view, line)
+
+        when(view).change_count().thenReturn(2)
+        self.assertEqual([result], list(caching_color_searcher.search(view, line)))
+        verify(color_searcher, times=2).search(view, line)
+
+    def test_search_lines_cached(self):  # pylint: disable=no-self-use
+        """Test that results for regions inside of a searched region are taken from it's results."""
+        view = mock()
+        when(view).change_count().thenReturn(1)
+        whole_region = NormalizedRegion(0, 20)
+        result1 = (NormalizedRegion(1, 4), "#FFFFFFFF", {})
+        result2 = (NormalizedRegion(12, 15), "#000000FF", {})
+        color_searcher = mock()
+        when(color_searcher).search(view, whole_region).thenReturn(iter([result1, result2]))
+        caching_color_searcher = CachingColorSearcher(color_searcher)
+
+        self.assertEqual([result1, result2], list(caching_color_searcher.search(view, whole_region)))
+        self.assertEqual([result1], list(caching_color_searcher.search(view, NormalizedRegion(0, 9))))
+        self.assertEqual([result2], list(caching_color_searcher.search(view, NormalizedRegion(10, 20))))
+        self.assertEqual([], list(caching_color_searcher.search(view, NormalizedRegion(5, 10))))
+        verify(color_searcher, times=1).search(ANY, ANY)
+        verify(view, times=0).lines(ANY)
+
+    def test_search_shared_by_views(self):  # pylint: disable=no-self-use
+        """Test that views of the same buffer share search results."""
+        view1 = mock()
+        view2 = mock()
+        line = NormalizedRegion(0, 10)
+        sublime_line = mock()
+        when(sublime).Region(0, 10).thenReturn(sublime_line)
+        for view in [view1, view2]:
+            when(view).change_count().thenReturn(1)
+            when(view).lines(sublime_line).thenReturn([sublime_line])
+        result = (NormalizedRegion(1, 4), "#FFFFFFFF", {})
+        color_searcher = mock()
+        when(color_searcher).search(view1, line).thenReturn(iter([result]))
+        caching_color_searcher = CachingColorSearcher(color_searcher)
+
+        self.assertEqual([result], list(caching_color_searcher.search(view1, line)))
+        self.assertEqual([result], list(caching_color_searcher.search(view2, line)))
+        verify(color_searcher, times=0).search(view2, ANY)
@@ -0,0 +1,206 @@
+"""Tests for content_listener.ContentListener."""
+
+import unittest
+
+from ColorHighlighter import sublime  # pylint: disable=no-name-in-module
+from ColorHighlighter.content_listener import ContentListener  # pylint: disable=no-name-in-module,import-error
+from ColorHighlighter.regions import NormalizedRegion  # pylint: disable=no-name-in-module,import-error
+from ColorHighlighter.text_change import TextChange  # pylint: disable=no-name-in-module,import-error
+
+from mockito import ANY, mock, verify, when
+from mockito.matchers import captor
+
+
+class ContentListenerTest(unittest.TestCase):
+    """Tests for ContentListener."""
+
+    def test_on_load(self):
+        """Test that the whole buffer is searched for colors in one pass."""
+        color_searcher = mock()
+        view = mock()
+        color_highlighter = mock()
+        content_listener = ContentListener(color_searcher, view, color_highlighter, False, 0, False)
+
+        color_region1 = (NormalizedRegion(10, 11), 1)
+        color_region2 = (NormalizedRegion(30, 32), 2)
+        when(view).size().thenReturn(100)
+        when(sublime).Region(0, 100).thenReturn(mock())
+        when(view).substr(ANY).thenReturn("")
+        when(color_searcher).search(view, NormalizedRegion(0, 100)).thenReturn(
+            [color_region1 + (None,), color_region2 + (None,)])
+        content_listener.on_load()
+        color_regions = captor()
+        verify(color_highlighter).highlight_regions(color_regions)
+        self.assertEqual([color_region1, color_region2], [region for region in color_regions.value])
+
+    def test_on_load_async(self):
+        """Test that the whole buffer is searched in the background and the results are applied in the UI thread."""
+        color_searcher = mock()
+        view = mock()
+        color_highlighter = mock()
+        content_listener = ContentListener(color_searcher, view, color_highlighter, True, 0, False)
+        when(sublime).set_timeout_async(ANY, ANY).thenAnswer(lambda callback, delay: callback())
+        when(sublime).set_timeout(ANY, ANY).thenAnswer(lambda callback, delay: callback())
+
+        color_region = (NormalizedRegion(10, 11), 1)
+        when(view).size().thenReturn(100)
+        when(sublime).Region(0, 100).thenReturn(mock())
+        when(view).substr(ANY).thenReturn("")
+        when(view).change_count().thenReturn(1)
+        when(color_searcher).search(view, NormalizedRegion(0, 100)).thenReturn([color_region + (None,)])
+        content_listener.on_load()
+        verify(color_highlighter).highlight_regions([color_region])
+
+    def test_on_load_async_stale(self):
+        """Test that search results are dropped and the buffer is searched again if it changed during the search."""
+        color_searcher = mock()
+        view = mock()
+        color_highlighter = mock()
+        content_listener = ContentListener(color_searcher, view, color_highlighter, True, 0, False)
+        searches = []
+        when(sublime).set_timeout_async(ANY, ANY).thenAnswer(lambda callback, delay: searches.append(callback))
+        results = []
+        when(sublime).set_timeout(ANY, ANY).thenAnswer(lambda callback, delay: results.append(callback))
+
+        stale_color_region = (NormalizedRegion(10, 11), 1)
+        color_region = (NormalizedRegion(12, 13), 1)
+        when(view).size().thenReturn(100)
+        when(sublime).Region(0, 100).thenReturn(mock())
+        when(view).substr(ANY).thenReturn("")
+        when(view).change_count().thenReturn(1)
+        when(color_searcher).search(view, NormalizedRegion(0, 100)).thenReturn([stale_color_region + (None,)])
+        content_listener.on_load()
+        searches.pop()()
+        when(view).change_count().thenReturn(2)
+        when(color_searcher).search(view, NormalizedRegion(0, 100)).thenReturn([color_region + (None,)])
+        results.pop()()
+        verify(color_highlighter, times=0).highlight_regions(ANY)
+
+        searches.pop()()
+        results.pop()()
+        verify(color_highlighter).highlight_regions([color_region])
+
+    def test_on_load_progressive(self):
+        """Test that the visible part of the buffer is searched first and the rest of it is searched later."""
+        color_searcher = mock()
+        view = mock()
+        color_highlighter = mock()
+        content_listener = ContentListener(color_searcher, view, color_highlighter, False, 1000, False)
+        steps = []
+        when(sublime).set_timeout(ANY, ANY).thenAnswer(lambda callback, delay: steps.append(callback))
+
+        when(view).size().thenReturn(100)
+        when(sublime).Region(0, 100).thenReturn(mock())
+        when(view).substr(ANY).thenReturn("")
+        when(view).change_count().thenReturn(1)
+        when(view).visible_region().thenReturn(NormalizedRegion(50, 60))
+        when(view).line(40).thenReturn(NormalizedRegion(38, 45))
+        when(view).line(70).thenReturn(NormalizedRegion(68, 75))
+        viewport = NormalizedRegion(38, 75)
+        when(color_searcher).search(view, viewport).thenReturn([(NormalizedRegion(55, 57), 1, None)])
+        when(color_searcher).search(view, NormalizedRegion(75, 100)).thenReturn([(NormalizedRegion(80, 82), 2, None)])
+        when(color_searcher).search(view, NormalizedRegion(0, 38)).thenReturn([(NormalizedRegion(10, 12), 3, None)])
+        content_listener.on_load()
+        color_regions = captor()
+        verify(color_highlighter).highlight_regions_in(color_regions, [viewport])
+        self.assertEqual([(NormalizedRegion(55, 57), 1)], list(color_regions.value))
+
+        self.assertEqual(1, len(steps))
+        steps.pop()()
+        verify(color_highlighter).highlight_regions_in(
+            [(NormalizedRegion(80, 82), 2), (NormalizedRegion(10, 12), 3)],
+            [NormalizedRegion(75, 100), NormalizedRegion(0, 38)])
+        self.assertEqual([], steps)
+
+    def test_on_load_progressive_cancel(self):  # pylint: disable=invalid-name
+        """Test that progressive search stops when the view is closed."""
+        color_searcher = mock()
+        view = mock()
+        color_highlighter = mock()
+        content_listener = ContentListener(color_searcher, view, color_highlighter, False, 1000, False)
+        steps = []
+        when(sublime).set_timeout(ANY, ANY).thenAnswer(lambda callback, delay: steps.append(callback))
+
+        when(view).size().thenReturn(100)
+        when(view).change_count().thenReturn(1)
+        when(view).visible_region().thenReturn(NormalizedRegion(0, 10))
+        when(view).line(0).thenReturn(NormalizedRegion(0, 5))
+        when(view).line(20).thenReturn(NormalizedRegion(18, 25))
+        when(color_searcher).search(view, ANY).thenReturn([])
+        content_listener.on_load()
+        content_listener.on_close()
+        steps.pop()()
+        verify(color_searcher, times=0).search(view, NormalizedRegion(25, 100))
+        self.assertEqual([], steps)
+
+    def test_on_pre_save(self):
+        """Test that the buffer is not searched again on save if it hasn't changed since the last search."""
+        color_searcher = mock()
+        view = mock()
+        color_highlighter = mock()
+        content_listener = ContentListener(color_searcher, view, color_highlighter, False, 0, False)
+
+        when(view).size().thenReturn(100)
+        when(sublime).Region(0, 100).thenReturn(mock())
+        when(view).substr(ANY).thenReturn("test content")
+        when(view).change_count().thenReturn(1)
+        when(color_searcher).search(view, NormalizedRegion(0, 100)).thenReturn([])
+        content_listener.on_load()
+        content_listener.on_pre_save()
+        self.assertEqual(0, content_listener.save_searches)
+        self.assertEqual(1, content_listener.skipped_save_searches)
+        verify(view, times=0).substr(ANY)
+
+        # Changed since the last search, the content hash is not known yet.
+        when(view).change_count().thenReturn(3)
+        content_listener.on_pre_save()
+        self.assertEqual(1, content_listener.save_searches)
+        verify(view, times=1).substr(ANY)
+
+        # Changed and changed back since the last save.
+        when(view).change_count().thenReturn(5)
+        content_listener.on_pre_save()
+        self.assertEqual(1, content_listener.save_searches)
+        self.assertEqual(2, content_listener.skipped_save_searches)
+
+        when(view).change_count().thenReturn(6)
+        when(view).substr(ANY).thenReturn("new content")
+        content_listener.on_pre_save()
+        self.assertEqual(2, content_listener.save_searches)
+        verify(color_highlighter, times=3).highlight_regions(ANY)
+
+    def test_on_text_changed(self):
+        """Test that only lines touched by text changes are rescanned."""
+        color_searcher = mock()
+        view = mock()
+        color_highlighter = mock()
+        content_listener = ContentListener(color_searcher, view, color_highlighter, False, 0, False)
+
+        color_region = (NormalizedRegion(22, 25), 1)
+        dirty_region = mock()
+        line = NormalizedRegion(20, 30)
+        when(view).size().thenReturn(100)
+        when(sublime).Region(23, 27).thenReturn(dirty_region)
+        when(view).lines(dirty_region).thenReturn([line])
+        when(color_searcher).search(view, line).thenReturn([color_region + (None,)])
+        content_listener.on_text_changed([TextChange(24, 24, 2)])
+        color_regions = captor()
+        lines = captor()
+        verify(color_highlighter).highlight_regions_in(color_regions, lines)
+        self.assertEqual([line], list(lines.value))
+        self.assertEqual([color_region], [region for region in color_regions.value])
+
+    def test_on_modified_with_text_changes(self):  # pylint: disable=invalid-name
+        """Test that on_modified doesn't rescan anything if text changes are reported."""
+        color_searcher = mock()
+        view = mock()
+        color_highlighter = mock()
+        content_listener = ContentListener(color_searcher, view, color_highlighter, False, 0, False)
+
+        when(view).size().thenReturn(100)
+        when(sublime).Region(ANY, ANY).thenReturn(mock())
+        when(view).lines(ANY).thenReturn([])
+        content_listener.on_text_changed([TextChange(24, 24, 2)])
+        content_listener.on_modified()
+        verify(view, times=0).sel()
+        verify(color_highlighter, times=1).highlight_regions_in(ANY, ANY)
@@ -0,0 +1,66 @@
+"""Tests for event_scheduler.EventScheduler."""
+
+import time
+import unittest
+
+from ColorHighlighter import sublime  # pylint: disable=no-name-in-module
+from ColorHighlighter.event_scheduler import EventScheduler  # pylint: disable=no-name-in-module,import-error
+
+from mockito import ANY, unstub, when
+
+
+class EventSchedulerTest(unittest.TestCase):
+    """Tests for EventScheduler."""
+
+    def setUp(self):
+        """Collect scheduled timers instead of running them."""
+        self.timers = []
+        when(sublime).set_timeout(ANY, ANY).thenAnswer(lambda callback, delay: self.timers.append((callback, delay)))
+        self.now = 100.0
+        when(time).time().thenAnswer(lambda: self.now)
+
+    def tearDown(self):
+        """Restore the time module."""
+        unstub(time)
+
+    def test_immediate(self):
+        """Test that events are handled right away without a debounce interval."""
+        calls = []
+        scheduler = EventScheduler(0, 0, False)
+        scheduler.schedule(1, "on_modified", calls.append)
+        self.assertEqual([["on_modified"]], calls)
+        self.assertEqual([], self.timers)
+
+    def test_coalesce(self):
+        """Test that a burst of events is handled in one pass."""
+        calls = []
+        scheduler = EventScheduler(50, 200, False)
+        scheduler.schedule(1, "on_modified", calls.append)
+        scheduler.schedule(1, "on_selection_modified", calls.append)
+        scheduler.schedule(1, "on_modified", calls.append)
+        self.assertEqual([50, 50, 50], [delay for (_, delay) in self.timers])
+        for (callback, _) in self.timers:
+            callback()
+        self.assertEqual([["on_modified", "on_selection_modified"]], calls)
+        self.assertEqual(2, scheduler.coalesced_events)
+
+    def test_keys(self):
+        """Test that events for different keys are not merged."""
+        calls = []
+        scheduler = EventScheduler(50, 200, False)
+        scheduler.schedule(1, "on_modified", lambda events: calls.append((1, events)))
+        scheduler.schedule(2, "on_modified", lambda events: calls.append((2, events)))
+        for (callback, _) in self.timers:
+            callback()
+        self.assertEqual([(1, ["on_modified"]), (2, ["on_modified"])], calls)
+        self.assertEqual(0, scheduler.coalesced_events)
+
+    def test_max_latency(self):
+        """Test that a long burst of events is not delayed for longer than the max latency."""
+        scheduler = EventScheduler(50, 200, False)
+        scheduler.schedule(1, "on_modified", lambda events: None)
+        self.now += 0.17
+        scheduler.schedule(1, "on_modified", lambda events: None)
+        self.now += 0.03
+        scheduler.schedule(1, "on_modified", lambda events: None)
+        self.assertEqual([50, 30, 0], [delay for (_, delay) in self.timers])
@@ -4,10 +4,10 @@ import unittest
 
 from ColorHighlighter import sublime  # pylint: disable=no-name-in-module
 from ColorHighlighter.gutter_icons_color_highlighter import (  # pylint: disable=no-name-in-module,import-error
-    GutterIconsColorHighlighter)
+    GutterIconsColorHighlighter, IconFactory)
 from ColorHighlighter.regions import NormalizedRegion  # pylint: disable=no-name-in-module,import-error
 
-from mockito import mock, verify, when
+from mockito import ANY, mock, verify, when
 
 
 class GutterIconsColorHighlighterTest(unittest.TestCase):
@@ -20,7 +20,7 @@ class GutterIconsColorHighlighterTest(unittest.TestCase):
         view = mock()
         icon_factory = mock()
         test_style = "circle"
-        color_highlighter = GutterIconsColorHighlighter(view, test_style, icon_factory, self.test_name, False)
+        color_highlighter = GutterIconsColorHighlighter(view, test_style, icon_factory, self.test_name, False, False)
 
         test_color = "test"
         begin = 4
@@ -30,21 +30,107 @@ class GutterIconsColorHighlighterTest(unittest.TestCase):
         when(sublime).Region(begin, end).thenReturn(region)
 
         test_path = "test/path"
-        when(icon_factory).get_icon_path(test_style, test_color).thenReturn(test_path)
+        when(icon_factory).request_icon_path(test_style, test_color, ANY).thenReturn(test_path)
 
         color_highlighter.highlight_region(None, (normalized_region, test_color))
         verify(view).add_regions(
-            GutterIconsColorHighlighter.region_name_template %
-            (self.test_name, normalized_region.a, normalized_region.b),
+            GutterIconsColorHighlighter.region_name_template % (self.test_name, 0),
             [region], GutterIconsColorHighlighter.region_scope, test_path, sublime.HIDDEN)
 
     def test_unhighlight(self):  # pylint: disable=no-self-use
         """Check unhighlighting a region."""
         view = mock()
-        color_highlighter = GutterIconsColorHighlighter(view, "circle", mock(), self.test_name, False)
+        color_highlighter = GutterIconsColorHighlighter(view, "circle", mock(), self.test_name, False, False)
         normalized_region = NormalizedRegion(4, 9)
+        when(sublime).Region(normalized_region.a, normalized_region.b).thenReturn(mock())
 
+        color_highlighter.highlight_region(None, (normalized_region, "test"))
         color_highlighter.unhighlight_region(None, (normalized_region, None))
-        verify(view).erase_regions(
-            GutterIconsColorHighlighter.region_name_template %
-            (self.test_name, normalized_region.a, normalized_region.b))
+        verify(view).erase_regions(GutterIconsColorHighlighter.region_name_template % (self.test_name, 0))
+
+    def test_highlight_grouped(self):  # pylint: disable=no-self-use
+        """Check highlighting regions with the same color with one region key and one icon lookup."""
+        view = mock()
+        icon_factory = mock()
+        test_style = "circle"
+        color_highlighter = GutterIconsColorHighlighter(view, test_style, icon_factory, self.test_name, True, False)
+
+        test_color = "#test"
+        region1 = mock()
+        when(sublime).Region(4, 8).thenReturn(region1)
+        region2 = mock()
+        when(sublime).Region(14, 18).thenReturn(region2)
+        test_path = "test/path"
+        when(icon_factory).request_icon_path(test_style, test_color, ANY).thenReturn(test_path)
+
+        context = {}
+        color_highlighter.highlight_region(context, (NormalizedRegion(14, 18), test_color))
+        color_highlighter.highlight_region(context, (NormalizedRegion(4, 8), test_color))
+        color_highlighter.highlight_regions_done(context)
+        region_key = GutterIconsColorHighlighter.group_region_name_template % (self.test_name, "test")
+        verify(icon_factory, times=1).request_icon_path(test_style, test_color, ANY)
+        verify(view).add_regions(
+            region_key, [region1, region2], GutterIconsColorHighlighter.region_scope, test_path, sublime.HIDDEN)
+
+        context = {}
+        color_highlighter.unhighlight_region(context, (NormalizedRegion(14, 18), test_color))
+        color_highlighter.unhighlight_region(context, (NormalizedRegion(4, 8), test_color))
+        color_highlighter.highlight_regions_done(context)
+        verify(view).erase_regions(region_key)
+        verify(view, times=1).add_regions(ANY, ANY, ANY, ANY, ANY)
+
+    def test_highlight_placeholder(self):
+        """Check regions are highlighted with the placeholder icon until the icon is created."""
+        view = mock()
+        icon_factory = mock()
+        test_style = "circle"
+        color_highlighter = GutterIconsColorHighlighter(view, test_style, icon_factory, self.test_name, False, False)
+
+        test_color = "#test"
+        region = mock()
+        when(sublime).Region(4, 9).thenReturn(region)
+        callbacks = []
+        when(icon_factory).request_icon_path(test_style, test_color, ANY).thenAnswer(
+            lambda style, color, callback: callbacks.append(callback) or IconFactory.placeholder_icon_path)
+
+        color_highlighter.highlight_region(None, (NormalizedRegion(4, 9), test_color))
+        region_key = GutterIconsColorHighlighter.region_name_template % (self.test_name, 0)
+        verify(view).add_regions(
+            region_key, [region], GutterIconsColorHighlighter.region_scope, IconFactory.placeholder_icon_path,
+            sublime.HIDDEN)
+
+        test_path = "test/path"
+        self.assertEqual(1, len(callbacks))
+        callbacks[0](test_path)
+        verify(view).add_regions(
+            region_key, [region], GutterIconsColorHighlighter.region_scope, test_path, sublime.HIDDEN)
+
+    def test_highlight_placeholder_one_request_per_color(self):  # pylint: disable=invalid-name
+        """Check that regions with the same color wait for the icon with one callback."""
+        view = mock()
+        icon_factory = mock()
+        test_style = "circle"
+        color_highlighter = GutterIconsColorHighlighter(view, test_style, icon_factory, self.test_name, False, False)
+
+        test_color = "#test"
+        regions = []
+        for index in range(3):
+            region = mock()
+            when(sublime).Region(index * 10, index * 10 + 5).thenReturn(region)
+            regions.append(region)
+        callbacks = []
+        when(icon_factory).request_icon_path(test_style, test_color, ANY).thenAnswer(
+            lambda style, color, callback: callbacks.append(callback) or IconFactory.placeholder_icon_path)
+
+        for index in range(3):
+            color_highlighter.highlight_region(None, (NormalizedRegion(index * 10, index * 10 + 5), test_color))
+        color_highlighter.unhighlight_region(None, (NormalizedRegion(10, 15), test_color))
+        self.assertEqual(1, len(callbacks))
+
+        test_path = "test/path"
+        callbacks[0](test_path)
+        for index in [0, 2]:
+            verify(view).add_regions(
+                GutterIconsColorHighlighter.region_name_template % (self.test_name, index), [regions[index]],
+                GutterIconsColorHighlighter.region_scope, test_path, sublime.HIDDEN)
+        verify(view, times=0).add_regions(ANY, [regions[1]], ANY, test_path, ANY)
@@ -4,12 +4,13 @@ import os
 import subprocess
 import unittest
 
+from ColorHighlighter import gutter_icons_color_highlighter, sublime  # pylint: disable=no-name-in-module,import-error
 from ColorHighlighter.gutter_icons_color_highlighter import (  # pylint: disable=no-name-in-module,import-error
     IconFactory)
 from ColorHighlighter.settings import (  # pylint: disable=no-name-in-module,import-error
     GutterIconsColorHighlighterSettings)
 
-from mockito import mock, verify, when
+from mockito import ANY, mock, verify, when
 
 
 class IconFactoryTest(unittest.TestCase):
@@ -21,7 +22,7 @@ class IconFactoryTest(unittest.TestCase):
         sublime_icons_path = "test/sublime/icons/path"
         convert = "test/convert"
         timeout = 50
-        icon_factory = IconFactory(icons_path, sublime_icons_path, convert, timeout, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", convert, timeout, False)
         style = "circle"
         color = "#ffffffff"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -41,7 +42,7 @@ class IconFactoryTest(unittest.TestCase):
         sublime_icons_path = "test/sublime/icons/path"
         convert = "test/convert"
         timeout = 50
-        icon_factory = IconFactory(icons_path, sublime_icons_path, convert, timeout, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", convert, timeout, False)
         style = "circle"
         color = "#ffffffff"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -61,7 +62,7 @@ class IconFactoryTest(unittest.TestCase):
         sublime_icons_path = "test/sublime/icons/path"
         convert = "test/convert"
         timeout = 50
-        icon_factory = IconFactory(icons_path, sublime_icons_path, convert, timeout, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", convert, timeout, False)
         style = "circle"
         color = "#ffffffff"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -84,7 +85,7 @@ class IconFactoryTest(unittest.TestCase):
         sublime_icons_path = "test/sublime/icons/path"
         convert = "test/convert"
         timeout = 50
-        icon_factory = IconFactory(icons_path, sublime_icons_path, convert, timeout, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", convert, timeout, False)
         style = "circle"
         color = "#ffffffff"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -110,7 +111,7 @@ class IconFactoryTest(unittest.TestCase):
     def test_invalid_style(self):
         """Invalid icon style yields none."""
         sublime_icons_path = "test/sublime/icons/path"
-        icon_factory = IconFactory("test/icons/path", sublime_icons_path, "", 50, False)
+        icon_factory = IconFactory("test/icons/path", sublime_icons_path, "convert", "", 50, False)
         color = "#color"
         with self.assertRaises(AssertionError):
             icon_factory.get_icon_path("invalid-style", color)
@@ -119,7 +120,7 @@ class IconFactoryTest(unittest.TestCase):
         """Test icon exists."""
         icons_path = "test/icons/path"
         sublime_icons_path = "test/sublime/icons/path"
-        icon_factory = IconFactory(icons_path, sublime_icons_path, "test/convert", 50, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", "test/convert", 50, False)
         style = "circle"
         color = "#color"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -130,7 +131,7 @@ class IconFactoryTest(unittest.TestCase):
         """Test icon path in cache."""
         icons_path = "test/icons/path"
         sublime_icons_path = "test/sublime/icons/path"
-        icon_factory = IconFactory(icons_path, sublime_icons_path, "test/convert", 50, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", "test/convert", 50, False)
         style = "circle"
         color = "#color"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -146,7 +147,7 @@ class IconFactoryTest(unittest.TestCase):
         sublime_icons_path = "test/sublime/icons/path"
         convert = "test/convert"
         timeout = 50
-        icon_factory = IconFactory(icons_path, sublime_icons_path, convert, timeout, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", convert, timeout, False)
         style = "circle"
         color = "#color"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -166,7 +167,7 @@ class IconFactoryTest(unittest.TestCase):
         sublime_icons_path = "test/sublime/icons/path"
         convert = "test/convert"
         timeout = 50
-        icon_factory = IconFactory(icons_path, sublime_icons_path, convert, timeout, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", convert, timeout, False)
         style = "circle"
         color = "#color"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -187,7 +188,7 @@ class IconFactoryTest(unittest.TestCase):
         sublime_icons_path = "test/sublime/icons/path"
         convert = "test/convert"
         timeout = 50
-        icon_factory = IconFactory(icons_path, sublime_icons_path, convert, timeout, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", convert, timeout, False)
         style = "circle"
         color = "#color"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -211,7 +212,7 @@ class IconFactoryTest(unittest.TestCase):
         sublime_icons_path = "test/sublime/icons/path"
         convert = "test/convert"
         timeout = 50
-        icon_factory = IconFactory(icons_path, sublime_icons_path, convert, timeout, False)
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", convert, timeout, False)
         style = "circle"
         color = "#color"
         icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
@@ -227,3 +228,81 @@ class IconFactoryTest(unittest.TestCase):
         self.assertEqual(os.path.join(sublime_icons_path, icon_name), icon_factory.get_icon_path(style, color))
         verify(process).kill()
         verify(process).communicate()
+
+    def test_builtin_renderer(self):
+        """Test create icon with the builtin renderer."""
+        icons_path = "test/icons/path"
+        sublime_icons_path = "test/sublime/icons/path"
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "builtin", "test/convert", 50, False)
+        style = "square"
+        color = "#color"
+        icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
+        icon_path = os.path.join(icons_path, icon_name)
+        when(os.path).exists(icon_path).thenReturn(False).thenReturn(True)
+        when(gutter_icons_color_highlighter).write_icon(style, color, icon_path).thenReturn(None)
+        self.assertEqual(os.path.join(sublime_icons_path, icon_name), icon_factory.get_icon_path(style, color))
+        verify(gutter_icons_color_highlighter).write_icon(style, color, icon_path)
+
+    def test_builtin_renderer_fail(self):
+        """Test create icon with the builtin renderer failed."""
+        icons_path = "test/icons/path"
+        sublime_icons_path = "test/sublime/icons/path"
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "builtin", "test/convert", 50, False)
+        style = "square"
+        color = "#color"
+        icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
+        icon_path = os.path.join(icons_path, icon_name)
+        when(os.path).exists(icon_path).thenReturn(False)
+        when(gutter_icons_color_highlighter).write_icon(style, color, icon_path).thenRaise(IOError("error"))
+        bad_icon_name = IconFactory._bad_icon_name  # pylint: disable=protected-access
+        self.assertEqual(os.path.join(sublime_icons_path, bad_icon_name), icon_factory.get_icon_path(style, color))
+
+    def test_request_icon(self):
+        """Test requesting an icon creates it in background once and calls all callbacks."""
+        icons_path = "test/icons/path"
+        sublime_icons_path = "test/sublime/icons/path"
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "builtin", "test/convert", 50, False)
+        style = "circle"
+        color = "#color"
+        icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
+        icon_path = os.path.join(icons_path, icon_name)
+        when(os.path).exists(icon_path).thenReturn(False).thenReturn(False).thenReturn(False).thenReturn(True)
+        when(gutter_icons_color_highlighter).write_icon(style, color, icon_path).thenReturn(None)
+        tasks = []
+        when(icon_factory)._run_in_background(ANY).thenAnswer(tasks.append)
+        when(sublime).set_timeout(ANY, 0).thenAnswer(lambda callback, delay: callback())
+
+        results = []
+        self.assertEqual(
+            IconFactory.placeholder_icon_path, icon_factory.request_icon_path(style, color, results.append))
+        self.assertEqual(
+            IconFactory.placeholder_icon_path, icon_factory.request_icon_path(style, color, results.append))
+        self.assertEqual(1, len(tasks))
+        tasks[0]()
+        sublime_icon_path = os.path.join(sublime_icons_path, icon_name)
+        self.assertEqual([sublime_icon_path, sublime_icon_path], results)
+        self.assertEqual(sublime_icon_path, icon_factory.request_icon_path(style, color, results.append))
+        verify(gutter_icons_color_highlighter, times=1).write_icon(style, color, icon_path)
+
+    def test_request_icon_failed(self):
+        """Test that a failed background icon creation doesn't block later requests for the icon."""
+        icons_path = "test/icons/path"
+        sublime_icons_path = "test/sublime/icons/path"
+        icon_factory = IconFactory(icons_path, sublime_icons_path, "convert", "test/convert", 50, False)
+        style = "circle"
+        color = "#failed"
+        icon_name = IconFactory._icon_name_template % (style, color[1:])  # pylint: disable=protected-access
+        when(os.path).exists(os.path.join(icons_path, icon_name)).thenReturn(False)
+        when(icon_factory)._create_icon(ANY, ANY, ANY).thenRaise(OSError("no convert"))
+        tasks = []
+        when(icon_factory)._run_in_background(ANY).thenAnswer(tasks.append)
+        when(sublime).set_timeout(ANY, 0).thenAnswer(lambda callback, delay: callback())
+
+        results = []
+        icon_factory.request_icon_path(style, color, results.append)
+        with self.assertRaises(OSError):
+            tasks[0]()
+        bad_icon_name = IconFactory._bad_icon_name  # pylint: disable=protected-access
+        self.assertEqual([os.path.join(sublime_icons_path, bad_icon_name)], results)
+        icon_factory.request_icon_path(style, color, results.append)
+        self.assertEqual(2, len(tasks))
@@ -0,0 +1,58 @@
+"""Tests for the builtin icon renderer."""
+
+import struct
+import unittest
+import zlib
+
+from ColorHighlighter.icon_renderer import ICON_SIZE, render_icon  # pylint: disable=no-name-in-module,import-error
+
+
+def _decode_png(content):
+    assert content[:8] == b"\x89PNG\r\n\x1a\n"
+    offset = 8
+    chunks = {}
+    while offset < len(content):
+        length, = struct.unpack(">I", content[offset:offset + 4])
+        chunk_type = content[offset + 4:offset + 8]
+        data = content[offset + 8:offset + 8 + length]
+        checksum, = struct.unpack(">I", content[offset + 8 + length:offset + 12 + length])
+        assert checksum == zlib.crc32(chunk_type + data) & 0xffffffff
+        chunks[chunk_type] = chunks.get(chunk_type, b"") + data
+        offset += 12 + length
+    width, height, depth, color_type, _, _, _ = struct.unpack(">IIBBBBB", chunks[b"IHDR"])
+    raw_data = zlib.decompress(chunks[b"IDAT"])
+    row_length = 1 + width * 4
+    pixels = []
+    for y in range(height):  # pylint: disable=invalid-name
+        row = raw_data[y * row_length:(y + 1) * row_length]
+        assert row[0:1] == b"\x00"
+        pixels.append([struct.unpack("BBBB", row[1 + x * 4:5 + x * 4]) for x in range(width)])
+    return (width, height, depth, color_type, pixels)
+
+
+class IconRendererTest(unittest.TestCase):
+    """Tests for the builtin icon renderer."""
+
+    def test_header(self):
+        """Test icons are 32x32 8-bit RGBA PNG images."""
+        width, height, depth, color_type, _ = _decode_png(render_icon("circle", "#ff000080"))
+        self.assertEqual((ICON_SIZE, ICON_SIZE, 8, 6), (width, height, depth, color_type))
+
+    def test_circle(self):
+        """Test circle icon pixels."""
+        pixels = _decode_png(render_icon("circle", "#11223344"))[4]
+        self.assertEqual((0x11, 0x22, 0x33, 0x44), pixels[16][15])
+        self.assertEqual((0, 0, 0, 0), pixels[0][0])
+        self.assertEqual((0, 0, 0, 0), pixels[16][4])
+        self.assertEqual((0, 0, 0, 0), pixels[16][26])
+        edge = pixels[16][24]
+        self.assertEqual((0x11, 0x22, 0x33), edge[:3])
+        self.assertTrue(0 < edge[3] < 0x44)
+
+    def test_square(self):
+        """Test square icon pixels."""
+        pixels = _decode_png(render_icon("square", "#abcdefff"))[4]
+        self.assertEqual((0xab, 0xcd, 0xef, 0xff), pixels[4][4])
+        self.assertEqual((0xab, 0xcd, 0xef, 0xff), pixels[24][24])
+        self.assertEqual((0, 0, 0, 0), pixels[3][4])
+        self.assertEqual((0, 0, 0, 0), pixels[25][24])
@@ -0,0 +1,148 @@
+"""Tests for main module."""
+
+import json
+import os
+import sys
+import unittest
+
+from ColorHighlighter import sublime, sublime_plugin  # pylint: disable=no-name-in-module
+from ColorHighlighter import st_helper  # noqa: F401  # pylint: disable=no-name-in-module,unused-import
+from ColorHighlighter.content_listener import ContentListener  # pylint: disable=no-name-in-module,import-error
+from ColorHighlighter.regions import NormalizedRegion  # pylint: disable=no-name-in-module,import-error
+
+from mockito import ANY, mock, unstub, verify, when
+
+
+def _import_main():
+    # main imports the ST modules as top level modules, unlike the rest of the plugin. They are only registered while
+    # main is imported, so that st_helper, which is imported above, still detects running in tests.
+    sys.modules["sublime"] = sublime
+    sys.modules["sublime_plugin"] = sublime_plugin
+    try:
+        from ColorHighlighter import main  # pylint: disable=no-name-in-module
+    finally:
+        del sys.modules["sublime"]
+        del sys.modules["sublime_plugin"]
+    return main
+
+
+def _default_settings():
+    settings_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ColorHighlighter.sublime-settings")
+    with open(settings_path) as settings_file:
+        settings = json.load(settings_file)
+    for color_searcher in settings["search_colors_in"].values():
+        color_searcher["color_highlighters"]["gutter_icons"]["enabled"] = False
+    return settings
+
+
+class ColorHighlighterComponentsTest(unittest.TestCase):
+    """Tests for ColorHighlighterComponents."""
+
+    def tearDown(self):
+        """Restore the sublime module."""
+        unstub(sublime)
+
+    def test_buffer_color_searcher(self):
+        """Test that the buffer color searcher finds colors with the configured formats."""
+        main = _import_main()
+        when(sublime).load_settings(ANY).thenReturn(_default_settings())
+        components = main.ColorHighlighterComponents()
+        view = mock()
+        when(view).id().thenReturn(1)
+        when(view).buffer_id().thenReturn(2)
+        when(view).change_count().thenReturn(1)
+        whole_region = mock()
+        when(sublime).Region(0, 30).thenReturn(whole_region)
+        when(view).substr(whole_region).thenReturn("a { color: #FF0000; }")
+
+        color_searcher = components.provide_buffer_color_searcher(view)
+        self.assertEqual(
+            [(NormalizedRegion(11, 18), "#ff0000ff", "sharp6")],
+            list(color_searcher.search(view, NormalizedRegion(0, 30))))
+        self.assertIs(color_searcher, components.provide_buffer_color_searcher(view))
+
+    def test_color_scheme_override_fallback(self):  # pylint: disable=invalid-name
+        """Test that a fake color scheme is used, if the color scheme can't be overridden."""
+        main = _import_main()
+        settings = _default_settings()
+        settings["experimental"]["use_color_scheme_overrides"] = True
+        when(sublime).load_settings(ANY).thenReturn(settings)
+        fake_color_scheme_data = ("Packages/User/ColorHighlighter/themes/Scheme.tmTheme", mock(), mock())
+        when(main).parse_color_scheme_override(ANY, ANY).thenReturn(None)
+        when(main).parse_color_scheme(ANY, ANY).thenReturn(fake_color_scheme_data)
+        components = main.ColorHighlighterComponents()
+        self.assertEqual(fake_color_scheme_data, components.provide_fake_color_scheme_data())
+        unstub(main)
+
+
+class ColorSelectionTest(unittest.TestCase):
+    """Tests for ColorSelection."""
+
+    def tearDown(self):
+        """Restore the sublime module."""
+        unstub(sublime)
+
+    def test_clear_all_cancels_search(self):
+        """Test that searches that are still pending when highlightings are cleared don't highlight colors."""
+        main = _import_main()
+        steps = []
+        when(sublime).set_timeout(ANY, ANY).thenAnswer(lambda callback, delay: steps.append(callback))
+        view = mock()
+        when(view).size().thenReturn(100)
+        when(view).change_count().thenReturn(1)
+        when(view).visible_region().thenReturn(NormalizedRegion(0, 10))
+        when(view).line(0).thenReturn(NormalizedRegion(0, 5))
+        when(view).line(20).thenReturn(NormalizedRegion(18, 25))
+        color_searcher = mock()
+        when(color_searcher).search(view, ANY).thenReturn([])
+        content_color_highlighter = mock()
+        content_listener = ContentListener(color_searcher, view, content_color_highlighter, False, 1000, False)
+        color_selection = main.ColorSelection(
+            mock(), content_color_highlighter, mock(), mock(), content_listener, mock())
+
+        color_selection.on_load()
+        verify(content_color_highlighter, times=1).highlight_regions_in(ANY, ANY)
+        color_selection.clear_all()
+        self.assertEqual(1, len(steps))
+        steps.pop()()
+        verify(content_color_highlighter, times=1).highlight_regions_in(ANY, ANY)
+        verify(color_searcher, times=0).search(view, NormalizedRegion(25, 100))
+
+
+class ColorSelectionEventListenerTest(unittest.TestCase):
+    """Tests for ColorSelectionEventListener."""
+
+    def tearDown(self):
+        """Restore the sublime and main modules."""
+        main = _import_main()
+        main.ColorHighlighterPlugin.components = None
+        unstub(main)
+        unstub(sublime)
+
+    def test_sweep_closed_views(self):
+        """Test that only closed views are evicted and views outside of windows, like panels, are kept."""
+        main = _import_main()
+        when(sublime).set_timeout(ANY, ANY)
+        when(main)._color_scheme_color_highlighter_enabled(ANY).thenReturn(False)
+        components = mock()
+        main.ColorHighlighterPlugin.components = components
+        panel = mock()
+        when(panel).id().thenReturn(1)
+        when(panel).is_valid().thenReturn(True)
+        closed_view = mock()
+        when(closed_view).id().thenReturn(2)
+        when(closed_view).is_valid().thenReturn(False)
+        panel_selection = mock()
+        closed_view_selection = mock()
+        when(components).provide_color_selection(panel).thenReturn(panel_selection)
+        when(components).provide_color_selection(closed_view).thenReturn(closed_view_selection)
+        event_listener = main.ColorSelectionEventListener(["all"], mock(), False, False)
+        event_listener.start()
+        event_listener.on_load(panel)
+        event_listener.on_load(closed_view)
+
+        event_listener._sweep_closed_views()  # pylint: disable=protected-access
+        self.assertEqual(1, event_listener.live_views_count())
+        verify(closed_view_selection).clear_all()
+        verify(panel_selection, times=0).clear_all()
+        verify(components).forget_view(2)
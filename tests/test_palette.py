@@ -0,0 +1,101 @@
+"""Tests for palette module."""
+
+import random
+import unittest
+
+from ColorHighlighter.palette import (  # pylint: disable=no-name-in-module,import-error
+    KdTree, Palette, color_to_lab)
+
+
+class PaletteTest(unittest.TestCase):
+    """Tests for Palette."""
+
+    def test_add_colors(self):
+        """Test that distinct colors are kept until the palette is full."""
+        palette = Palette(2)
+        self.assertEqual("#FF0000FF", palette.quantize("#FF0000FF"))
+        self.assertEqual("#FE0000FF", palette.quantize("#FE0000FF"))
+        self.assertEqual("#FF0000FF", palette.quantize("#FF0000FF"))
+
+    def test_snap_when_full(self):
+        """Test that colors are snapped to the nearest palette color when the palette is full."""
+        palette = Palette(2)
+        palette.quantize("#FF0000FF")
+        palette.quantize("#0000FFFF")
+        self.assertEqual("#FF0000FF", palette.quantize("#EE1100FF"))
+        self.assertEqual("#0000FFFF", palette.quantize("#1100EEFF"))
+        self.assertEqual("#FF0000FF", palette.quantize("#FFFFFFFF"))
+
+    def test_stable(self):
+        """Test that a color is always snapped to the same palette color, even after the cache is dropped."""
+        palette = Palette(256)
+        rand = random.Random(42)
+        colors = ["#%06XFF" % rand.randint(0, 0xFFFFFF) for _ in range(1000)]
+        quantized_colors = [palette.quantize(color) for color in colors]
+        for value in range(Palette._max_quantized_colors):  # pylint: disable=protected-access
+            palette.quantize("#%06X80" % value)
+        self.assertEqual(quantized_colors, [palette.quantize(color) for color in colors])
+        self.assertEqual(256, len(set(quantized_colors)))
+
+    def test_bounded_memo(self):
+        """Test that the number of remembered quantized colors is bounded."""
+        palette = Palette(1)
+        for value in range(Palette._max_quantized_colors + 10):  # pylint: disable=protected-access
+            palette.quantize("#%06XFF" % value)
+        self.assertLessEqual(
+            len(palette._quantized_colors), Palette._max_quantized_colors)  # pylint: disable=protected-access
+
+    def test_alpha(self):
+        """Test that colors with different alpha are snapped to the palette color with the nearest alpha."""
+        palette = Palette(2)
+        self.assertEqual("#FF0000FF", palette.quantize("#FF0000FF"))
+        self.assertEqual("#FF000080", palette.quantize("#FF000080"))
+        self.assertEqual("#FF000080", palette.quantize("#FF000070"))
+
+
+class KdTreeTest(unittest.TestCase):
+    """Tests for KdTree."""
+
+    def test_empty(self):
+        """Test that there is no nearest point in an empty tree."""
+        self.assertIsNone(KdTree().nearest((0, 0)))
+
+    def test_nearest(self):
+        """Test that the nearest point is the same as found by a linear search."""
+        rand = random.Random(42)
+        points = [(rand.uniform(0, 100), rand.uniform(-100, 100), rand.uniform(-100, 100)) for _ in range(200)]
+        tree = KdTree()
+        for index, point in enumerate(points):
+            tree.add(point, index)
+        self.assertEqual(len(points), len(tree))
+        for _ in range(100):
+            query = (rand.uniform(0, 100), rand.uniform(-100, 100), rand.uniform(-100, 100))
+            expected = min(range(len(points)), key=lambda index: _distance(query, points[index]))
+            (point, value, distance) = tree.nearest(query)
+            self.assertEqual(expected, value)
+            self.assertEqual(points[expected], point)
+            self.assertAlmostEqual(_distance(query, points[expected]), distance)
+
+
+class ColorToLabTest(unittest.TestCase):
+    """Tests for color_to_lab."""
+
+    def test_white(self):
+        """Test converting white."""
+        lab = color_to_lab("#FFFFFFFF")
+        self.assertAlmostEqual(100, lab[0], places=2)
+        self.assertAlmostEqual(0, lab[1], places=2)
+        self.assertAlmostEqual(0, lab[2], places=2)
+        self.assertAlmostEqual(100, lab[3], places=2)
+
+    def test_red(self):
+        """Test converting red."""
+        lab = color_to_lab("#FF000000")
+        self.assertAlmostEqual(53.24, lab[0], places=1)
+        self.assertAlmostEqual(80.09, lab[1], places=1)
+        self.assertAlmostEqual(67.20, lab[2], places=1)
+        self.assertAlmostEqual(0, lab[3], places=2)
+
+
+def _distance(point1, point2):
+    return sum([(coordinate1 - coordinate2) ** 2 for (coordinate1, coordinate2) in zip(point1, point2)]) ** 0.5
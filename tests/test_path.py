@@ -269,3 +269,31 @@ class FakeColorSchemeTest(unittest.TestCase):
             path.fake_color_scheme_path("Color/" + scheme, path.RELATIVE))
         unstub(sublime)
         unstub(os.path)
+
+
+class ColorSchemeOverrideTest(unittest.TestCase):
+    """Tests for color_scheme_override_path."""
+
+    def test_path(self):
+        """Test get a color scheme override path for a color scheme."""
+        test_path = "/a/b/Packages"
+        when(sublime).packages_path().thenReturn(test_path)
+        self.assertEqual(
+            test_path + "/User/Scheme.sublime-color-scheme",
+            path.color_scheme_override_path("Packages/Color/Scheme.tmTheme", path.ABSOLUTE))
+        unstub(sublime)
+
+
+class ColorSchemeRulesTest(unittest.TestCase):
+    """Tests for color_scheme_rules_path."""
+
+    def test_path(self):
+        """Test get a color highlighter rules path for a color scheme."""
+        test_path = "/a/b/Packages"
+        when(sublime).packages_path().thenReturn(test_path)
+        when(path).plugin_name().thenReturn("ColorHighlighter")
+        self.assertEqual(
+            test_path + "/User/ColorHighlighter/themes/Scheme.sublime-color-scheme",
+            path.color_scheme_rules_path("Packages/Color/Scheme.tmTheme", path.ABSOLUTE))
+        unstub(path)
+        unstub(sublime)
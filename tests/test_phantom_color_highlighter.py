@@ -37,14 +37,14 @@ class PhantomColorHighlighterTest(unittest.TestCase):
 '''
         phantom_id = 95
         when(view).add_phantom(
-            PhantomColorHighlighter.phantom_key_template %
-            (self.test_name, begin, end), region, html, sublime.LAYOUT_BELOW, None).thenReturn(phantom_id)
+            PhantomColorHighlighter.phantom_key_template % (self.test_name, 0), region, html, sublime.LAYOUT_BELOW,
+            None).thenReturn(phantom_id)
 
-        PhantomColorHighlighter(view, self.test_name, "below", 10, False).highlight_region(
+        PhantomColorHighlighter(view, self.test_name, "below", 10, False, False).highlight_region(
             None, (NormalizedRegion(begin, end), test_color))
         verify(view).add_phantom(
-            PhantomColorHighlighter.phantom_key_template %
-            (self.test_name, begin, end), region, html, sublime.LAYOUT_BELOW, None)
+            PhantomColorHighlighter.phantom_key_template % (self.test_name, 0), region, html, sublime.LAYOUT_BELOW,
+            None)
 
     def test_highlight_right(self):  # pylint: disable=no-self-use
         """Test highlighting a region adds a phantom to the right of the color to the view."""
@@ -68,14 +68,14 @@ class PhantomColorHighlighterTest(unittest.TestCase):
 '''
         phantom_id = 95
         when(view).add_phantom(
-            PhantomColorHighlighter.phantom_key_template %
-            (self.test_name, begin, end), region, html, sublime.LAYOUT_INLINE, None).thenReturn(phantom_id)
+            PhantomColorHighlighter.phantom_key_template % (self.test_name, 0), region, html, sublime.LAYOUT_INLINE,
+            None).thenReturn(phantom_id)
 
-        PhantomColorHighlighter(view, self.test_name, "right", 5, False).highlight_region(
+        PhantomColorHighlighter(view, self.test_name, "right", 5, False, False).highlight_region(
             None, (NormalizedRegion(begin, end), test_color))
         verify(view).add_phantom(
-            PhantomColorHighlighter.phantom_key_template %
-            (self.test_name, begin, end), region, html, sublime.LAYOUT_INLINE, None)
+            PhantomColorHighlighter.phantom_key_template % (self.test_name, 0), region, html, sublime.LAYOUT_INLINE,
+            None)
 
     def test_highlight_left(self):  # pylint: disable=no-self-use
         """Test highlighting a region adds a phantom to the left of the color to the view."""
@@ -99,19 +99,19 @@ class PhantomColorHighlighterTest(unittest.TestCase):
 '''
         phantom_id = 95
         when(view).add_phantom(
-            PhantomColorHighlighter.phantom_key_template %
-            (self.test_name, begin, end), region, html, sublime.LAYOUT_INLINE, None).thenReturn(phantom_id)
+            PhantomColorHighlighter.phantom_key_template % (self.test_name, 0), region, html, sublime.LAYOUT_INLINE,
+            None).thenReturn(phantom_id)
 
-        PhantomColorHighlighter(view, self.test_name, "left", 5, False).highlight_region(
+        PhantomColorHighlighter(view, self.test_name, "left", 5, False, False).highlight_region(
             None, (NormalizedRegion(begin, end), test_color))
         verify(view).add_phantom(
-            PhantomColorHighlighter.phantom_key_template %
-            (self.test_name, begin, end), region, html, sublime.LAYOUT_INLINE, None)
+            PhantomColorHighlighter.phantom_key_template % (self.test_name, 0), region, html, sublime.LAYOUT_INLINE,
+            None)
 
     def test_unhighlight(self):  # pylint: disable=no-self-use
         """Test unhighlighting a region removes the added phantom from the view."""
         view = mock()
-        color_highlighter = PhantomColorHighlighter(view, self.test_name, "below", 1, False)
+        color_highlighter = PhantomColorHighlighter(view, self.test_name, "below", 1, False, False)
 
         begin = 4
         end = 9
@@ -121,5 +121,39 @@ class PhantomColorHighlighterTest(unittest.TestCase):
         phantom_id = 95
         when(view).add_phantom(ANY, ANY, ANY, ANY, ANY).thenReturn(phantom_id)
 
+        color_highlighter.highlight_region(None, (NormalizedRegion(begin, end), "test"))
         color_highlighter.unhighlight_region(None, (NormalizedRegion(begin, end), None))
-        verify(view).erase_phantoms(PhantomColorHighlighter.phantom_key_template % (self.test_name, begin, end))
+        verify(view).erase_phantoms(PhantomColorHighlighter.phantom_key_template % (self.test_name, 0))
+
+    def test_highlight_phantom_set(self):  # pylint: disable=no-self-use
+        """Test highlighting regions with a phantom set updates the phantom set once."""
+        view = mock()
+        phantom_set = mock()
+        when(sublime).PhantomSet(
+            view, PhantomColorHighlighter.phantom_set_key_template % self.test_name).thenReturn(phantom_set)
+        color_highlighter = PhantomColorHighlighter(view, self.test_name, "right", 1, True, False)
+
+        region1 = mock()
+        when(sublime).Region(8, 8).thenReturn(region1)
+        region2 = mock()
+        when(sublime).Region(18, 18).thenReturn(region2)
+        phantom1 = mock()
+        phantom2 = mock()
+        when(sublime).Phantom(region1, ANY, sublime.LAYOUT_INLINE).thenReturn(phantom1)
+        when(sublime).Phantom(region2, ANY, sublime.LAYOUT_INLINE).thenReturn(phantom2)
+
+        context = {}
+        color_highlighter.highlight_region(context, (NormalizedRegion(14, 18), "test"))
+        color_highlighter.highlight_region(context, (NormalizedRegion(4, 8), "test"))
+        color_highlighter.highlight_regions_done(context)
+        verify(phantom_set).update([phantom1, phantom2])
+        verify(view, times=0).add_phantom(ANY, ANY, ANY, ANY, ANY)
+
+        context = {}
+        color_highlighter.unhighlight_region(context, (NormalizedRegion(4, 8), "test"))
+        color_highlighter.highlight_regions_done(context)
+        verify(phantom_set).update([phantom2])
+        verify(view, times=0).erase_phantoms(ANY)
+
+        color_highlighter.highlight_regions_done({})
+        verify(phantom_set, times=2).update(ANY)
@@ -1,9 +1,12 @@
 """Tests for regions.NormalizedRegion."""
 
+import os
+import random
+import timeit
 import unittest
 
 from ColorHighlighter.regions import (  # pylint: disable=no-name-in-module,import-error
-    NormalizedRegion, deduplicate_regions, intersects, intersects_any)
+    NormalizedRegion, RegionIndex, deduplicate_regions, intersects, intersects_any)
 
 
 class IntersectTest(unittest.TestCase):
@@ -46,3 +49,56 @@ class DeduplicateRegionsTest(unittest.TestCase):
         regions = [region1, region2, region1]
         output = [value for value in deduplicate_regions(regions)]
         self.assertEqual([region1, region2], output)
+
+
+class RegionIndexTest(unittest.TestCase):
+    """Tests for RegionIndex."""
+
+    def test_intersecting(self):
+        """Test finding regions that intersect with a region."""
+        index = RegionIndex([NormalizedRegion(1, 3), NormalizedRegion(5, 12), NormalizedRegion(20, 21)])
+        index.add(NormalizedRegion(13, 14))
+        self.assertEqual([NormalizedRegion(5, 12)], list(index.intersecting(NormalizedRegion(3, 6))))
+        self.assertEqual(
+            [NormalizedRegion(5, 12), NormalizedRegion(13, 14)], list(index.intersecting(NormalizedRegion(10, 20))))
+        self.assertEqual([NormalizedRegion(20, 21)], list(index.intersecting(NormalizedRegion(20, 20))))
+
+    def test_remove(self):
+        """Test removed regions are not found."""
+        index = RegionIndex()
+        index.add(NormalizedRegion(1, 3))
+        index.add(NormalizedRegion(2, 4))
+        index.remove(NormalizedRegion(1, 3))
+        index.remove(NormalizedRegion(7, 8))
+        self.assertEqual(1, len(index))
+        self.assertEqual([NormalizedRegion(2, 4)], list(index.intersecting(NormalizedRegion(0, 10))))
+
+
+@unittest.skipUnless(os.environ.get("COLOR_HIGHLIGHTER_BENCHMARKS"), "Set COLOR_HIGHLIGHTER_BENCHMARKS=1 to run.")
+class RegionIndexBenchmark(unittest.TestCase):
+    """
+    Benchmark for finding highlighted regions touched by an edit.
+
+    Run with COLOR_HIGHLIGHTER_BENCHMARKS=1 py.test -s tests/test_regions.py.
+    """
+
+    def test_changed_lines(self):
+        """Compare scanning all regions with intersects_any to RegionIndex lookups for a multi-cursor edit."""
+        # 20k colors, one per 30 characters long line, and 10 cursors, each changing one line.
+        regions = [NormalizedRegion(line * 30 + 10, line * 30 + 17) for line in range(20000)]
+        rand = random.Random(42)
+        changed_lines = [NormalizedRegion(line * 30, line * 30 + 29) for line in rand.sample(range(20000), 10)]
+        index = RegionIndex(regions)
+
+        def scan():
+            return [region for region in regions if intersects_any(region, changed_lines)]
+
+        def lookup():
+            return [region for line in changed_lines for region in index.intersecting(line)]
+
+        self.assertEqual(set(scan()), set(lookup()))
+        scan_time = min(timeit.Timer(scan).repeat(5, 1))
+        lookup_time = min(timeit.Timer(lookup).repeat(5, 100)) / 100
+        print("\nregions=%d changed_lines=%d scan_ms=%.3f index_ms=%.3f" % (
+            len(regions), len(changed_lines), scan_time * 1000, lookup_time * 1000))
+        self.assertLess(lookup_time, scan_time)
@@ -74,7 +74,21 @@ class SettingsTest(unittest.TestCase):
             },
             "default_keybindings": False,
             "file_extensions": [".py", ".css"],
+            "color_scheme_gc": {
+                "enabled": False,
+                "max_unused_sessions": 3,
+                "max_colors": 100,
+            },
+            "color_palette": {
+                "enabled": True,
+                "size": 64,
+            },
+            "event_scheduler": {
+                "debounce_ms": 10,
+                "max_latency_ms": 100,
+            },
             "icon_factory": {
+                "renderer": "convert",
                 "convert_command": "test-convert",
                 "convert_timeout": 10
             },
@@ -97,6 +111,13 @@ class SettingsTest(unittest.TestCase):
             },
             "experimental": {
                 "asynchronosly_update_color_scheme": True,
+                "color_scheme_write_interval_ms": 500,
+                "use_color_scheme_overrides": True,
+                "asynchronously_search_colors": True,
+                "progressive_search_budget_ms": 20,
+                "virtualize_highlightings": True,
+                "group_regions": True,
+                "use_phantom_sets": True,
             },
             "debug": True,
         })
@@ -151,6 +172,14 @@ class SettingsTest(unittest.TestCase):
         self.assertEqual(False, settings.default_keybindings)
         self.assertEqual({".py": True, ".css": True}, settings.file_extensions)
 
+        self.assertEqual(False, settings.color_scheme_gc.enabled)
+        self.assertEqual(3, settings.color_scheme_gc.max_unused_sessions)
+        self.assertEqual(100, settings.color_scheme_gc.max_colors)
+        self.assertEqual(True, settings.color_palette.enabled)
+        self.assertEqual(64, settings.color_palette.size)
+        self.assertEqual(10, settings.event_scheduler.debounce_ms)
+        self.assertEqual(100, settings.event_scheduler.max_latency_ms)
+        self.assertEqual("convert", settings.icon_factory.renderer)
         self.assertEqual("test-convert", settings.icon_factory.convert_command)
         self.assertEqual(10, settings.icon_factory.convert_timeout)
 
@@ -165,6 +194,13 @@ class SettingsTest(unittest.TestCase):
         self.assertEqual(["test-after"], settings.regex_compiler.formats["sharp8"].after)
 
         self.assertEqual(True, settings.experimental.asynchronosly_update_color_scheme)
+        self.assertEqual(500, settings.experimental.color_scheme_write_interval_ms)
+        self.assertEqual(True, settings.experimental.use_color_scheme_overrides)
+        self.assertEqual(True, settings.experimental.asynchronously_search_colors)
+        self.assertEqual(20, settings.experimental.progressive_search_budget_ms)
+        self.assertEqual(True, settings.experimental.virtualize_highlightings)
+        self.assertEqual(True, settings.experimental.group_regions)
+        self.assertEqual(True, settings.experimental.use_phantom_sets)
         self.assertTrue(settings.debug)
 
     def test_create_default(self):
@@ -231,6 +267,14 @@ class SettingsTest(unittest.TestCase):
         self.assertEqual(True, settings.default_keybindings)
         self.assertEqual({}, settings.file_extensions)
 
+        self.assertEqual(True, settings.color_scheme_gc.enabled)
+        self.assertEqual(10, settings.color_scheme_gc.max_unused_sessions)
+        self.assertEqual(1000, settings.color_scheme_gc.max_colors)
+        self.assertEqual(False, settings.color_palette.enabled)
+        self.assertEqual(256, settings.color_palette.size)
+        self.assertEqual(50, settings.event_scheduler.debounce_ms)
+        self.assertEqual(200, settings.event_scheduler.max_latency_ms)
+        self.assertEqual("builtin", settings.icon_factory.renderer)
         self.assertEqual("convert", settings.icon_factory.convert_command)
         self.assertEqual(5, settings.icon_factory.convert_timeout)
 
@@ -245,6 +289,13 @@ class SettingsTest(unittest.TestCase):
         self.assertEqual([], settings.regex_compiler.formats["sharp8"].after)
 
         self.assertEqual(False, settings.experimental.asynchronosly_update_color_scheme)
+        self.assertEqual(250, settings.experimental.color_scheme_write_interval_ms)
+        self.assertEqual(False, settings.experimental.use_color_scheme_overrides)
+        self.assertEqual(False, settings.experimental.asynchronously_search_colors)
+        self.assertEqual(0, settings.experimental.progressive_search_budget_ms)
+        self.assertEqual(False, settings.experimental.virtualize_highlightings)
+        self.assertEqual(False, settings.experimental.group_regions)
+        self.assertEqual(False, settings.experimental.use_phantom_sets)
         self.assertFalse(settings.debug)
 
     def test_create_single_after(self):
@@ -445,6 +496,17 @@ class SettingsTest(unittest.TestCase):
         self.assertFalse(settings.experimental.asynchronosly_update_color_scheme)
         unstub(st_helper)
 
+    def test_use_color_scheme_overrides_st2(self):  # pylint: disable=invalid-name
+        """Test color scheme overrides can't be enabled in ST2."""
+        when(st_helper).is_st3().thenReturn(False)
+        settings = Settings({
+            "experimental": {
+                "use_color_scheme_overrides": True
+            }
+        })
+        self.assertFalse(settings.experimental.use_color_scheme_overrides)
+        unstub(st_helper)
+
     def test_create_enable_phantoms_st2(self):
         """Test phantoms can't be enabled in ST2."""
         when(st_helper).is_st3().thenReturn(False)
@@ -0,0 +1,68 @@
+"""Tests for text_change module."""
+
+import unittest
+
+from ColorHighlighter.regions import NormalizedRegion  # pylint: disable=no-name-in-module,import-error
+from ColorHighlighter.text_change import (  # pylint: disable=no-name-in-module,import-error
+    TextChange, dirty_regions, shift_region)
+
+
+class DirtyRegionsTest(unittest.TestCase):
+    """Tests for dirty_regions."""
+
+    def test_no_changes(self):
+        """Test that no changes give no dirty regions."""
+        self.assertEqual([], dirty_regions([]))
+
+    def test_insert(self):
+        """Test that inserted text is dirty."""
+        self.assertEqual([NormalizedRegion(10, 15)], dirty_regions([TextChange(10, 10, 5)]))
+
+    def test_erase(self):
+        """Test that the place of the erased text is dirty."""
+        self.assertEqual([NormalizedRegion(10, 10)], dirty_regions([TextChange(10, 15, 0)]))
+
+    def test_shift_previous_changes(self):
+        """Test that previous dirty regions after the change are shifted."""
+        self.assertEqual(
+            [NormalizedRegion(2, 3), NormalizedRegion(11, 11), NormalizedRegion(13, 15)],
+            dirty_regions([TextChange(10, 12, 0), TextChange(2, 2, 1), TextChange(13, 15, 2)]))
+
+    def test_merge_intersecting_changes(self):
+        """Test that intersecting dirty regions are merged."""
+        self.assertEqual(
+            [NormalizedRegion(8, 14)], dirty_regions([TextChange(10, 10, 3), TextChange(8, 11, 4)]))
+
+    def test_merge_adjacent_changes(self):
+        """Test that typing several characters gives one dirty region."""
+        self.assertEqual(
+            [NormalizedRegion(10, 13)],
+            dirty_regions([TextChange(10, 10, 1), TextChange(11, 11, 1), TextChange(12, 12, 1)]))
+
+    def test_backspace(self):
+        """Test that erasing previously inserted text shrinks the dirty region."""
+        self.assertEqual(
+            [NormalizedRegion(10, 11)], dirty_regions([TextChange(10, 10, 2), TextChange(11, 12, 0)]))
+
+
+class ShiftRegionTest(unittest.TestCase):
+    """Tests for shift_region."""
+
+    def test_change_after(self):
+        """Test that changes after the region don't move it."""
+        self.assertEqual(NormalizedRegion(5, 10), shift_region(NormalizedRegion(5, 10), [TextChange(10, 12, 7)]))
+
+    def test_change_before(self):
+        """Test that changes before the region move it."""
+        self.assertEqual(
+            NormalizedRegion(8, 13), shift_region(NormalizedRegion(5, 10), [TextChange(1, 1, 5), TextChange(2, 4, 0)]))
+
+    def test_insert_at_start(self):
+        """Test that text inserted right before the region moves it."""
+        self.assertEqual(NormalizedRegion(7, 12), shift_region(NormalizedRegion(5, 10), [TextChange(5, 5, 2)]))
+
+    def test_change_inside(self):
+        """Test that changed regions are dropped."""
+        self.assertEqual(None, shift_region(NormalizedRegion(5, 10), [TextChange(7, 7, 1)]))
+        self.assertEqual(None, shift_region(NormalizedRegion(5, 10), [TextChange(1, 6, 0)]))
+        self.assertEqual(None, shift_region(NormalizedRegion(5, 10), [TextChange(1, 1, 5), TextChange(14, 20, 0)]))
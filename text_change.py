@@ -0,0 +1,96 @@
+"""A module with tools for tracking text changes in buffers."""
+
+try:
+    from .regions import NormalizedRegion
+except ValueError:
+    from regions import NormalizedRegion
+
+
+class TextChange(object):  # pylint: disable=too-few-public-methods
+    """
+    A single text change in a buffer.
+
+    The text in [a, b) is replaced with length characters. Positions are in buffer coordinates right before the
+    change is applied.
+    """
+
+    def __init__(self, a, b, length):
+        """
+        Create a text change.
+
+        Arguments:
+        - a - the beginning of the replaced text.
+        - b - the end of the replaced text.
+        - length - the length of the inserted text.
+        """
+        self.a = a  # pylint: disable=invalid-name
+        self.b = b  # pylint: disable=invalid-name
+        self.length = length
+
+    def delta(self):
+        """Get the difference between the buffer's size after and before the change."""
+        return self.length - (self.b - self.a)
+
+    def __eq__(self, other):
+        """Compare text changes for equality."""
+        if not isinstance(other, TextChange):
+            return False
+        return self.a == other.a and self.b == other.b and self.length == other.length
+
+    def __hash__(self):
+        """Get the text change hash."""
+        return hash((self.a, self.b, self.length))
+
+    def __repr__(self):
+        """Get the text change string representation."""
+        return "TextChange(%d, %d, %d)" % (self.a, self.b, self.length)
+
+
+def dirty_regions(changes):
+    """
+    Get regions of the buffer that were changed by a sequence of text changes.
+
+    Arguments:
+    - changes - an iterable of TextChange-s in the order they were applied.
+    Returns a sorted list of non-intersecting NormalizedRegion-s in coordinates of the buffer after all changes.
+    """
+    dirty = []
+    for change in changes:
+        delta = change.delta()
+        merged_a = change.a
+        merged_b = change.b
+        new_dirty = []
+        for (a, b) in dirty:  # pylint: disable=invalid-name
+            if b < change.a:
+                new_dirty.append((a, b))
+            elif a > change.b:
+                new_dirty.append((a + delta, b + delta))
+            else:
+                merged_a = min(merged_a, a)
+                merged_b = max(merged_b, b)
+        new_dirty.append((merged_a, merged_b + delta))
+        new_dirty.sort()
+        dirty = new_dirty
+    return [NormalizedRegion(a, b) for (a, b) in dirty]
+
+
+def shift_region(region, changes):
+    """
+    Shift a region by a sequence of text changes.
+
+    Text inserted right before a region moves it, text inserted right after it doesn't affect it.
+    Arguments:
+    - region - a NormalizedRegion to shift.
+    - changes - an iterable of TextChange-s in the order they were applied.
+    Returns the shifted NormalizedRegion or None, if any of the changes modified the region's text.
+    """
+    a = region.a  # pylint: disable=invalid-name
+    b = region.b  # pylint: disable=invalid-name
+    for change in changes:
+        if change.a < b and change.b > a:
+            return None
+        if change.b <= a:
+            delta = change.delta()
+            a += delta  # pylint: disable=invalid-name
+            b += delta  # pylint: disable=invalid-name
+    return NormalizedRegion(a, b)